@@ -1,329 +1,142 @@
+import dataclasses
 import streamlit as st
+import numpy as np
 import pandas as pd
-import requests
-from io import StringIO
-import re
+import os
 import graph
+import history
+import homelist
+import incremental
+import ingest
+import paging
+import profiling
+import report
+import shared_cache
+from outing_stats import (
+    NAME_CONVERSION_VERSION, SERVICE_DATE_TEXT, format_dates, validate_inputs, validation_table,
+    get_staff_details, homelist_fingerprint,
+    staff_table, region_table, participants_table, session_table, home_activity_table, activity_type_table
+)
 
 # 設置頁面為寬屏模式
 st.set_page_config(layout="wide")
 
 # GitHub Raw URL
-RAW_URL = "https://raw.githubusercontent.com/KellifizW/MonthlyStat/main/homelist.csv"
-
-# 定義必要欄位
-REQUIRED_COLUMNS = ['RespStaff', '2ndRespStaffName', 'HomeName', 'ServiceDate']
-
-# 名稱轉換字典
-NAME_CONVERSION = {
-    '溫?邦': 'Pong',
-    '溫晧邦': 'Pong',
-    '張玉明': 'Jordan',
-    '陳發成': 'Jack',
-    '林振聲': 'Mike',
-    '黃瑞霞': 'Peppy',
-    '曾嘉欣': 'Kama',
-    '徐家兒': 'Kayi'
-}
-
-# 指定的員工顯示順序
-DESIRED_STAFF_ORDER = ['Mike', 'Pong', 'Peppy', 'Jordan', 'Kayi', 'Jack', 'Kama']
+RAW_URL = homelist.RAW_URL
 
 # 初始化 session_state
-if 'uploaded_df' not in st.session_state:
-    st.session_state['uploaded_df'] = None
+if 'upload_name' not in st.session_state:
+    st.session_state['upload_name'] = None
 if 'used_encoding' not in st.session_state:
     st.session_state['used_encoding'] = None
-
-# 通用檔案讀取函數（支援 CSV 和 XLSX）
+if 'bad_lines' not in st.session_state:
+    st.session_state['bad_lines'] = []
+if 'upload_fingerprint' not in st.session_state:
+    st.session_state['upload_fingerprint'] = None
+if 'uploaded_file_id' not in st.session_state:
+    st.session_state['uploaded_file_id'] = None
+
+# 通用檔案讀取函數（支援 CSV 和 XLSX），相同內容的檔案經 ingest 的解析快取直接取用；回傳 (DataFrame, 解析資訊, 內容指紋)
 def read_file(file):
     file.seek(0)
     file_name = file.name.lower()
-    if file_name.endswith('.csv'):
-        encoding = 'big5hkscs'
-        separators = [',', '\t']
-        sample = file.read(1024).decode(encoding, errors='replace')
-        file.seek(0)
-        separator = max(separators, key=lambda sep: sample.count(sep))
-        try:
-            df = pd.read_csv(file, encoding=encoding, sep=separator, on_bad_lines='warn')
-            return df, encoding
-        except Exception as e:
-            st.error(f"無法讀取 CSV 檔案，請檢查檔案是否有效: {str(e)}")
-            return None, None
-    elif file_name.endswith('.xlsx'):
-        try:
-            df = pd.read_excel(file, engine='openpyxl')
-            return df, 'utf-8'
-        except Exception as e:
-            st.error(f"無法讀取 XLSX 檔案，請檢查檔案是否有效: {str(e)}")
-            return None, None
-    else:
+    if not file_name.endswith(('.csv', '.xlsx')):
         st.error("不支援的檔案格式，請上傳 .csv 或 .xlsx 檔案")
-        return None, None
-
-# 從 GitHub 讀取 homelist.csv
-def get_github_csv_data(url):
+        return None, None, None
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = StringIO(response.text)
-            df = pd.read_csv(data)
-            return df
-        else:
-            st.error(f"無法獲取 GitHub CSV 檔案，狀態碼：{response.status_code}")
-            return None
+        return ingest.read_upload(file.read(), file_name)
     except Exception as e:
-        st.error(f"讀取 GitHub CSV 時發生錯誤：{str(e)}")
-        return None
-
-# 提取 HomeName 的前 1-3 個數字
-def extract_home_number(home_name):
-    if pd.isna(home_name):
+        file_type = 'CSV' if file_name.endswith('.csv') else 'XLSX'
+        st.error(f"無法讀取 {file_type} 檔案，請檢查檔案是否有效: {str(e)}")
+        return None, None, None
+
+# 目前 session 的上傳資料：session 只保存內容指紋及檔名，DataFrame 由共用快取取得（不會在快取的記憶體預算以外常駐）
+# 已被快取淘汰時以上傳元件中的檔案重新解析；沒有檔案可重新解析時回傳 None
+def current_upload(uploaded_file=None):
+    fingerprint = st.session_state['upload_fingerprint']
+    if fingerprint is None:
         return None
-    match = re.match(r'^\d{1,3}', str(home_name))
-    return match.group(0) if match else None
-
-# 判斷區域並返回員工的區域狀態
-def check_local(row, github_df):
-    home_number = extract_home_number(row['HomeName'])
-    resp_staff = row['RespStaff'] if pd.notna(row['RespStaff']) else None
-    second_staff = row['2ndRespStaffName'] if pd.notna(row['2ndRespStaffName']) else None
-    if home_number is None:
-        return {'resp_region': '外區', 'second_region': '外區' if second_staff else None}
-    matching_homes = github_df[github_df['Home'].astype(str) == str(home_number)]
-    if matching_homes.empty:
-        return {'resp_region': '外區', 'second_region': '外區' if second_staff else None}
-    local_staff = set()
-    for _, home_row in matching_homes.iterrows():
-        if pd.notna(home_row.get('staff1')):
-            local_staff.add(home_row['staff1'])
-        if pd.notna(home_row.get('staff2')):
-            local_staff.add(home_row['staff2'])
-        if pd.notna(home_row.get('staff3')):
-            local_staff.add(home_row['staff3'])
-        if pd.notna(home_row.get('staff4')):
-            local_staff.add(home_row['staff4'])
-    resp_region = '本區' if resp_staff in local_staff else '外區'
-    second_region = '本區' if second_staff in local_staff else '外區' if second_staff else None
-    return {'resp_region': resp_region, 'second_region': second_region}
-
-# 轉換員工名稱
-def convert_name(name):
-    return NAME_CONVERSION.get(name, name) if pd.notna(name) else name
-
-# 檢查 RespStaff 與 2ndRespStaffName 是否重複
-def check_duplicate_staff(df):
-    df_check = df[['RespStaff', '2ndRespStaffName', 'ServiceDate', 'HomeName']].copy()
-    df_check['RespStaff'] = df_check['RespStaff'].apply(convert_name)
-    df_check['2ndRespStaffName'] = df_check['2ndRespStaffName'].apply(convert_name)
-    mask = df_check['2ndRespStaffName'].notna()
-    duplicates = df_check[mask & (df_check['RespStaff'] == df_check['2ndRespStaffName'])]
-    return duplicates
-
-# 計算員工統計（含本區總共和全部總共，並新增 NumberOfSession 統計，現在同時統計 RespStaff 和 2ndRespStaffName）
-def calculate_staff_stats(df, github_df):
-    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing_columns:
-        st.error(f"缺少必要欄位: {missing_columns}")
+    cached = ingest.cached_upload(fingerprint, st.session_state['upload_name'])
+    if cached is not None:
+        return cached[0]
+    if uploaded_file is not None:
+        uploaded_df, _, file_fingerprint = read_file(uploaded_file)
+        if file_fingerprint == fingerprint:
+            return uploaded_df
+    return None
+
+# 從 GitHub 讀取 homelist.csv（經 homelist 模組快取及重新驗證，無法連線或逾時時使用本地副本）
+# future 為頁面開始時以 homelist.prefetch 在背景開始的讀取；沒有時即時開始
+def get_github_csv_data(url, future=None):
+    try:
+        df, source = homelist.wait_homelist(future or homelist.prefetch(url), url)
+    except Exception as e:
+        st.error(f"讀取 GitHub CSV 時發生錯誤：{str(e)}")
         return None
-
-    staff_stats = {}
-    staff_days = {}
-
-    for index, row in df.iterrows():
-        resp_staff = convert_name(row['RespStaff'])
-        second_staff = convert_name(row['2ndRespStaffName']) if pd.notna(row['2ndRespStaffName']) else None
-        service_date = row['ServiceDate']
-
-        if pd.isna(resp_staff) or pd.isna(service_date):
-            continue
-
-        if resp_staff not in staff_stats:
-            staff_stats[resp_staff] = {
-                '本區單獨': 0, '本區協作': 0, '外區單獨': 0, '外區協作': 0,
-                'session_0': 0, 'session_1': 0, 'session_total': 0
-            }
-            staff_days[resp_staff] = set()
-
-        if second_staff and second_staff not in staff_stats:
-            staff_stats[second_staff] = {
-                '本區單獨': 0, '本區協作': 0, '外區單獨': 0, '外區協作': 0,
-                'session_0': 0, 'session_1': 0, 'session_total': 0
-            }
-            staff_days[second_staff] = set()
-
-        staff_days[resp_staff].add(service_date)
-        if second_staff:
-            staff_days[second_staff].add(service_date)
-
-        regions = check_local(row, github_df)
-        resp_region = regions['resp_region']
-        second_region = regions['second_region']
-
-        # 區域統計
-        if not second_staff:
-            if resp_region == '本區':
-                staff_stats[resp_staff]['本區單獨'] += 1
-            else:
-                staff_stats[resp_staff]['外區單獨'] += 1
-        else:
-            if resp_region == '本區':
-                staff_stats[resp_staff]['本區協作'] += 1
-            else:
-                staff_stats[resp_staff]['外區協作'] += 1
-            if second_region == '本區':
-                staff_stats[second_staff]['本區協作'] += 1
-            else:
-                staff_stats[second_staff]['外區協作'] += 1
-
-        # NumberOfSession 統計（同時統計負責員工與第二負責員工）
-        if 'NumberOfSession' in df.columns and pd.notna(row['NumberOfSession']):
-            try:
-                session_val = int(row['NumberOfSession'])
-                if session_val in [0, 1]:
-                    # 負責員工
-                    staff_stats[resp_staff][f'session_{session_val}'] += 1
-                    staff_stats[resp_staff]['session_total'] += 1
-                    # 第二負責員工（如果存在）
-                    if second_staff:
-                        staff_stats[second_staff][f'session_{session_val}'] += 1
-                        staff_stats[second_staff]['session_total'] += 1
-            except ValueError:
-                pass
-
-    # 計算總和
-    for staff in staff_stats:
-        staff_stats[staff]['外出日數'] = len(staff_days[staff])
-        staff_stats[staff]['本區總共'] = staff_stats[staff]['本區單獨'] + staff_stats[staff]['本區協作']
-        staff_stats[staff]['全部總共'] = (staff_stats[staff]['本區總共'] +
-                                         staff_stats[staff]['外區單獨'] +
-                                         staff_stats[staff]['外區協作'])
-
-    return staff_stats, staff_days
-
-# 計算分區統計節數並返回詳細記錄
-def calculate_region_stats(df, github_df):
-    region_stats = {
-        'Mike': {'count': 0, 'count_0':0, 'count_1':0,
-                   'participants':0, 'participants_0':0, 'participants_1':0,
-                   'homes': set(), 'records': [],
-                   'activity_types_0': {}, 'activity_types_1': {}},
-        'Pong': {'count': 0, 'count_0':0, 'count_1':0,
-                   'participants':0, 'participants_0':0, 'participants_1':0,
-                   'homes': set(), 'records': [],
-                   'activity_types_0': {}, 'activity_types_1': {}},
-        'Peppy': {'count': 0, 'count_0':0, 'count_1':0,
-                   'participants':0, 'participants_0':0, 'participants_1':0,
-                   'homes': set(), 'records': [],
-                   'activity_types_0': {}, 'activity_types_1': {}},
-        'Jordan': {'count': 0, 'count_0':0, 'count_1':0,
-                   'participants':0, 'participants_0':0, 'participants_1':0,
-                   'homes': set(), 'records': [],
-                   'activity_types_0': {}, 'activity_types_1': {}},
-    }
-    has_participants_column = 'NumberOfParticipant(Without Volunteer Count)' in df.columns
-    has_activity_type_column = '活動類型' in df.columns
-
-    for index, row in df.iterrows():
-        home_number = extract_home_number(row['HomeName'])
-        if home_number is None:
-            continue
-        matching_homes = github_df[github_df['Home'].astype(str) == str(home_number)]
-        if matching_homes.empty:
-            continue
-        staff1 = matching_homes.iloc[0]['staff1']
-        if pd.isna(staff1) or staff1 not in region_stats:
-            continue
-
-        region_stats[staff1]['count'] += 1
-        region_stats[staff1]['homes'].add(home_number)
-
-        record = {
-            'RespStaff': row['RespStaff'],
-            'ServiceDate': row['ServiceDate'],
-            'HomeName': row['HomeName']
-        }
-        region_stats[staff1]['records'].append(record)
-
-        session_val = None
-        if 'NumberOfSession' in df.columns and pd.notna(row['NumberOfSession']):
-            try:
-                session_val = int(row['NumberOfSession'])
-            except ValueError:
-                session_val = None
-
-        if session_val == 0:
-            region_stats[staff1]['count_0'] += 1
-        elif session_val == 1:
-            region_stats[staff1]['count_1'] += 1
-
-        if has_participants_column and pd.notna(row['NumberOfParticipant(Without Volunteer Count)']):
-            try:
-                participants = int(row['NumberOfParticipant(Without Volunteer Count)'])
-                region_stats[staff1]['participants'] += participants
-                if session_val == 0:
-                    region_stats[staff1]['participants_0'] += participants
-                elif session_val == 1:
-                    region_stats[staff1]['participants_1'] += participants
-            except ValueError:
-                pass
-
-        if has_activity_type_column and pd.notna(row['活動類型']) and session_val in [0, 1]:
-            activity_type = row['活動類型']
-            target_dict = region_stats[staff1]['activity_types_0' if session_val == 0 else 'activity_types_1']
-            if activity_type not in target_dict:
-                target_dict[activity_type] = {'count': 0, 'dates': []}
-            target_dict[activity_type]['count'] += 1
-            target_dict[activity_type]['dates'].append(row['ServiceDate'])
-
-    total_sessions = sum(region['count'] for region in region_stats.values())
-    total_participants = sum(region['participants'] for region in region_stats.values()) if has_participants_column else None
-    return region_stats, total_sessions, total_participants
-
-# 獲取員工的詳細記錄
-def get_staff_details(df, staff_name):
-    solo_records = []
-    collab_records = []
-    solo_days = set()
-    collab_days = set()
-
-    for index, row in df.iterrows():
-        resp_staff = convert_name(row['RespStaff'])
-        second_staff = convert_name(row['2ndRespStaffName']) if pd.notna(row['2ndRespStaffName']) else None
-        service_date = row['ServiceDate']
-        home_name = row['HomeName']
-
-        if resp_staff == staff_name and not second_staff:
-            solo_records.append({'ServiceDate': service_date, 'HomeName': home_name})
-            solo_days.add(service_date)
-        elif resp_staff == staff_name and second_staff:
-            collab_records.append({'ServiceDate': service_date, 'HomeName': home_name, 'Collaborator': second_staff})
-            collab_days.add(service_date)
-        elif second_staff == staff_name:
-            collab_records.append({'ServiceDate': service_date, 'HomeName': home_name, 'Collaborator': resp_staff})
-            collab_days.add(service_date)
-
-    all_days = solo_days.union(collab_days)
-    return {
-        'solo_records': solo_records,
-        'collab_records': collab_records,
-        'solo_days': sorted(solo_days),
-        'collab_days': sorted(collab_days),
-        'all_days': sorted(all_days)
-    }
-
-# 計算院舍活動次數統計
-def calculate_home_activity_stats(df):
-    if 'HomeName' not in df.columns or 'ServiceDate' not in df.columns:
-        st.error("缺少 'HomeName' 或 'ServiceDate' 欄位，無法計算院舍活動次數")
-        return None, None
-    home_activity_counts = df.groupby('HomeName').size()
-    home_counts = home_activity_counts.value_counts().to_dict()
-    max_count = max(home_counts.keys(), default=0)
-    home_counts = {i: home_counts.get(i, 0) for i in range(1, max_count + 1)}
-    home_details = df.groupby('HomeName')['ServiceDate'].apply(list).to_dict()
-    return home_counts, home_details
+    st.session_state['homelist_source'] = source
+    if source == homelist.SOURCE_LOCAL:
+        st.warning("無法連線至 GitHub，暫時使用本地的 homelist.csv 副本。")
+    return df
+
+# 分頁表格：排序、篩選及分頁在伺服器端進行，只把目前一頁格式化後送到瀏覽器；匯出按鈕按下時才產生全部選取行的 CSV
+# key 為此表格各控制項的 session_state 鍵前綴
+def paged_dataframe(table, key, height=300):
+    controls = st.columns([3, 2, 1, 1])
+    query = controls[0].text_input("篩選", key=f"{key}_query", placeholder="輸入文字篩選")
+    sort_by = controls[1].selectbox("排序", ['不排序'] + table.scalar_columns, key=f"{key}_sort")
+    descending = controls[2].checkbox("遞減", key=f"{key}_descending")
+    page_size = controls[3].selectbox("每頁行數", paging.PAGE_SIZES,
+                                      index=paging.PAGE_SIZES.index(paging.DEFAULT_PAGE_SIZE), key=f"{key}_page_size")
+    order = paging.select(table, None if sort_by == '不排序' else sort_by, descending, query)
+    pages = paging.page_count(len(order), page_size)
+    # 篩選後頁數減少時先把頁碼調回範圍內（控制項建立前才可修改其 session_state）
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page_number = st.number_input("頁", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    st.dataframe(paging.page(table, order, page_number, page_size), height=height, width='stretch')
+    st.caption(f"共 {len(order)} 行（全部 {len(table)} 行），第 {page_number}/{pages} 頁")
+    st.download_button(
+        "匯出全部選取行 (CSV)",
+        data=lambda: paging.export_csv(table, order),
+        file_name=f"{key}.csv",
+        mime="text/csv",
+        on_click="ignore",
+        key=f"{key}_export",
+    )
+
+# 結果包的常駐大小：上傳資料、行鍵、增量狀態及院舍/員工日期陣列（計入共用快取的記憶體預算）
+def bundle_size(bundle):
+    size = shared_cache.frame_size(bundle.df) + bundle.staff_days.bits.nbytes
+    activity = bundle.home_activity
+    size += activity.homes.nbytes + activity.home_ids.nbytes + activity.keys.nbytes + activity.offsets.nbytes
+    size += sum(region.records.nbytes for region in bundle.region_stats.values())
+    if bundle.row_keys is not None:
+        size += bundle.row_keys.memory_usage(deep=True)
+    if bundle.state is not None:
+        size += sum(int(np.sum(getattr(bundle.state, field.name).memory_usage(deep=True)))
+                    for field in dataclasses.fields(bundle.state))
+    return int(size)
+
+# 統計結果包：每組 (上傳指紋, homelist 指紋, 名稱轉換版本) 只計算一次，放在共用快取中供所有 session 使用
+# session 只保存上一次結果包的鍵；上一次的結果包仍在快取中且 homelist 及名稱轉換相同時，只把新增/移除的行套用到上一次的統計
+# 回傳 (鍵, 結果包)；結果包為共用物件，呼叫端不可修改
+def build_stats_bundle(upload_fingerprint, homelist_fp, name_version, uploaded_df, github_df, previous_key=None):
+    key = ('bundle', upload_fingerprint, homelist_fp, name_version)
+    bundle = shared_cache.SHARED_CACHE.get(key)
+    if bundle is None:
+        previous = None
+        if previous_key is not None and previous_key[2:] == key[2:]:
+            previous = shared_cache.SHARED_CACHE.get(previous_key)
+        with st.spinner("正在計算統計…"):
+            # 第一次計算亦經 update_bundle，同時建立增量狀態及行鍵，之後再上傳時不需由上一次的資料重建
+            bundle = incremental.update_bundle(previous, uploaded_df, github_df)
+        shared_cache.SHARED_CACHE.put(key, bundle, bundle_size(bundle))
+    return key, bundle
+
+# 歷史記錄的彙總立方體：以各月份的內容雜湊為快取鍵，有月份新增或改寫時才重新讀取
+@st.cache_resource(max_entries=4, show_spinner="正在讀取彙總資料…")
+def load_history_cube(manifest_key):
+    return history.load_cube([month for month, _ in manifest_key])
 
 # 自定義樣式函數
 def style_staff_table(df):
@@ -349,42 +162,85 @@ def outing_stats_page():
     """)
     st.write("請上傳 CSV 或 XLSX 檔案，程式將根據 GitHub 的 homelist.csv 計算每位員工的本區與外區單獨及協作節數，並顯示分區統計節數。")
 
-    # 檔案上傳邏輯
-    if st.session_state['uploaded_df'] is None:
-        uploaded_file = st.file_uploader("選擇 CSV 或 XLSX 檔案", type=["csv", "xlsx"], key="outing_uploader")
-        if uploaded_file is not None:
-            uploaded_df, used_encoding = read_file(uploaded_file)
-            if uploaded_df is None:
-                return
-            st.session_state['uploaded_df'] = uploaded_df
-            st.session_state['used_encoding'] = used_encoding
-    else:
+    # 頁面一開始就在背景讀取 homelist.csv，網絡等待時間與檔案解析及欄位檢查重疊
+    homelist_future = homelist.prefetch(RAW_URL)
+
+    # 檔案上傳邏輯（同一個上傳檔案在每次重新執行時只解析一次）
+    if st.session_state['upload_fingerprint'] is not None:
         st.write("已使用之前上傳的檔案，若需更換請重新上傳。")
-        uploaded_file = st.file_uploader("選擇 CSV 或 XLSX 檔案", type=["csv", "xlsx"], key="outing_uploader")
-        if uploaded_file is not None:
-            uploaded_df, used_encoding = read_file(uploaded_file)
-            if uploaded_df is None:
-                return
-            st.session_state['uploaded_df'] = uploaded_df
-            st.session_state['used_encoding'] = used_encoding
-
-    uploaded_df = st.session_state['uploaded_df']
+    uploaded_file = st.file_uploader("選擇 CSV 或 XLSX 檔案", type=["csv", "xlsx"], key="outing_uploader")
+    # 各階段的時間記錄在 main() 啟用的 Recorder 中，供側欄的效能診斷顯示
+    laps = profiling.Laps()
+    uploaded_df = None
+    if uploaded_file is not None and uploaded_file.file_id != st.session_state['uploaded_file_id']:
+        uploaded_df, parse_info, fingerprint = read_file(uploaded_file)
+        if uploaded_df is None:
+            return
+        laps.lap('read_file', rows=len(uploaded_df))
+        st.session_state['upload_name'] = uploaded_file.name.lower()
+        st.session_state['used_encoding'] = parse_info['encoding']
+        st.session_state['bad_lines'] = parse_info['bad_lines']
+        st.session_state['upload_fingerprint'] = fingerprint
+        st.session_state['uploaded_file_id'] = uploaded_file.file_id
+    elif st.session_state['upload_fingerprint'] is not None:
+        uploaded_df = current_upload(uploaded_file)
+        if uploaded_df is None:
+            st.session_state['upload_fingerprint'] = None
+            st.session_state['uploaded_file_id'] = None
+            st.warning("之前上傳的檔案已從快取中移除，請重新上傳。")
+
     used_encoding = st.session_state['used_encoding']
 
     if uploaded_df is not None:
-        uploaded_df['RespStaff'] = uploaded_df['RespStaff'].apply(convert_name)
-        uploaded_df['2ndRespStaffName'] = uploaded_df['2ndRespStaffName'].apply(convert_name)
         st.write(f"檔案成功解析，使用編碼: {used_encoding}")
+        bad_lines = st.session_state['bad_lines']
+        if bad_lines:
+            st.warning(f"有 {len(bad_lines)} 行欄位數目不符，已略過：")
+            bad_lines_df = pd.DataFrame(bad_lines).rename(columns={
+                'line': '行號', 'expected': '應有欄位數', 'actual': '實際欄位數', 'text': '內容'
+            })
+            bad_lines_df.index = bad_lines_df.index + 1
+            st.dataframe(bad_lines_df, height=150, width='stretch')
+
+        # 欄位檢查
+        issues = validate_inputs(uploaded_df)
+        if issues:
+            st.error(f"上傳的檔案缺少必要欄位: {list(issues[0].columns)}")
+            return
+
+        laps.restart()
+        github_df = get_github_csv_data(RAW_URL, homelist_future)
+        if github_df is None:
+            return
+        laps.lap('get_github_csv_data', rows=len(github_df))
+        issues = validate_inputs(uploaded_df, github_df)
+        if issues:
+            st.error(f"GitHub 的 homelist.csv 缺少必要欄位: {list(issues[0].columns)}")
+            return
+
+        # 所有統計只在上傳內容、homelist 或名稱轉換表改變時重新計算，選單互動只讀取結果包
+        # 同一月份再次上傳（例如月中補加記錄）時，以上一次的結果包增量計算
+        homelist_fp = homelist_fingerprint(github_df)
+        bundle_key, bundle = build_stats_bundle(
+            st.session_state['upload_fingerprint'], homelist_fp, NAME_CONVERSION_VERSION,
+            uploaded_df, github_df, previous_key=st.session_state.get('previous_bundle_key')
+        )
+        st.session_state['previous_bundle_key'] = bundle_key
+        laps.lap('build_stats_bundle', rows=len(bundle.df))
+        uploaded_df = bundle.df
+        staff_stats = bundle.staff_stats
+        region_stats = bundle.region_stats
+        home_counts = bundle.home_counts
+        home_activity = bundle.home_activity
 
         # 重複員工檢查
-        duplicate_records = check_duplicate_staff(uploaded_df)
+        duplicate_records = bundle.duplicates
         if not duplicate_records.empty:
             st.error(f"⚠️ 偵測到 {len(duplicate_records)} 筆記錄的「負責員工」與「第二負責員工」為同一人，請檢查並修正！")
             display_df = duplicate_records.copy()
-            display_df['ServiceDate'] = pd.to_datetime(display_df['ServiceDate'], errors='coerce').dt.strftime('%Y-%m-%d')
-            display_df = display_df[['ServiceDate', 'HomeName', 'RespStaff', '2ndRespStaffName']]
+            display_df = display_df[[SERVICE_DATE_TEXT, 'HomeName', 'RespStaff', '2ndRespStaffName']]
             display_df.rename(columns={
-                'ServiceDate': '活動日期',
+                SERVICE_DATE_TEXT: '活動日期',
                 'HomeName': '院舍名稱',
                 'RespStaff': '負責員工',
                 '2ndRespStaffName': '第二負責員工'
@@ -392,86 +248,53 @@ def outing_stats_page():
             display_df.index = range(1, len(display_df) + 1)
             st.dataframe(display_df, width='stretch')
 
-        github_df = get_github_csv_data(RAW_URL)
-        if github_df is None:
-            return
-
-        # 欄位檢查
-        required_uploaded_cols = ['HomeName', 'RespStaff', '2ndRespStaffName', 'ServiceDate']
-        required_github_cols = ['Home', 'staff1', 'staff2', 'staff3', 'staff4']
-        missing_uploaded = [col for col in required_uploaded_cols if col not in uploaded_df.columns]
-        missing_github = [col for col in required_github_cols if col not in github_df.columns]
-
-        if missing_uploaded:
-            st.error(f"上傳的檔案缺少必要欄位: {missing_uploaded}")
-            return
-        if missing_github:
-            st.error(f"GitHub 的 homelist.csv 缺少必要欄位: {missing_github}")
-            return
-
-        uploaded_df[['RespRegion', 'SecondRegion']] = uploaded_df.apply(
-            lambda row: pd.Series(check_local(row, github_df)), axis=1
+        # 其他逐行檢查的問題只作提示，相關記錄按原有規則略過（例如無效日期）或歸入外區（例如未知院舍/員工）
+        other_issues = [issue for issue in bundle.issues if issue.code != 'duplicate_staff']
+        if other_issues:
+            st.warning(f"⚠️ 上傳資料有 {len(other_issues)} 類問題，相關記錄可能未計入部分統計：")
+            st.dataframe(validation_table(other_issues), width='stretch')
+
+        # 將本次上傳按月份寫入歷史記錄（內容未改變的月份會略過，日期範圍較窄的月份會與已儲存的記錄合併）
+        if st.button("加入歷史記錄", key="history_ingest"):
+            result = history.ingest_bundle(bundle, source=st.session_state['upload_fingerprint'])
+            st.success(f"已寫入月份：{', '.join(result['written']) or '無'}；未改變而略過：{', '.join(result['skipped']) or '無'}")
+            if result['merged']:
+                st.warning(f"以下月份已有記錄，而本次上傳的日期範圍較窄，已按記錄合併（保留原有記錄，只加入新記錄）："
+                           f"{', '.join(result['merged'])}")
+            if result['nothing_new']:
+                st.info(f"以下月份本次上傳的日期範圍較窄，而全部記錄已在歷史記錄中，沒有加入新記錄："
+                        f"{', '.join(result['nothing_new'])}")
+            if result['dropped_rows']:
+                st.warning(f"{result['dropped_rows']} 筆記錄沒有有效的 ServiceDate，未寫入歷史記錄。")
+
+        # 完整報表（所有統計表及每個分區、每位員工的明細）只在按下下載時才產生
+        st.download_button(
+            "下載完整報表 (XLSX)",
+            data=lambda: report.report_bytes(bundle),
+            file_name="外出統計報表.xlsx",
+            mime=report.XLSX_MIME,
+            on_click="ignore",
+            key="report_download",
         )
 
-        staff_stats, staff_days = calculate_staff_stats(uploaded_df, github_df)
-        if staff_stats is None:
-            return
-
-        region_stats, total_sessions, total_participants = calculate_region_stats(uploaded_df, github_df)
-        home_counts, home_details = calculate_home_activity_stats(uploaded_df)
-        if home_counts is None:
-            return
+        has_participants = 'NumberOfParticipant(Without Volunteer Count)' in uploaded_df.columns
 
         # 員工統計表 + 分區統計
         col1, col2 = st.columns([7, 3])
         with col1:
             st.subheader("員工外出統計表")
-            stats_df = pd.DataFrame(staff_stats).T
-            stats_df = stats_df[['本區單獨', '本區協作', '外區單獨', '外區協作', '本區總共', '全部總共', '外出日數']]
-            stats_df.index.name = '員工'
-            existing_staff = [s for s in DESIRED_STAFF_ORDER if s in stats_df.index]
-            stats_df = stats_df.reindex(existing_staff)
-            styled_df = style_staff_table(stats_df)
+            styled_df = style_staff_table(staff_table(staff_stats))
             st.dataframe(styled_df, height=300, width='stretch')
 
         with col2:
             st.subheader("分區統計節數")
-            region_data = {
-                '分區': list(region_stats.keys()),
-                '總節數': [region_stats[region]['count'] for region in region_stats],
-                '0 次': [region_stats[region]['count_0'] for region in region_stats],
-                '1 次': [region_stats[region]['count_1'] for region in region_stats],
-            }
-            if 'NumberOfParticipant(Without Volunteer Count)' in uploaded_df.columns:
-                region_data['總人次'] = [region_stats[region]['participants'] for region in region_stats]
-            region_df = pd.DataFrame(region_data)
-            total_row = ['總計', 
-                         sum(region_data.get('總節數', [0])),
-                         sum(region_data.get('0 次', [0])),
-                         sum(region_data.get('1 次', [0]))]
-            if '總人次' in region_data:
-                total_row.append(sum(region_data['總人次']))
-            region_df.loc[len(region_df)] = total_row
-            region_df.index = region_df.index + 1
-            st.dataframe(region_df, height=300, width='stretch')
+            st.dataframe(region_table(region_stats, has_participants), height=300, width='stretch')
 
         # 服務人次統計
-        if 'NumberOfParticipant(Without Volunteer Count)' in uploaded_df.columns:
+        if has_participants:
             st.subheader("服務人次統計（按 NumberOfSession 分開）")
             st.caption("0 次即是不夠35分鐘, 1次即是35分鐘或以上")
-            participants_data = {
-                '分區': list(region_stats.keys()),
-                '總人次': [region_stats[r]['participants'] for r in region_stats],
-                '0 次人次': [region_stats[r]['participants_0'] for r in region_stats],
-                '1 次人次': [region_stats[r]['participants_1'] for r in region_stats],
-            }
-            participants_df = pd.DataFrame(participants_data)
-            participants_df.loc[len(participants_df)] = ['總計',
-                                                        sum(participants_data['總人次']),
-                                                        sum(participants_data['0 次人次']),
-                                                        sum(participants_data['1 次人次'])]
-            participants_df.index = participants_df.index + 1
-            st.dataframe(participants_df, height=300, width='stretch')
+            st.dataframe(participants_table(region_stats), height=300, width='stretch')
 
             if 'ServiceStatus' in uploaded_df.columns:
                 status_counts = uploaded_df['ServiceStatus'].value_counts()
@@ -486,101 +309,36 @@ def outing_stats_page():
         with col1:
             st.write("**NumberOfSession 統計（按員工）：**")
             if 'NumberOfSession' in uploaded_df.columns:
-                session_data = []
-                for staff in DESIRED_STAFF_ORDER:
-                    if staff in staff_stats:
-                        session_data.append({
-                            '員工': staff,
-                            '0 次': staff_stats[staff].get('session_0', 0),
-                            '1 次': staff_stats[staff].get('session_1', 0),
-                            '總計': staff_stats[staff].get('session_total', 0)
-                        })
-                total_0 = sum(staff_stats[staff].get('session_0', 0) for staff in staff_stats)
-                total_1 = sum(staff_stats[staff].get('session_1', 0) for staff in staff_stats)
-                grand_total = total_0 + total_1
-                session_data.append({
-                    '員工': '總計',
-                    '0 次': total_0,
-                    '1 次': total_1,
-                    '總計': grand_total
-                })
-                session_df = pd.DataFrame(session_data)
-                session_df.index = session_df.index + 1
-                st.dataframe(session_df, height=250, width='stretch')
+                st.dataframe(session_table(staff_stats), height=250, width='stretch')
 
             st.write("**院舍活動次數統計：**")
-            home_activity_data = [
-                {'活動次數': count, '院舍數目': num_homes, '總節數': count * num_homes}
-                for count, num_homes in home_counts.items()
-            ]
-            home_activity_df = pd.DataFrame(home_activity_data)
-            
-            # 修正 Arrow 錯誤：總計行單獨處理，避免型別衝突
-            if not home_activity_df.empty:
-                total_homes = home_activity_df['院舍數目'].sum()
-                total_sessions = home_activity_df['總節數'].sum()
-                total_row = pd.DataFrame({
-                    '活動次數': ['總計'],
-                    '院舍數目': [total_homes],
-                    '總節數': [total_sessions]
-                })
-                home_activity_df = pd.concat([home_activity_df, total_row], ignore_index=True)
-            
-            home_activity_df.index = home_activity_df.index + 1
-            st.dataframe(home_activity_df, height=200, width='stretch')
+            st.dataframe(home_activity_table(home_counts), height=200, width='stretch')
 
         with col2:
             st.write("**活動類型 統計（按 NumberOfSession 分開）：**")
             if '活動類型' in uploaded_df.columns:
-                # 0 次
-                st.write("**NumberOfSession = 0 次**")
-                type_counts_0 = {}
-                for region in region_stats.values():
-                    for act, info in region['activity_types_0'].items():
-                        type_counts_0[act] = type_counts_0.get(act, 0) + info['count']
-                if type_counts_0:
-                    df0 = pd.DataFrame.from_dict(type_counts_0, orient='index', columns=['次數']).reset_index()
-                    df0.columns = ['活動類型', '次數']
-                    df0 = df0.sort_values('次數', ascending=False)
-                    df0.loc[len(df0)] = ['總計', df0['次數'].sum()]
-                    df0.index = df0.index + 1
-                    st.dataframe(df0, height=180, width='stretch')
-                else:
-                    st.write("無 0 次 的活動類型記錄")
-
-                # 1 次
-                st.write("**NumberOfSession = 1 次**")
-                type_counts_1 = {}
-                for region in region_stats.values():
-                    for act, info in region['activity_types_1'].items():
-                        type_counts_1[act] = type_counts_1.get(act, 0) + info['count']
-                if type_counts_1:
-                    df1 = pd.DataFrame.from_dict(type_counts_1, orient='index', columns=['次數']).reset_index()
-                    df1.columns = ['活動類型', '次數']
-                    df1 = df1.sort_values('次數', ascending=False)
-                    df1.loc[len(df1)] = ['總計', df1['次數'].sum()]
-                    df1.index = df1.index + 1
-                    st.dataframe(df1, height=180, width='stretch')
-                else:
-                    st.write("無 1 次 的活動類型記錄")
+                for session_val in (0, 1):
+                    st.write(f"**NumberOfSession = {session_val} 次**")
+                    type_df = activity_type_table(region_stats, session_val)
+                    if type_df is not None:
+                        st.dataframe(type_df, height=180, width='stretch')
+                    else:
+                        st.write(f"無 {session_val} 次 的活動類型記錄")
+        laps.lap('render_tables')
 
         # 分區詳細統計、員工詳細統計等其餘部分（保持不變）
         st.subheader("分區詳細統計")
         region_list = ['選擇分區'] + list(region_stats.keys())
         selected_region = st.selectbox("選擇分區", region_list, index=0, key="region_select")
         if selected_region != '選擇分區':
-            participants_text = f"，人次: {region_stats[selected_region]['participants']}" if 'NumberOfParticipant(Without Volunteer Count)' in uploaded_df.columns else ""
-            st.write(f"### {selected_region} 分區（{region_stats[selected_region]['count']} 節{participants_text}）")
-            homes = sorted(region_stats[selected_region]['homes'])
+            selected_stats = region_stats[selected_region]
+            participants_text = f"，人次: {selected_stats.participants}" if 'NumberOfParticipant(Without Volunteer Count)' in uploaded_df.columns else ""
+            st.write(f"### {selected_region} 分區（{selected_stats.count} 節{participants_text}）")
+            homes = sorted(selected_stats.homes)
             st.write(f"相關院舍（staff1 = {selected_region}）：{', '.join(homes)}")
             st.write("記錄清單：")
-            if region_stats[selected_region]['records']:
-                records_df = pd.DataFrame(region_stats[selected_region]['records'])
-                records_df['ServiceDate'] = records_df['ServiceDate'].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%d') if pd.notna(x) else '')
-                records_df = records_df[['RespStaff', 'ServiceDate', 'HomeName']]
-                records_df.columns = ['負責員工', '活動日期', '院舍名稱']
-                records_df.index = records_df.index + 1
-                st.dataframe(records_df, height=300, width='stretch')
+            if len(selected_stats.records):
+                paged_dataframe(paging.region_records_table(bundle, selected_region), "region_records")
             else:
                 st.write("無記錄")
 
@@ -588,112 +346,106 @@ def outing_stats_page():
         staff_list = ['選擇員工'] + list(staff_stats.keys())
         selected_staff = st.selectbox("選擇員工", staff_list, index=0, key="staff_select")
         if selected_staff != '選擇員工':
-            details = get_staff_details(uploaded_df, selected_staff)
+            details = get_staff_details(uploaded_df, selected_staff, bundle.staff_index)
+            solo_table, collab_table = paging.staff_records_tables(details)
             st.write(f"### {selected_staff}")
             st.write("**單獨記錄：**")
-            if details['solo_records']:
-                solo_df = pd.DataFrame(details['solo_records'])
-                solo_df['ServiceDate'] = solo_df['ServiceDate'].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%d') if pd.notna(x) else '')
-                solo_df.columns = ['活動日期', '院舍名稱']
-                solo_df.index = solo_df.index + 1
-                st.dataframe(solo_df, height=200, width='stretch')
+            if len(solo_table):
+                paged_dataframe(solo_table, "staff_solo", height=200)
             else:
                 st.write("無單獨記錄")
             st.write("**協作記錄：**")
-            if details['collab_records']:
-                collab_df = pd.DataFrame(details['collab_records'])
-                collab_df['ServiceDate'] = collab_df['ServiceDate'].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%d') if pd.notna(x) else '')
-                collab_df.columns = ['活動日期', '院舍名稱', '協作者']
-                collab_df.index = collab_df.index + 1
-                st.dataframe(collab_df, height=200, width='stretch')
+            if len(collab_table):
+                paged_dataframe(collab_table, "staff_collab", height=200)
             else:
                 st.write("無協作記錄")
             st.write("**不重複日期：**")
-            solo_days_str = [pd.to_datetime(day).strftime('%Y-%m-%d') for day in details['solo_days']]
-            collab_days_str = [pd.to_datetime(day).strftime('%Y-%m-%d') for day in details['collab_days']]
-            all_days_str = [pd.to_datetime(day).strftime('%Y-%m-%d') for day in details['all_days']]
-            st.write(f"單獨：{', '.join(solo_days_str)} → {len(details['solo_days'])} 天")
-            st.write(f"協作：{', '.join(collab_days_str)} → {len(details['collab_days'])} 天")
-            st.write(f"總計：{', '.join(all_days_str)} → {len(details['all_days'])} 天")
+            solo_days_str = format_dates(details.solo_days)
+            collab_days_str = format_dates(details.collab_days)
+            all_days_str = format_dates(details.all_days)
+            st.write(f"單獨：{', '.join(solo_days_str)} → {len(details.solo_days)} 天")
+            st.write(f"協作：{', '.join(collab_days_str)} → {len(details.collab_days)} 天")
+            st.write(f"總計：{', '.join(all_days_str)} → {len(details.all_days)} 天")
+            # 與其他員工同日外出的日數（日曆位元圖的交集）
+            overlap = bundle.staff_days.overlap_counts()
+            if selected_staff in overlap.index:
+                shared_days = overlap[selected_staff].drop(selected_staff)
+                shared_days = shared_days[shared_days > 0].sort_values(ascending=False)
+                if not shared_days.empty:
+                    st.write("同日外出：" + "、".join(f"{staff} {days} 天" for staff, days in shared_days.items()))
 
         st.subheader("院舍活動次數詳細統計")
         activity_options = [f"{count} 次" for count in home_counts.keys()]
         selected_activity_count = st.selectbox("選擇活動次數", ['選擇次數'] + activity_options, index=0, key="home_activity_select")
         if selected_activity_count != '選擇次數':
             count = int(selected_activity_count.split()[0])
-            filtered_homes = {home: dates for home, dates in home_details.items() if len(dates) == count}
-            if filtered_homes:
-                home_activity_data = [
-                    {'院舍名稱': home, '活動日期': ', '.join(pd.to_datetime(date).strftime('%Y-%m-%d') for date in sorted(dates))}
-                    for home, dates in filtered_homes.items()
-                ]
-                home_activity_df_detail = pd.DataFrame(home_activity_data)
-                home_activity_df_detail.index = home_activity_df_detail.index + 1
-                st.write(f"### 活動次數為 {count} 次的院舍（共 {len(filtered_homes)} 間）")
-                st.dataframe(home_activity_df_detail, height=300, width='stretch')
+            positions = home_activity.homes_with_visits(count)
+            if len(positions):
+                st.write(f"### 活動次數為 {count} 次的院舍（共 {len(positions)} 間）")
+                paged_dataframe(paging.home_visits_table(home_activity, positions), "home_activity_detail")
             else:
                 st.write(f"沒有活動次數為 {count} 次的院舍")
 
+        # 按日期範圍及最近未有活動查詢院舍（在各院舍已排序的日期上 searchsorted，多年資料亦可即時查詢）
+        first_date, last_date = home_activity.date_range()
+        if first_date is not None:
+            with st.expander("按日期範圍查詢院舍活動次數"):
+                controls = st.columns([2, 1, 1])
+                date_range = controls[0].date_input("日期範圍", value=(first_date.date(), last_date.date()),
+                                                    key="home_range_dates")
+                visits = controls[1].number_input("活動次數", min_value=0, value=1, step=1, key="home_range_count")
+                at_least = controls[2].checkbox("至少", value=True, key="home_range_at_least")
+                # 日期範圍只選了起始日時等待選取結束日
+                if len(date_range) == 2:
+                    start, end = date_range
+                    positions = home_activity.homes_with_visits(visits, start, end, at_least)
+                    st.write(f"{start} 至 {end} 活動次數{'至少' if at_least else '剛好'} {visits} 次的院舍：共 {len(positions)} 間")
+                    if len(positions):
+                        paged_dataframe(paging.home_visits_table(home_activity, positions, start, end), "home_range")
+            with st.expander("最近沒有活動的院舍"):
+                weeks = st.number_input("最近幾週", min_value=1, value=4, step=1, key="home_stale_weeks")
+                positions = home_activity.stale_homes(weeks, last_date)
+                st.write(f"截至 {last_date.date()}（資料中最後的活動日期）最近 {weeks} 週沒有活動的院舍：共 {len(positions)} 間")
+                st.caption("包括 homelist.csv 中本次上傳沒有任何記錄的院舍（以院舍編號顯示）")
+                if len(positions):
+                    paged_dataframe(paging.home_visits_table(home_activity, positions), "home_stale")
+
         st.subheader("活動類型詳細統計")
         region_list = ['選擇分區'] + list(region_stats.keys())
         selected_activity_region = st.selectbox("選擇分區查看活動類型統計", region_list, index=0, key="activity_type_select")
         if selected_activity_region != '選擇分區':
             st.write(f"### {selected_activity_region} 分區活動類型統計")
-            activity_types_0 = region_stats[selected_activity_region]['activity_types_0']
-            activity_types_1 = region_stats[selected_activity_region]['activity_types_1']
-            if activity_types_0 or activity_types_1:
-                if activity_types_0:
-                    st.write("**NumberOfSession = 0 次**")
-                    activity_type_data_0 = [
-                        {
-                            '活動類型': activity,
-                            '節數': details['count'],
-                            '活動日期': ', '.join(pd.to_datetime(date).strftime('%Y-%m-%d') for date in sorted(details['dates']))
-                        }
-                        for activity, details in activity_types_0.items()
-                    ]
-                    activity_type_df_0 = pd.DataFrame(activity_type_data_0)
-                    activity_type_df_0.loc[len(activity_type_df_0)] = ['總計', activity_type_df_0['節數'].sum(), '']
-                    activity_type_df_0.index = activity_type_df_0.index + 1
-                    st.dataframe(activity_type_df_0, height=200, width='stretch')
-                if activity_types_1:
-                    st.write("**NumberOfSession = 1 次**")
-                    activity_type_data_1 = [
-                        {
-                            '活動類型': activity,
-                            '節數': details['count'],
-                            '活動日期': ', '.join(pd.to_datetime(date).strftime('%Y-%m-%d') for date in sorted(details['dates']))
-                        }
-                        for activity, details in activity_types_1.items()
-                    ]
-                    activity_type_df_1 = pd.DataFrame(activity_type_data_1)
-                    activity_type_df_1.loc[len(activity_type_df_1)] = ['總計', activity_type_df_1['節數'].sum(), '']
-                    activity_type_df_1.index = activity_type_df_1.index + 1
-                    st.dataframe(activity_type_df_1, height=200, width='stretch')
+            selected_stats = region_stats[selected_activity_region]
+            if selected_stats.activity_types_0 or selected_stats.activity_types_1:
+                for session_val in (0, 1):
+                    if selected_stats.activity_types(session_val):
+                        type_table = paging.activity_dates_table(bundle, selected_activity_region, session_val)
+                        st.write(f"**NumberOfSession = {session_val} 次**（總計 {type_table.keys['節數'].sum()} 節）")
+                        paged_dataframe(type_table, f"activity_dates_{session_val}", height=200)
             else:
                 st.write("此分區無活動類型記錄")
+        laps.lap('render_drilldowns')
 
 # 統計圖頁面
 def stats_chart_page():
     st.title("統計圖")
-    if st.session_state['uploaded_df'] is None:
+    uploaded_df = current_upload()
+    if uploaded_df is None:
         st.warning("請先在「外出統計程式」頁面上傳 CSV 或 XLSX 檔案以生成圖表。")
         return
-    uploaded_df = st.session_state['uploaded_df']
     if '活動類型' in uploaded_df.columns:
         type_counts = uploaded_df['活動類型'].value_counts().reset_index()
         type_counts.columns = ['活動類型', '次數']
         type_counts.loc[len(type_counts)] = ['總計', type_counts['次數'].sum()]
         type_counts.index = type_counts.index + 1
 
+        # 以記錄最多的月份作為標題（第一行可能是空白或其他月份）；ServiceDate 已在讀檔時轉為 datetime64
+        periods = None
         if 'ServiceDate' in uploaded_df.columns:
-            try:
-                uploaded_df['ServiceDate'] = pd.to_datetime(uploaded_df['ServiceDate'], errors='coerce')
-                year = uploaded_df['ServiceDate'].dt.year.iloc[0]
-                month = uploaded_df['ServiceDate'].dt.month.iloc[0]
-                title = f"{year}年{month}月 份活動內容"
-            except Exception:
-                title = "2026年 份活動內容"
+            periods = uploaded_df['ServiceDate'].dropna().dt.to_period('M')
+        if periods is not None and not periods.empty:
+            period = periods.value_counts().index[0]
+            title = f"{period.year}年{period.month}月 份活動內容"
         else:
             title = "2026年 份活動內容"
 
@@ -720,25 +472,129 @@ def stats_chart_page():
     else:
         st.write("上傳的檔案中無「活動類型」欄位，無法生成圖表。")
 
+# 歷史統計頁（跨月份的員工及分區統計）
+def history_page():
+    st.title("歷史統計")
+    months = history.stored_months()
+    if not months:
+        st.warning("尚未有歷史記錄，請先在「外出統計程式」頁面按「加入歷史記錄」。")
+        return
+    years = sorted({m[:4] for m in months}, reverse=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        year = st.selectbox("年份", years, index=0, key="history_year")
+    with col2:
+        year_months = [m for m in months if m.startswith(f'{year}-')]
+        through = st.selectbox("截至月份", year_months, index=len(year_months) - 1, key="history_through")
+    selected_months = history.year_to_date_months(year, int(through[5:7]))
+    stats = history.history_stats(selected_months)
+    st.write(f"已包括月份：{', '.join(selected_months)}（{len(stats.df)} 筆記錄）")
+
+    col1, col2 = st.columns([7, 3])
+    with col1:
+        st.subheader("員工外出統計表（年初至今）")
+        st.dataframe(style_staff_table(staff_table(stats.staff_stats)), height=300, width='stretch')
+    with col2:
+        st.subheader("分區統計節數（年初至今）")
+        st.dataframe(region_table(stats.region_stats, True), height=300, width='stretch')
+
+    # 跨年度趨勢：圖表只讀取每月的彙總立方體，不載入原始記錄
+    st.subheader("跨年度趨勢")
+    manifest = history.read_manifest()
+    cube = load_history_cube(tuple((month, manifest[month]['hash']) for month in months))
+    dimensions = {label: key for key, label in graph.CUBE_DIMENSION_LABELS.items()}
+    measures = {label: key for key, label in graph.CUBE_MEASURE_LABELS.items()}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        measure = measures[st.selectbox("量度", list(measures), index=0, key="trend_measure")]
+    with col2:
+        dimension = dimensions[st.selectbox("分組", list(dimensions), index=0, key="trend_dimension")]
+    with col3:
+        staff_options = ['全部員工'] + sorted(cube['staff'].dropna().unique())
+        selected_staff = st.selectbox("員工", staff_options, index=0, key="trend_staff")
+    if selected_staff != '全部員工':
+        cube = cube[cube['staff'] == selected_staff]
+    elif dimension != 'staff':
+        # 全部員工的總數按記錄計算，協作記錄只計一次（按員工分組時仍按員工計算）
+        cube = cube.assign(**{name: cube[record] for name, record in history.RECORD_MEASURES.items()})
+    measure_label = graph.CUBE_MEASURE_LABELS[measure]
+    dimension_label = graph.CUBE_DIMENSION_LABELS[dimension]
+    st.plotly_chart(graph.create_trend_chart(cube, dimension, measure, f"每月{measure_label}（按{dimension_label}）"),
+                    width='stretch')
+    st.plotly_chart(graph.create_stacked_bar_chart(cube, dimension, measure, f"每月{measure_label}組成（按{dimension_label}）"),
+                    width='stretch')
+    st.plotly_chart(graph.create_year_over_year_chart(cube, measure, f"{measure_label}按年比較"), width='stretch')
+
 # 列表頁
 def list_page():
     st.title("GitHub homelist.csv 列表")
     df = get_github_csv_data(RAW_URL)
     if df is not None:
         st.subheader("homelist.csv 內容")
-        df.index = df.index + 1
-        st.dataframe(df, width='stretch')
+        st.caption(f"資料來源：{st.session_state.get('homelist_source')}")
+        # df 為多個 session 共用的物件，編號只加在顯示用的副本上
+        st.dataframe(df.set_index(df.index + 1), width='stretch')
+
+# 共用快取狀態頁：常駐大小、預算、命中率及淘汰次數（總計及按類別）
+def cache_stats_page():
+    st.title("共用快取狀態")
+    stats = shared_cache.SHARED_CACHE.stats()
+    columns = st.columns(4)
+    columns[0].metric("常駐大小 (MB)", f"{stats['size_bytes'] / 1024 / 1024:.1f}")
+    columns[1].metric("預算 (MB)", f"{stats['max_bytes'] / 1024 / 1024:.0f}")
+    columns[2].metric("項目數", stats['entries'])
+    columns[3].metric("命中率", "-" if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}")
+    if stats['kinds']:
+        kinds_df = pd.DataFrame.from_dict(stats['kinds'], orient='index').rename(columns={
+            'entries': '項目數', 'size_bytes': '大小 (bytes)', 'hits': '命中', 'misses': '未命中',
+            'hit_rate': '命中率', 'evictions': '按預算淘汰', 'expirations': '逾時淘汰'
+        })
+        st.dataframe(kinds_df, width='stretch')
+    st.caption(f"未被使用超過 {stats['ttl_seconds']} 秒的項目會被淘汰；JSON 格式：於網址加上 ?view=cache-stats")
 
 # 主程式
 def main():
+    # 監控用的快取狀態端點（Streamlit 不支援自訂 HTTP 路由，以 ?view=cache-stats 只輸出 JSON）
+    if st.query_params.get('view') == 'cache-stats':
+        st.json(shared_cache.SHARED_CACHE.stats())
+        return
+
+    # 各階段時間以 JSON lines 寫入 profiling.TIMING_LOG
+    profiling.configure_logging()
     st.sidebar.title("頁面導航")
-    page = st.sidebar.selectbox("選擇頁面", ["外出統計程式", "列表頁", "統計圖"], index=0)
-    if page == "外出統計程式":
-        outing_stats_page()
-    elif page == "列表頁":
-        list_page()
-    elif page == "統計圖":
-        stats_chart_page()
+    page = st.sidebar.selectbox("選擇頁面", ["外出統計程式", "列表頁", "統計圖", "歷史統計", "共用快取狀態"], index=0)
+
+    # 效能診斷：顯示本次執行各階段的時間及記憶體高峰（開啟後以 tracemalloc 量度記憶體，執行會變慢）
+    diagnostics = st.sidebar.checkbox("顯示效能診斷", key="diagnostics")
+    capture = diagnostics and st.sidebar.button("擷取本次執行的 cProfile", key="capture_profile")
+    recorder = profiling.Recorder(trace_memory=diagnostics)
+    with profiling.capture_profile(capture) as profile, recorder.activate():
+        if page == "外出統計程式":
+            outing_stats_page()
+        elif page == "列表頁":
+            list_page()
+        elif page == "統計圖":
+            stats_chart_page()
+        elif page == "歷史統計":
+            history_page()
+        elif page == "共用快取狀態":
+            cache_stats_page()
+
+    if diagnostics:
+        with st.sidebar.expander("效能診斷", expanded=True):
+            if recorder.stages:
+                stages_df = pd.DataFrame(recorder.stages).drop(columns=['run']).rename(columns={
+                    'stage': '階段', 'seconds': '秒', 'rows': '行數', 'rows_per_second': '每秒行數', 'peak_mb': '記憶體高峰 (MB)'
+                })
+                st.dataframe(stages_df, hide_index=True, width='stretch')
+                st.write(f"合計：{recorder.total_seconds():.3f} 秒（快取命中的階段接近 0 秒）")
+            else:
+                st.write("本頁沒有量度的階段")
+            if profile['path']:
+                st.write(f"cProfile 已寫入：{profile['path']}")
+                with open(profile['path'], 'rb') as f:
+                    st.download_button("下載 .prof", data=f.read(), file_name=os.path.basename(profile['path']),
+                                       mime="application/octet-stream", key="profile_download")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import homelist
+import ingest
+import report
+from outing_stats import compute_stats_bundle
+from report import build_report_tables
+
+SUPPORTED_SUFFIXES = ('.csv', '.xlsx')
+OUTPUT_FORMATS = ('csv', 'json', 'parquet', 'xlsx')
+
+
+# 以檔案中最常見的 ServiceDate 年月作為月份標籤，無法判斷時為 None
+def detect_month(df):
+    months = df['ServiceDate'].dt.strftime('%Y-%m').dropna()
+    return months.mode().iloc[0] if not months.empty else None
+
+
+def write_table(table, path_stem, fmt):
+    if fmt == 'csv':
+        table.to_csv(f'{path_stem}.csv', index=False, encoding='utf-8-sig')
+    elif fmt == 'parquet':
+        # 總計行令部分欄位混合數字與文字，Parquet 需統一為字串
+        mixed = [col for col in table.columns if table[col].dtype == object]
+        table.astype({col: str for col in mixed}).to_parquet(f'{path_stem}.parquet', index=False)
+    else:
+        raise ValueError(f'不支援的輸出格式：{fmt}')
+
+
+def write_tables(tables, output_dir, fmt):
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == 'xlsx':
+        report.write_tables_xlsx(tables, os.path.join(output_dir, 'report.xlsx'))
+    elif fmt == 'json':
+        payload = {name: json.loads(table.to_json(orient='records', force_ascii=False)) for name, table in tables.items()}
+        with open(os.path.join(output_dir, 'report.json'), 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+    else:
+        for name, table in tables.items():
+            write_table(table, os.path.join(output_dir, name), fmt)
+
+
+# 處理單一檔案（在子進程中執行）：讀檔 → 統計 → 寫出該月份報表，回傳摘要
+# 報表資料夾以完整檔名命名（含副檔名）：2025-01.csv 與 2025-01.xlsx 不會寫入同一資料夾，
+# 亦不會與合併摘要的 summary 資料夾相同
+def process_file(path, output_dir, fmt, github_df):
+    started = time.perf_counter()
+    name = os.path.basename(path)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        df, parse_info = ingest.parse_upload(data, path)
+        bundle = compute_stats_bundle(df, github_df)
+        tables = build_report_tables(bundle)
+        if fmt == 'xlsx':
+            # XLSX 輸出為包含全部明細的完整報表（與頁面的「下載完整報表」相同）
+            report.write_report(bundle, os.path.join(output_dir, name, 'report.xlsx'))
+        else:
+            write_tables(tables, os.path.join(output_dir, name), fmt)
+    except Exception as e:
+        return {'file': name, 'status': 'error', 'error': str(e)}
+    month = detect_month(bundle.df)
+    return {
+        'file': name,
+        'status': 'ok',
+        'month': month,
+        'rows': len(df),
+        'encoding': parse_info['encoding'],
+        'bad_lines': len(parse_info['bad_lines']),
+        'issues': {issue.code: issue.count for issue in bundle.issues},
+        'seconds': round(time.perf_counter() - started, 3),
+        'staff': tables['staff'].assign(file=name, month=month),
+        'region': tables['region'].assign(file=name, month=month),
+    }
+
+
+def load_homelist_arg(value):
+    if value and os.path.exists(value):
+        return pd.read_csv(value), homelist.SOURCE_LOCAL
+    return homelist.load_homelist(value or homelist.RAW_URL)
+
+
+def find_input_files(input_dir):
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(SUPPORTED_SUFFIXES) and not name.startswith('~$')
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='批次計算多個月份匯出檔的外出統計報表')
+    parser.add_argument('input_dir', help='存放每月 CSV/XLSX 匯出檔的資料夾')
+    parser.add_argument('-o', '--output-dir', default='reports', help='輸出資料夾（預設：reports）')
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='csv', help='輸出格式（預設：csv）')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='並行進程數（預設：CPU 核心數；1 為不開進程池）')
+    parser.add_argument('--homelist', default=None, help='homelist.csv 的本地路徑或 URL（預設：GitHub，失敗時用本地副本）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = find_input_files(args.input_dir)
+    if not files:
+        print(f'{args.input_dir} 中沒有 .csv 或 .xlsx 檔案', file=sys.stderr)
+        return 1
+    github_df, source = load_homelist_arg(args.homelist)
+    print(f'homelist.csv 來源：{source}；共 {len(files)} 個檔案', file=sys.stderr)
+
+    results = []
+    if args.workers == 1:
+        for path in files:
+            results.append(process_file(path, args.output_dir, args.format, github_df))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(process_file, path, args.output_dir, args.format, github_df) for path in files]
+            for future in as_completed(futures):
+                results.append(future.result())
+    results.sort(key=lambda r: r['file'])
+
+    for result in results:
+        if result['status'] == 'ok':
+            print(f"{result['file']}: {result['month']}，{result['rows']} 行，{result['seconds']} 秒", file=sys.stderr)
+        else:
+            print(f"{result['file']}: 失敗 - {result['error']}", file=sys.stderr)
+
+    # 合併摘要：所有月份的員工表及分區表，以及每個檔案的處理狀態
+    ok_results = [r for r in results if r['status'] == 'ok']
+    if ok_results:
+        summary_tables = {
+            'staff': pd.concat([r['staff'] for r in ok_results], ignore_index=True),
+            'region': pd.concat([r['region'] for r in ok_results], ignore_index=True),
+        }
+        write_tables(summary_tables, os.path.join(args.output_dir, 'summary'), args.format)
+    manifest = [{k: v for k, v in r.items() if k not in ('staff', 'region')} for r in results]
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'homelist_source': source, 'files': manifest}, f, ensure_ascii=False, indent=2)
+    return 0 if len(ok_results) == len(results) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import homelist
+import ingest
+import synthetic
+from outing_stats import (
+    HomeIndex, calculate_home_activity_stats, calculate_region_stats, calculate_staff_stats,
+    classify_regions, compute_stats_bundle, get_staff_details
+)
+
+DEFAULT_SIZES = (10_000, 100_000)
+DEFAULT_REPEATS = 5
+# 比基準慢超過此倍數（或記憶體高峰超過此倍數）即視為退步
+DEFAULT_THRESHOLD = 1.25
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+# 每個階段：(名稱, 由準備好的輸入建立待計時函數)
+# read_file 以 ingest.parse_upload 計時（不經解析快取）；check_local 已改為 classify_regions 一次向量化查表
+def build_stages(data, github_df):
+    raw_df, _ = ingest.parse_upload(data, 'bench.csv')
+    home_index = HomeIndex.from_homelist(github_df)
+    bundle = compute_stats_bundle(raw_df, github_df)
+    df = bundle.df
+    busiest = df['RespStaff'].value_counts().index[0]
+    return [
+        ('read_file', lambda: ingest.parse_upload(data, 'bench.csv')),
+        ('check_local', lambda: classify_regions(df, home_index)),
+        ('calculate_staff_stats', lambda: calculate_staff_stats(df, home_index)),
+        ('calculate_region_stats', lambda: calculate_region_stats(df, home_index)),
+        ('get_staff_details', lambda: get_staff_details(df, busiest, bundle.staff_index)),
+        ('calculate_home_activity_stats', lambda: calculate_home_activity_stats(df)),
+    ]
+
+
+# 取多次執行的最快時間；記憶體高峰另外以 tracemalloc 量度一次（避免影響計時）
+def measure(func, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(times), 6), 'peak_mb': round(peak / 1024 / 1024, 3)}
+
+
+def run_benchmarks(sizes, repeats, github_df, seed=0):
+    results = {}
+    for rows in sizes:
+        data = synthetic.export_bytes(synthetic.generate_export(rows, seed=seed, github_df=github_df))
+        results[str(rows)] = {name: measure(func, repeats) for name, func in build_stages(data, github_df)}
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    payload = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+# 與基準比較，回傳報告行及退步項目
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    rows, regressions = [], []
+    base_results = (baseline or {}).get('results', {})
+    for size, stages in results.items():
+        for name, current in stages.items():
+            base = base_results.get(size, {}).get(name)
+            row = {'rows': int(size), 'stage': name, 'seconds': current['seconds'], 'peak_mb': current['peak_mb'],
+                   'base_seconds': None, 'base_peak_mb': None, 'time_ratio': None, 'mem_ratio': None, 'status': '新增'}
+            if base:
+                row.update(base_seconds=base['seconds'], base_peak_mb=base['peak_mb'])
+                row['time_ratio'] = round(current['seconds'] / base['seconds'], 2) if base['seconds'] else None
+                row['mem_ratio'] = round(current['peak_mb'] / base['peak_mb'], 2) if base['peak_mb'] else None
+                slower = row['time_ratio'] is not None and row['time_ratio'] > threshold
+                bigger = row['mem_ratio'] is not None and row['mem_ratio'] > threshold
+                row['status'] = '退步' if slower or bigger else '正常'
+                if slower or bigger:
+                    regressions.append(row)
+            rows.append(row)
+    return pd.DataFrame(rows), regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='以模擬資料量度統計流程各階段的時間及記憶體，並與基準比較')
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='模擬資料行數（預設：10000 100000）')
+    parser.add_argument('-r', '--repeats', type=int, default=DEFAULT_REPEATS, help='每階段重複次數，取最快（預設：5）')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基準檔案路徑（預設：bench_baseline.json）')
+    parser.add_argument('--save-baseline', action='store_true', help='以本次結果覆寫基準')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='退步判斷倍數（預設：1.25）')
+    parser.add_argument('--report', default=None, help='將比較報告另存為 CSV')
+    parser.add_argument('--seed', type=int, default=0, help='隨機種子（預設：0）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    github_df = pd.read_csv(homelist.BUNDLED_PATH)
+    results = run_benchmarks(args.sizes, args.repeats, github_df, args.seed)
+    report, regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report.to_string(index=False))
+    if args.report:
+        report.to_csv(args.report, index=False, encoding='utf-8-sig')
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f'已儲存基準至 {args.baseline}', file=sys.stderr)
+        return 0
+    if regressions:
+        print(f'{len(regressions)} 個階段比基準退步超過 {args.threshold} 倍', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -77,3 +77,103 @@ def create_activity_type_donut_chart(type_counts, title, chart_width=800, chart_
     )
 
     return fig
+
+
+# 彙總立方體維度的顯示名稱，以及空值的顯示文字
+CUBE_DIMENSION_LABELS = {
+    'staff': '員工',
+    'region': '本區/外區',
+    'mode': '單獨/協作',
+    'session': 'NumberOfSession',
+    'activity': '活動類型',
+}
+CUBE_MEASURE_LABELS = {'sessions': '節數', 'participants': '服務人次'}
+MISSING_LABEL = '未填'
+
+
+def _cube_pivot(cube, index, dimension, measure):
+    """
+    將彙總立方體按 index 及 dimension 加總為寬表（只讀取立方體，不需原始記錄）
+    :param cube: history.load_cube 的結果
+    :param index: 作為行的欄位，例如 'month'
+    :param dimension: 作為列（分組）的維度，None 表示不分組
+    :param measure: 'sessions' 或 'participants'
+    :return: DataFrame，index 已排序
+    """
+    if dimension is None:
+        return cube.groupby(index)[measure].sum().to_frame(CUBE_MEASURE_LABELS[measure]).sort_index()
+    labels = cube[dimension].astype(object)
+    labels = labels.where(labels.notna(), MISSING_LABEL).astype(str)
+    table = cube.assign(**{dimension: labels}).pivot_table(
+        index=index, columns=dimension, values=measure, aggfunc='sum', fill_value=0
+    )
+    # 總量較大的分組排在前面
+    return table[table.sum().sort_values(ascending=False).index].sort_index()
+
+
+def _layout(fig, title, x_title, y_title, legend_title, chart_height, chart_font_size, title_font_size):
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=title_font_size, family='Microsoft JhengHei, sans-serif'), x=0.5, xanchor='center'),
+        xaxis=dict(title=x_title, type='category'),
+        yaxis=dict(title=y_title),
+        legend=dict(
+            title=dict(text=legend_title, font=dict(size=chart_font_size, family='Microsoft JhengHei, sans-serif')),
+            font=dict(size=chart_font_size, family='Microsoft JhengHei, sans-serif'),
+        ),
+        height=chart_height,
+        font=dict(family='Microsoft JhengHei, sans-serif', size=chart_font_size)
+    )
+    return fig
+
+
+def create_trend_chart(cube, dimension, measure, title, chart_height=500, chart_font_size=14, title_font_size=20):
+    """
+    創建按月份的趨勢折線圖（每個分組一條線）
+    :param cube: history.load_cube 的彙總立方體
+    :param dimension: 分組維度（CUBE_DIMENSION_LABELS 的鍵），None 表示只顯示總數
+    :param measure: 'sessions' 或 'participants'
+    :param title: 圖表標題
+    :return: Plotly Figure 對象
+    """
+    table = _cube_pivot(cube, 'month', dimension, measure)
+    fig = go.Figure(data=[
+        go.Scatter(x=table.index, y=table[col], mode='lines+markers', name=str(col))
+        for col in table.columns
+    ])
+    return _layout(fig, title, '月份', CUBE_MEASURE_LABELS[measure], CUBE_DIMENSION_LABELS.get(dimension, ''),
+                   chart_height, chart_font_size, title_font_size)
+
+
+def create_year_over_year_chart(cube, measure, title, chart_height=500, chart_font_size=14, title_font_size=20):
+    """
+    創建按年份比較的折線圖（X 軸為 1-12 月，每年一條線）
+    :param cube: history.load_cube 的彙總立方體（可先篩選員工、活動類型等）
+    :param measure: 'sessions' 或 'participants'
+    :param title: 圖表標題
+    :return: Plotly Figure 對象
+    """
+    months = cube['month'].astype(str)
+    table = cube.assign(year=months.str[:4], calendar_month=months.str[5:7].astype(int)).pivot_table(
+        index='calendar_month', columns='year', values=measure, aggfunc='sum'
+    ).sort_index()
+    fig = go.Figure(data=[
+        go.Scatter(x=[f'{m}月' for m in table.index], y=table[year], mode='lines+markers', name=f'{year}年')
+        for year in sorted(table.columns)
+    ])
+    return _layout(fig, title, '月份', CUBE_MEASURE_LABELS[measure], '年份', chart_height, chart_font_size, title_font_size)
+
+
+def create_stacked_bar_chart(cube, dimension, measure, title, chart_height=500, chart_font_size=14, title_font_size=20):
+    """
+    創建按月份的堆疊棒形圖（每個分組一段）
+    :param cube: history.load_cube 的彙總立方體
+    :param dimension: 堆疊的維度（CUBE_DIMENSION_LABELS 的鍵）
+    :param measure: 'sessions' 或 'participants'
+    :param title: 圖表標題
+    :return: Plotly Figure 對象
+    """
+    table = _cube_pivot(cube, 'month', dimension, measure)
+    fig = go.Figure(data=[go.Bar(x=table.index, y=table[col], name=str(col)) for col in table.columns])
+    fig.update_layout(barmode='stack')
+    return _layout(fig, title, '月份', CUBE_MEASURE_LABELS[measure], CUBE_DIMENSION_LABELS[dimension],
+                   chart_height, chart_font_size, title_font_size)
@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from incremental import row_keys
+from outing_stats import (
+    StatsBundle, calculate_region_stats, calculate_staff_stats, categorize_columns, extract_home_numbers, has_value,
+    parse_int_values
+)
+from shared_cache import atomic_write
+
+# 歷史記錄目錄（按月份分區的 Parquet），可用環境變數 MONTHLYSTAT_HISTORY_DIR 覆寫
+HISTORY_DIR = os.environ.get(
+    'MONTHLYSTAT_HISTORY_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history')
+)
+
+MANIFEST_NAME = '_manifest.json'
+PARTITION_COLUMN = 'month'
+CUBE_NAME = 'cube.parquet'
+
+# 歷史記錄的正規化欄位
+HISTORY_COLUMNS = [
+    'ServiceDate', 'HomeName', 'Home', 'Region',
+    'RespStaff', '2ndRespStaffName', 'RespRegion', 'SecondRegion',
+    'NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)', '活動類型', 'ServiceStatus',
+]
+
+# 計算員工及分區統計所需的欄位
+STATS_COLUMNS = [
+    'ServiceDate', 'HomeName', 'Home', 'Region',
+    'RespStaff', '2ndRespStaffName', 'RespRegion', 'SecondRegion',
+    'NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)', '活動類型',
+]
+
+# 每月彙總立方體的維度及量度：員工 × 月份 × 本區/外區 × 單獨/協作 × NumberOfSession × 活動類型
+# sessions 為記錄數（與員工外出統計表相同，協作記錄兩位員工各計一次）；participants 為參與人數總和
+# records 及 record_participants 只計在負責員工的一行（每筆記錄只計一次），不按員工篩選時使用，避免協作記錄重複計算
+CUBE_DIMENSIONS = ['staff', 'region', 'mode', 'session', 'activity']
+CUBE_MEASURES = ['sessions', 'participants', 'records', 'record_participants']
+# 不按員工篩選時，每個按員工計算的量度對應的按記錄量度
+RECORD_MEASURES = {'sessions': 'records', 'participants': 'record_participants'}
+
+_lock = threading.Lock()
+
+
+# 將統計結果包中的上傳資料正規化為歷史記錄格式：已轉換名稱、datetime 日期、院舍編號、分區及整數 session
+def normalize_for_history(bundle):
+    df = bundle.df
+    home_numbers = extract_home_numbers(df['HomeName'])
+    normalized = pd.DataFrame({
+        'ServiceDate': df['ServiceDate'],
+        'HomeName': df['HomeName'].astype(object),
+        'Home': home_numbers.astype(object),
+        'Region': home_numbers.map(bundle.home_index.owners).astype(object),
+        'RespStaff': df['RespStaff'].astype(object),
+        '2ndRespStaffName': df['2ndRespStaffName'].astype(object),
+        'RespRegion': df['RespRegion'].astype(object),
+        'SecondRegion': df['SecondRegion'].astype(object),
+    }, index=df.index)
+    for col in ['NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)']:
+        normalized[col] = parse_int_values(df[col]) if col in df.columns else float('nan')
+    for col in ['活動類型', 'ServiceStatus']:
+        normalized[col] = df[col].astype(object) if col in df.columns else None
+    return normalized.reset_index(drop=True)
+
+
+def _month_hash(month_df):
+    return format(int(pd.util.hash_pandas_object(month_df, index=False).sum()) & 0xFFFFFFFFFFFFFFFF, '016x')
+
+
+def _partition_path(store_dir, month):
+    return os.path.join(store_dir, f'{PARTITION_COLUMN}={month}', 'data.parquet')
+
+
+def _cube_path(store_dir, month):
+    return os.path.join(store_dir, f'{PARTITION_COLUMN}={month}', CUBE_NAME)
+
+
+# 先寫暫存檔再替換，避免讀到寫了一半的 Parquet
+def _write_parquet(df, path):
+    atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+# 由一個月份的歷史記錄建立彙總立方體：負責員工及第二負責員工各展開一行後按全部維度加總
+# 規則與 calculate_staff_stats 相同：有第二負責員工即為協作，第二負責員工使用 SecondRegion
+# 每筆記錄（包括沒有負責員工的記錄）的 records 及 record_participants 只計在負責員工的一行
+def build_cube(month_df):
+    resp_staff = month_df['RespStaff']
+    second_staff = month_df['2ndRespStaffName']
+    has_resp = resp_staff.notna().to_numpy()
+    has_second = has_value(second_staff).to_numpy()
+    participants = month_df['NumberOfParticipant(Without Volunteer Count)'].fillna(0).to_numpy()
+    common = {
+        'session': month_df['NumberOfSession'].astype('Int64').to_numpy(),
+        'activity': month_df['活動類型'].to_numpy(),
+    }
+    long_df = pd.concat([
+        pd.DataFrame({'staff': resp_staff.to_numpy(), 'region': month_df['RespRegion'].to_numpy(),
+                      'mode': np.where(has_second, '協作', '單獨'), **common,
+                      'sessions': has_resp.astype(np.int64), 'participants': np.where(has_resp, participants, 0),
+                      'records': 1, 'record_participants': participants}),
+        pd.DataFrame({'staff': second_staff.to_numpy(), 'region': month_df['SecondRegion'].to_numpy(),
+                      'mode': '協作', **common,
+                      'sessions': 1, 'participants': participants,
+                      'records': 0, 'record_participants': 0})[has_resp & has_second],
+    ], ignore_index=True)
+    cube = long_df.groupby(CUBE_DIMENSIONS, dropna=False, sort=True)[CUBE_MEASURES].sum().reset_index()
+    cube['session'] = cube['session'].astype('Int64')
+    return cube
+
+
+def read_manifest(store_dir=HISTORY_DIR):
+    try:
+        with open(os.path.join(store_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(store_dir, manifest):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    atomic_write(os.path.join(store_dir, MANIFEST_NAME), write)
+
+
+# 行鍵（incremental.row_keys）：讀回的分區文字欄為 str dtype，先統一為 object（空值為 None），與新資料的行鍵一致
+def _history_row_keys(df):
+    text_columns = [col for col in df.columns if pd.api.types.is_string_dtype(df[col].dtype)]
+    frame = df.astype({col: object for col in text_columns})
+    frame[text_columns] = frame[text_columns].where(frame[text_columns].notna(), None)
+    return row_keys(frame)
+
+
+# 新資料的日期範圍（按日）是否涵蓋已儲存月份的日期範圍；涵蓋時視為該月份的完整匯出（可刪除或修改記錄），整個取代
+# 行數較少不代表只是部分資料：更正後重新匯出（例如刪除重複員工的記錄）的行數亦會減少
+def _covers(month_df, stored):
+    dates, stored_dates = month_df['ServiceDate'].dt.normalize(), stored['ServiceDate'].dt.normalize()
+    return dates.min() <= stored_dates.min() and dates.max() >= stored_dates.max()
+
+
+# 保留已儲存的記錄，只加入行鍵不在已儲存記錄中的新記錄
+def _merge_month(stored, month_df):
+    added = ~_history_row_keys(month_df).isin(_history_row_keys(stored))
+    merged = pd.concat([stored.astype(object), month_df[added].astype(object)], ignore_index=True)
+    merged['ServiceDate'] = pd.to_datetime(merged['ServiceDate'])
+    for col in ['NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)']:
+        merged[col] = merged[col].astype(np.float64)
+    return merged.sort_values('ServiceDate', kind='stable').reset_index(drop=True)
+
+
+# 將一份上傳資料按 ServiceDate 年月寫入歷史記錄；內容雜湊未改變的月份直接略過
+# 新資料的日期範圍涵蓋已儲存的月份時整個取代（包括更正後行數減少的匯出）；不涵蓋時（例如只含月尾補登的記錄，或跨兩個月的匯出檔）按行鍵合併
+# 回傳 {'written': [...], 'merged': [...], 'nothing_new': [...], 'skipped': [...], 'dropped_rows': 無日期行數}
+# merged 為合併寫入的月份（亦列在 written 中）；nothing_new 為需要合併但全部記錄已儲存的月份；skipped 為內容未改變的月份
+def ingest_bundle(bundle, store_dir=HISTORY_DIR, source=None):
+    normalized = normalize_for_history(bundle)
+    has_date = normalized['ServiceDate'].notna()
+    normalized = normalized[has_date]
+    months = normalized['ServiceDate'].dt.strftime('%Y-%m')
+
+    written, merged, nothing_new, skipped = [], [], [], []
+    with _lock:
+        os.makedirs(store_dir, exist_ok=True)
+        manifest = read_manifest(store_dir)
+        for month, month_df in normalized.groupby(months, sort=True):
+            month_df = month_df.sort_values('ServiceDate', kind='stable').reset_index(drop=True)
+            digest = _month_hash(month_df)
+            path = _partition_path(store_dir, month)
+            if manifest.get(month, {}).get('hash') == digest and os.path.exists(path):
+                skipped.append(month)
+                continue
+            if month in manifest and os.path.exists(path):
+                stored = pd.read_parquet(path)
+                if not _covers(month_df, stored):
+                    month_df = _merge_month(stored, month_df)
+                    if len(month_df) == len(stored):
+                        nothing_new.append(month)
+                        continue
+                    digest = _month_hash(month_df)
+                    merged.append(month)
+            _write_parquet(month_df, path)
+            # 彙總立方體隨月份分區一併重算，其他月份的立方體不受影響
+            _write_parquet(build_cube(month_df), _cube_path(store_dir, month))
+            manifest[month] = {
+                'hash': digest,
+                'rows': len(month_df),
+                'source': source,
+                'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            written.append(month)
+        if written:
+            _write_manifest(store_dir, manifest)
+    return {'written': written, 'merged': merged, 'nothing_new': nothing_new, 'skipped': skipped,
+            'dropped_rows': int((~has_date).sum())}
+
+
+# 已儲存的月份（按時間排序）
+def stored_months(store_dir=HISTORY_DIR):
+    return sorted(read_manifest(store_dir))
+
+
+# 讀取歷史記錄，只載入指定欄位及月份分區
+def load_history(columns=None, months=None, store_dir=HISTORY_DIR):
+    available = stored_months(store_dir)
+    if months is not None:
+        available = [m for m in available if m in set(months)]
+    if not available:
+        return pd.DataFrame(columns=columns if columns is not None else HISTORY_COLUMNS + [PARTITION_COLUMN])
+    frames = []
+    for month in available:
+        frame = pd.read_parquet(_partition_path(store_dir, month), columns=columns)
+        frame[PARTITION_COLUMN] = month
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+# 指定年份由 1 月至指定月份（含）的月份清單
+def year_to_date_months(year, through_month=12, store_dir=HISTORY_DIR):
+    return [m for m in stored_months(store_dir) if m.startswith(f'{year}-') and int(m[5:7]) <= through_month]
+
+
+# 讀取多個月份的彙總立方體（每月一個檔案，直接串接即為合併結果），圖表只需讀取立方體而不需讀取原始記錄
+# 加入立方體之前已儲存的月份，或缺少新增量度的舊立方體，會由分區資料補建一次
+def load_cube(months=None, store_dir=HISTORY_DIR):
+    available = stored_months(store_dir)
+    if months is not None:
+        available = [m for m in available if m in set(months)]
+    frames = []
+    for month in available:
+        path = _cube_path(store_dir, month)
+        frame = pd.read_parquet(path) if os.path.exists(path) else None
+        if frame is None or not set(CUBE_MEASURES) <= set(frame.columns):
+            with _lock:
+                frame = build_cube(load_history(HISTORY_COLUMNS, [month], store_dir))
+                _write_parquet(frame, path)
+        frame[PARTITION_COLUMN] = month
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=[PARTITION_COLUMN] + CUBE_DIMENSIONS + CUBE_MEASURES)
+    cube = pd.concat(frames, ignore_index=True)
+    return cube[[PARTITION_COLUMN] + CUBE_DIMENSIONS + CUBE_MEASURES]
+
+
+# 由歷史記錄計算多個月份的員工及分區統計（使用已儲存的區域判斷，不需重新讀取 homelist.csv）
+def history_stats(months, store_dir=HISTORY_DIR):
+    df = categorize_columns(load_history(STATS_COLUMNS, months, store_dir))
+    staff_stats, staff_days, staff_index = calculate_staff_stats(df, None)
+    region_stats, total_sessions, total_participants = calculate_region_stats(df, None)
+    return StatsBundle(
+        df=df,
+        staff_stats=staff_stats,
+        staff_days=staff_days,
+        staff_index=staff_index,
+        region_stats=region_stats,
+        total_sessions=total_sessions,
+        total_participants=total_participants,
+    )
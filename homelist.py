@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from io import StringIO
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared_cache import CACHE_DIR, SHARED_CACHE, atomic_write, frame_size
+
+# GitHub Raw URL
+RAW_URL = "https://raw.githubusercontent.com/KellifizW/MonthlyStat/main/homelist.csv"
+
+# 本地隨附的 homelist.csv（遠端無法連線時的最後後備）
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'homelist.csv')
+
+# 記憶體快取有效秒數、網絡逾時秒數（連線及每次讀取），以及頁面等待背景讀取的總秒數
+DEFAULT_TTL = 300
+DEFAULT_TIMEOUT = 5
+DEFAULT_DEADLINE = 8
+
+# 資料來源標記
+SOURCE_CACHE = 'cache'              # 進程內快取（未過期）
+SOURCE_REVALIDATED = 'revalidated'  # 已過期，遠端回覆 304 未修改
+SOURCE_NETWORK = 'network'          # 從遠端下載新內容
+SOURCE_LOCAL = 'local'              # 遠端無法連線，使用磁碟副本或隨附檔案
+
+
+class HomelistUnavailable(RuntimeError):
+    pass
+
+
+_lock = threading.Lock()
+_entries = {}
+_session = None
+# 背景讀取用的執行緒池；同一網址同時只有一個讀取在進行，多個 session 共用
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='homelist')
+_pending = {}
+
+
+# 共用的連線池 Session（整個進程一個）
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _disk_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    return (os.path.join(CACHE_DIR, f'homelist-{key}.csv'),
+            os.path.join(CACHE_DIR, f'homelist-{key}.json'))
+
+
+def _read_disk_copy(url):
+    csv_path, meta_path = _disk_paths(url)
+    try:
+        with open(csv_path, encoding='utf-8') as f:
+            text = f.read()
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+    return text, meta
+
+
+def _write_disk_copy(url, text, meta):
+    csv_path, meta_path = _disk_paths(url)
+    try:
+        # 先寫暫存檔再替換，避免多個 session 同時寫入時讀到半個檔案
+        for path, content in ((csv_path, text), (meta_path, json.dumps(meta))):
+            atomic_write(path, lambda tmp_path: _write_text(tmp_path, content))
+    except OSError:
+        pass
+
+
+def _write_text(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+# 解析後的 DataFrame 放在共用快取（以內容雜湊為鍵），相同內容（遠端、磁碟副本或隨附檔案）只保存一份
+def _parse(text):
+    key = ('homelist', hashlib.sha256(text.encode('utf-8')).hexdigest())
+    df = SHARED_CACHE.get(key)
+    if df is None:
+        df = pd.read_csv(StringIO(text))
+        SHARED_CACHE.put(key, df, frame_size(df))
+    return df
+
+
+def _store(url, text, meta, source):
+    df = _parse(text)
+    with _lock:
+        _entries[url] = {'text': text, 'meta': meta, 'loaded_at': time.monotonic()}
+    return df, source
+
+
+# 讀取 homelist.csv，回傳 (DataFrame, 來源)；DataFrame 為多個 session 共用的物件，不可修改
+# 次序：未過期的進程快取 → 以 ETag/Last-Modified 向遠端重新驗證 → 下載 → 磁碟副本 → 隨附檔案
+def load_homelist(url, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT):
+    with _lock:
+        entry = _entries.get(url)
+    if entry is not None and time.monotonic() - entry['loaded_at'] < ttl:
+        return _parse(entry['text']), SOURCE_CACHE
+
+    if entry is not None:
+        text, meta = entry['text'], entry['meta']
+    else:
+        text, meta = _read_disk_copy(url)
+
+    headers = {}
+    if text is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and text is not None:
+            return _store(url, text, meta, SOURCE_REVALIDATED)
+        if response.status_code == 200:
+            meta = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            _write_disk_copy(url, response.text, meta)
+            return _store(url, response.text, meta, SOURCE_NETWORK)
+    except requests.RequestException:
+        pass
+
+    # 遠端無法使用：優先用最近下載的副本，其次用隨附的 homelist.csv
+    # 不更新進程快取：保留原有的 ETag/Last-Modified 以便遠端恢復後重新驗證，下次讀取亦會再次嘗試遠端
+    return _parse(text if text is not None else _bundled_text()), SOURCE_LOCAL
+
+
+def _bundled_text():
+    try:
+        with open(BUNDLED_PATH, encoding='utf-8') as f:
+            return f.read()
+    except OSError as e:
+        raise HomelistUnavailable(f'無法從遠端或本地取得 homelist.csv：{e}') from e
+
+
+# 在背景執行緒開始讀取 homelist.csv，回傳 Future（結果與 load_homelist 相同）
+# 進程快取未過期時直接回傳已完成的 Future；同一網址已有讀取在進行時共用該讀取
+def prefetch(url, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT):
+    with _lock:
+        entry = _entries.get(url)
+        if entry is not None and time.monotonic() - entry['loaded_at'] < ttl:
+            future = Future()
+            future.set_result((_parse(entry['text']), SOURCE_CACHE))
+            return future
+        future = _pending.get(url)
+        if future is None or future.done():
+            future = _executor.submit(load_homelist, url, ttl, timeout)
+            _pending[url] = future
+        return future
+
+
+# 等待背景讀取最多 deadline 秒；逾時則改用磁碟副本或隨附檔案（背景讀取會繼續，完成後更新進程快取）
+# 回傳的 DataFrame 與 load_homelist 相同，為共用物件
+def wait_homelist(future, url, deadline=DEFAULT_DEADLINE):
+    try:
+        return future.result(timeout=deadline)
+    except FutureTimeout:
+        text, _ = _read_disk_copy(url)
+        return _parse(text if text is not None else _bundled_text()), SOURCE_LOCAL
+
+
+# 清除進程內快取（磁碟副本保留）
+def clear_cache():
+    with _lock:
+        _entries.clear()
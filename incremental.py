@@ -0,0 +1,210 @@
+import dataclasses
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from outing_stats import (
+    DATE_FORMAT, INPUT_COLUMNS, SERVICE_DATE_TEXT, STAFF_COUNT_COLUMNS, HomeActivity, HomeIndex, StatsBundle,
+    StatsValidationError, attach_region_positions, build_staff_index, has_value, duplicate_records, empty_region_stats,
+    home_count_distribution, parse_int_values, prepare_frame, region_rows, staff_long_table, staff_stats_from_counts,
+    stats_bundle_from_frame, validate_inputs, validate_rows
+)
+from profiling import stage
+from staff_calendar import DayCalendar
+
+# 新增及移除的行數超過新資料行數的此比例時直接全部重算（差異太大時增量沒有好處）
+DELTA_MAX_FRACTION = 0.5
+
+# 以 parse_int_values 正規化後才計算行鍵的欄位（同一數值在不同匯出檔可能讀成整數、浮點數或文字）
+NUMERIC_KEY_COLUMNS = ['NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)']
+
+
+# 可合併的統計狀態：全部為按鍵計數或加總的 Series/DataFrame，鍵為一般的值（不含行位置或 Categorical 編碼）
+# 兩個狀態相加即合併兩批記錄，相減即移除一批記錄；日期等集合以出現次數保存，次數降為 0 時才移除
+@dataclass(slots=True)
+class StatsState:
+    staff_counts: pd.Series      # (員工, 本區單獨…session_1) → 次數
+    staff_days: pd.Series        # (員工, 日期) → 記錄數
+    region_counts: pd.DataFrame  # 分區 → count, count_0, count_1, participants, participants_0, participants_1
+    region_homes: pd.Series      # (分區, 院舍編號) → 記錄數
+    activity_counts: pd.Series   # (分區, session, 活動類型) → 節數
+    home_dates: pd.Series        # (HomeName, 日期字串) → 記錄數
+
+    def combine(self, other, sign=1):
+        return StatsState(*(
+            _combine(getattr(self, f.name), getattr(other, f.name), sign) for f in dataclasses.fields(self)
+        ))
+
+
+def _combine(current, delta, sign):
+    if delta.empty:
+        return current
+    if current.empty:
+        combined = delta * sign
+    else:
+        combined = current.add(delta * sign, fill_value=0)
+    # add() 對齊鍵時會轉為浮點數，計數欄轉回整數
+    if isinstance(combined, pd.DataFrame):
+        combined = combined[combined['count'] != 0]
+        return combined.astype({col: np.int64 for col in ('count', 'count_0', 'count_1')})
+    return combined[combined != 0].astype(np.int64)
+
+
+def _objects(values):
+    return np.asarray(values, dtype=object)
+
+
+# 由 prepare_frame 準備好的資料（可以是部分行）計算統計狀態
+def frame_state(df, home_index):
+    long_df = staff_long_table(df, None, df['RespStaff'], df['2ndRespStaffName'])
+    staff = _objects(long_df['staff'])
+    with_session = long_df['session'].isin([0, 1]).to_numpy()
+    staff_counts = pd.concat([
+        long_df.groupby([staff, long_df['category'].to_numpy()]).size(),
+        long_df[with_session].groupby([
+            staff[with_session], 'session_' + long_df['session'][with_session].astype(int).astype(str).to_numpy()
+        ]).size(),
+    ])
+    staff_counts.index.names = ['staff', 'column']
+    staff_days = long_df.groupby([staff, long_df['date'].to_numpy()]).size()
+    staff_days.index.names = ['staff', 'date']
+
+    rows = region_rows(df, home_index)
+    region_counts = rows.groupby('region').agg(
+        count=('position', 'size'),
+        count_0=('is_0', 'sum'),
+        count_1=('is_1', 'sum'),
+        participants=('participants', 'sum'),
+        participants_0=('participants_0', 'sum'),
+        participants_1=('participants_1', 'sum'),
+    )
+    region_homes = rows.groupby(['region', 'home']).size()
+    if 'activity' in rows.columns:
+        typed = rows[rows['activity'].notna() & (rows['is_0'] | rows['is_1'])]
+        activity_counts = typed.groupby(['region', 'session', _objects(typed['activity'])]).size()
+    else:
+        activity_counts = pd.Series(dtype=np.int64)
+    home_dates = df.groupby([_objects(df['HomeName']), df[SERVICE_DATE_TEXT].to_numpy()]).size()
+    return StatsState(staff_counts, staff_days, region_counts, region_homes, activity_counts, home_dates)
+
+
+# 每行的穩定行鍵：統計用到的欄位的內容雜湊，加上相同內容的出現次序（完全相同的重複行也能逐行對應）
+def row_keys(df):
+    columns = [col for col in INPUT_COLUMNS if col in df.columns]
+    frame = df[columns].copy()
+    for col in NUMERIC_KEY_COLUMNS:
+        if col in frame.columns:
+            frame[col] = parse_int_values(frame[col])
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return pd.MultiIndex.from_arrays([hashes, occurrence])
+
+
+# 員工按首次出現次序（同一行先負責員工後第二負責員工），與 calculate_staff_stats 的次序相同
+def _staff_order(df):
+    resp_staff = df['RespStaff']
+    second_staff = df['2ndRespStaffName']
+    valid = (resp_staff.notna() & df['ServiceDate'].notna()).to_numpy()
+    has_second = has_value(second_staff).to_numpy()
+    # 兩欄共用同一個類別字典時直接比較編碼
+    if isinstance(resp_staff.dtype, pd.CategoricalDtype) and resp_staff.dtype == second_staff.dtype:
+        codes = np.column_stack([resp_staff.cat.codes.to_numpy(),
+                                 np.where(has_second, second_staff.cat.codes.to_numpy(), -1)])[valid].ravel()
+        return resp_staff.cat.categories[pd.unique(codes[codes >= 0])]
+    names = np.column_stack([_objects(resp_staff), np.where(has_second, _objects(second_staff), None)])[valid]
+    names = names.ravel()
+    return pd.unique(names[pd.notna(names)])
+
+
+# 由統計狀態得出結果包的統計部分；記錄行位置（員工詳細記錄、分區記錄及活動類型的 rows）由新資料重建
+def _bundle_from_state(state, df, home_index, keys):
+    counts = state.staff_counts.unstack(fill_value=0).reindex(columns=STAFF_COUNT_COLUMNS[:-1], fill_value=0)
+    counts = counts.reindex([staff for staff in _staff_order(df) if staff in counts.index]).astype(int)
+    staff_days = DayCalendar.from_pairs(state.staff_days.index.get_level_values('staff'),
+                                        state.staff_days.index.get_level_values('date'), staff=counts.index)
+    counts['外出日數'] = staff_days.count()
+    staff_stats = staff_stats_from_counts(counts)
+
+    region_stats = empty_region_stats(df, home_index)
+    for region, values in state.region_counts.iterrows():
+        for key, value in values.items():
+            setattr(region_stats[region], key, int(value))
+    for region, homes in state.region_homes.groupby(level=0):
+        region_stats[region].homes = frozenset(homes.index.get_level_values(1))
+    attach_region_positions(region_stats, region_rows(df, home_index))
+    for (region, session_val, activity), count in state.activity_counts.items():
+        region_stats[region].activity_types(session_val)[activity].count = int(count)
+    total_sessions = sum(region.count for region in region_stats.values())
+    has_participants = 'NumberOfParticipant(Without Volunteer Count)' in df.columns
+    total_participants = sum(region.participants for region in region_stats.values()) if has_participants else None
+
+    # 院舍按新資料的類別次序；日期字串轉回日期（空字串為無效日期）後按記錄數展開
+    repeats = state.home_dates.to_numpy()
+    homes = np.repeat(_objects(state.home_dates.index.get_level_values(0)), repeats)
+    if isinstance(df['HomeName'].dtype, pd.CategoricalDtype):
+        homes = pd.Categorical(homes, categories=df['HomeName'].cat.categories)
+    dates = pd.to_datetime(state.home_dates.index.get_level_values(1), format=DATE_FORMAT, errors='coerce')
+    home_activity = HomeActivity.from_records(homes, np.repeat(dates.to_numpy(), repeats), home_index.local_staff)
+    home_counts = home_count_distribution(pd.Series(home_activity.counts()))
+
+    issues = validate_rows(df, home_index)
+    return StatsBundle(
+        df=df,
+        staff_stats=staff_stats,
+        staff_days=staff_days,
+        staff_index=build_staff_index(df['RespStaff'], df['2ndRespStaffName']),
+        region_stats=region_stats,
+        total_sessions=total_sessions,
+        total_participants=total_participants,
+        home_index=home_index,
+        duplicates=duplicate_records(df, issues),
+        home_counts=home_counts,
+        home_activity=home_activity,
+        issues=tuple(issues),
+        state=state,
+        row_keys=keys,
+    )
+
+
+def _same_homelist(a, b):
+    return a is not None and a.local_staff == b.local_staff and a.owners == b.owners
+
+
+# 以上一次的結果包增量計算新上傳資料的統計：按行鍵找出新增及移除的行，只把這些行的統計加減到上一次的狀態
+# 欄位或 homelist.csv 不同、或差異超過 DELTA_MAX_FRACTION 時改為全部重算；兩種情況的結果都帶有 state 及 row_keys
+# previous 不會被修改（可以是多個 session 共用的快取結果）
+def update_bundle(previous, uploaded_df, github_df):
+    issues = validate_inputs(uploaded_df, github_df)
+    if issues:
+        raise StatsValidationError(issues)
+    home_index = HomeIndex.from_homelist(github_df)
+    df = prepare_frame(uploaded_df, home_index)
+    rows = len(df)
+    with stage('row_keys', rows):
+        keys = row_keys(df)
+
+    comparable = (
+        previous is not None
+        and _same_homelist(previous.home_index, home_index)
+        and [col for col in INPUT_COLUMNS if col in previous.df.columns] == [col for col in INPUT_COLUMNS if col in df.columns]
+    )
+    if comparable:
+        previous_keys = previous.row_keys if previous.row_keys is not None else row_keys(previous.df)
+        added = ~keys.isin(previous_keys)
+        removed = ~previous_keys.isin(keys)
+        comparable = added.sum() + removed.sum() <= DELTA_MAX_FRACTION * rows
+
+    if not comparable:
+        bundle = stats_bundle_from_frame(df, home_index)
+        with stage('frame_state', rows):
+            bundle.state = frame_state(df, home_index)
+        bundle.row_keys = keys
+        return bundle
+
+    with stage('apply_delta', int(added.sum() + removed.sum())):
+        state = previous.state if previous.state is not None else frame_state(previous.df, previous.home_index)
+        state = state.combine(frame_state(df[added], home_index))
+        state = state.combine(frame_state(previous.df[removed], home_index), sign=-1)
+    with stage('bundle_from_state', rows):
+        return _bundle_from_state(state, df, home_index, keys)
@@ -0,0 +1,262 @@
+import codecs
+import csv
+import hashlib
+import importlib.util
+import os
+import re
+import warnings
+from io import BytesIO, StringIO
+
+import chardet
+import pandas as pd
+from openpyxl import load_workbook
+
+from shared_cache import CACHE_DIR, SHARED_CACHE, atomic_write, frame_size
+from outing_stats import (
+    CATEGORY_COLUMNS, INPUT_COLUMNS, STAFF_NAME_COLUMNS, categorize_columns, normalize_service_dates
+)
+
+# 有安裝 pyarrow 時使用多執行緒的 pyarrow CSV 引擎，並把 XLSX 的解析結果轉存為 Parquet
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# 有安裝 python-calamine 時以 Rust 的 calamine 讀取 XLSX，否則以 openpyxl 唯讀模式逐行讀取
+HAS_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+# XLSX 解析結果的 Parquet 副本目錄（與 homelist.csv 的磁碟副本同在 CACHE_DIR 下），最多保留的檔案數
+XLSX_CACHE_DIR = os.path.join(CACHE_DIR, 'xlsx')
+XLSX_CACHE_MAX_FILES = 32
+
+# 無法判斷編碼時使用的預設編碼（系統匯出的 CSV 為 big5hkscs）
+CSV_ENCODING = 'big5hkscs'
+CSV_SEPARATORS = [',', '\t']
+CSV_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# 編碼及分隔符嗅探的取樣大小
+SNIFF_BYTES = 64 * 1024
+BAD_LINE_PATTERN = re.compile(r'Skipping line (\d+): expected (\d+) fields, saw (\d+)')
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# 讀取 CSV 時按 BOM → 完整 UTF-8 驗證 → big5hkscs → chardet 的次序判斷編碼
+def detect_encoding(data):
+    for bom, encoding in CSV_BOMS:
+        if data.startswith(bom):
+            return encoding
+    # UTF-8 需驗證整個檔案（只解碼不保存），避免前段只有 ASCII 而後段是 big5 的誤判
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(data), SNIFF_BYTES):
+            decoder.decode(data[start:start + SNIFF_BYTES], final=start + SNIFF_BYTES >= len(data))
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    sample = data[:SNIFF_BYTES]
+    try:
+        codecs.getincrementaldecoder(CSV_ENCODING)().decode(sample, final=False)
+        return CSV_ENCODING
+    except UnicodeDecodeError:
+        pass
+    guess = chardet.detect(sample).get('encoding')
+    try:
+        return codecs.lookup(guess).name if guess else CSV_ENCODING
+    except LookupError:
+        return CSV_ENCODING
+
+
+# 判斷編碼後只嗅探一次分隔符及標題列：回傳 {'encoding', 'separator', 'quotechar', 'header'}
+def sniff_csv(data):
+    encoding = detect_encoding(data)
+    sample = codecs.getincrementaldecoder(encoding)(errors='replace').decode(data[:SNIFF_BYTES], final=False)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=''.join(CSV_SEPARATORS))
+        separator, quotechar = dialect.delimiter, dialect.quotechar
+    except csv.Error:
+        separator, quotechar = max(CSV_SEPARATORS, key=lambda sep: sample.count(sep)), '"'
+    header = next(csv.reader(StringIO(sample), delimiter=separator, quotechar=quotechar), [])
+    return {'encoding': encoding, 'separator': separator, 'quotechar': quotechar, 'header': header}
+
+
+# 只讀取統計用到的欄位；標題列完全沒有這些欄位時讀取全部欄位，交由之後的欄位檢查報錯
+def projected_columns(header):
+    columns = [col for col in header if col in INPUT_COLUMNS]
+    return columns or None
+
+
+# C 引擎的壞行警告（"Skipping line N: expected X fields, saw Y"）轉為結構化記錄
+def _bad_lines_from_warnings(caught):
+    bad_lines = []
+    for warning in caught:
+        for line, expected, actual in BAD_LINE_PATTERN.findall(str(warning.message)):
+            bad_lines.append({'line': int(line), 'expected': int(expected), 'actual': int(actual), 'text': None})
+    return bad_lines
+
+
+# pyarrow 的壞行沒有行號：在解碼後的內容中按次序找出每個壞行的文字（須在行首），以之前的換行數得出行號（由 1 開始，與 C 引擎相同）
+# 找到後從該行之後繼續找，內容相同的壞行因此各有自己的行號
+def _locate_bad_lines(data, encoding, bad_lines):
+    text = data.decode(encoding, errors='replace')
+    position, line = 0, 1
+    for bad_line in bad_lines:
+        found = text.find(bad_line['text'], position)
+        while found > 0 and text[found - 1] != '\n':
+            found = text.find(bad_line['text'], found + 1)
+        if found < 0:
+            continue
+        line += text.count('\n', position, found)
+        bad_line['line'] = line
+        position = found + len(bad_line['text'])
+        line += text.count('\n', found, position)
+
+
+# pyarrow 引擎；欄位較少的行 pyarrow 只能略過，而 C 引擎（及原有讀法）會以空值補足保留該行
+# 遇到這種行時回傳 None，由呼叫端改用 C 引擎，兩種引擎的結果因此一致
+def _read_csv_pyarrow(data, dialect, usecols):
+    bad_lines = []
+
+    def handle_bad_line(row):
+        bad_lines.append({'line': row.number, 'expected': row.expected_columns,
+                          'actual': row.actual_columns, 'text': row.text})
+        return 'skip'
+
+    # pyarrow 直接以字典編碼讀入文字欄，之後 categorize_columns 只需合併員工欄的類別字典
+    categorical = {col: 'category' for col in usecols or [] if col in STAFF_NAME_COLUMNS + CATEGORY_COLUMNS}
+    df = pd.read_csv(BytesIO(data), encoding=dialect['encoding'], sep=dialect['separator'],
+                     quotechar=dialect['quotechar'], usecols=usecols, engine='pyarrow',
+                     dtype=categorical or None, on_bad_lines=handle_bad_line)
+    if any(bad_line['actual'] < bad_line['expected'] for bad_line in bad_lines):
+        return None
+    if bad_lines:
+        _locate_bad_lines(data, dialect['encoding'], bad_lines)
+    return df, bad_lines
+
+
+# C 引擎先讀入全部欄位（指定 usecols 時 C 引擎不檢查欄位過多的行），再只保留 usecols 的欄位
+# 不可用 chunksize 分塊：之後每塊的第一行不會被檢查，欄位過多的行會被截斷保留，其後的行亦以該行的欄位數比較
+def _read_csv_c(data, dialect, usecols):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        df = pd.read_csv(BytesIO(data), encoding=dialect['encoding'], sep=dialect['separator'],
+                         quotechar=dialect['quotechar'], on_bad_lines='warn')
+    return (df[usecols] if usecols else df), _bad_lines_from_warnings(caught)
+
+
+# 以 openpyxl 唯讀模式逐行讀取第一個工作表，只保留統計用到的欄位；略過完全空白的行
+def _read_xlsx_openpyxl(data):
+    workbook = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        wanted = [(i, col) for i, col in enumerate(header) if col in INPUT_COLUMNS]
+        values = {col: [] for _, col in wanted}
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            for i, col in wanted:
+                values[col].append(row[i] if i < len(row) else None)
+    finally:
+        workbook.close()
+    return pd.DataFrame({col: pd.Series(column, dtype=None if column else object) for col, column in values.items()})
+
+
+def _read_xlsx(data):
+    if HAS_CALAMINE:
+        return pd.read_excel(BytesIO(data), engine='calamine', usecols=lambda col: col in INPUT_COLUMNS), 'calamine'
+    return _read_xlsx_openpyxl(data), 'openpyxl'
+
+
+def _xlsx_cache_path(data, cache_dir):
+    return os.path.join(cache_dir, f'{content_hash(data)}.parquet')
+
+
+# 寫入 Parquet 副本（先寫暫存檔再替換），超過 XLSX_CACHE_MAX_FILES 時刪除最舊的副本；寫入失敗時只是不快取
+def _write_xlsx_cache(df, path):
+    try:
+        atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        cached = sorted((entry for entry in os.scandir(os.path.dirname(path)) if entry.name.endswith('.parquet')),
+                        key=lambda entry: entry.stat().st_mtime)
+        for entry in cached[:-XLSX_CACHE_MAX_FILES]:
+            os.remove(entry.path)
+    except (OSError, ValueError, TypeError, ImportError):
+        pass
+
+
+# 讀取 XLSX，回傳 (DataFrame, 使用的引擎)
+# 第一次解析後把結果轉存為 Parquet（以內容雜湊命名），同一份工作簿再次開啟時直接讀取 Parquet；cache_dir 為 None 時不使用
+def read_xlsx(data, cache_dir=XLSX_CACHE_DIR):
+    path = _xlsx_cache_path(data, cache_dir) if cache_dir and HAS_PYARROW else None
+    if path and os.path.exists(path):
+        try:
+            return categorize_columns(normalize_service_dates(pd.read_parquet(path))), 'parquet'
+        except (OSError, ValueError):
+            pass
+    df, engine = _read_xlsx(data)
+    df = categorize_columns(normalize_service_dates(df))
+    if path:
+        _write_xlsx_cache(df, path)
+    return df, engine
+
+
+# 解析上傳檔案內容（bytes），回傳 (DataFrame, 解析資訊)
+# 解析資訊：{'encoding', 'separator', 'engine', 'bad_lines': [{'line', 'expected', 'actual', 'text'}]}
+# 有 pyarrow 時用多執行緒的 pyarrow 引擎，否則（或有欄位較少的行時）用 C 引擎；兩者都只保留統計需要的欄位
+# 兩種引擎都略過欄位過多的行並記錄在 bad_lines，欄位較少的行以空值補足
+# 讀取後 ServiceDate 即轉為 datetime64 並加入格式化字串欄，之後所有頁面不再逐格轉換日期
+# 員工、院舍、活動類型及狀態欄轉為 Categorical（員工欄共用一個類別字典）
+# XLSX 經 read_xlsx 讀取（calamine 或 openpyxl 唯讀模式，及 Parquet 副本），xlsx_cache_dir 為 None 時不使用 Parquet 副本
+def parse_upload(data, file_name, dialect=None, xlsx_cache_dir=XLSX_CACHE_DIR):
+    file_name = file_name.lower()
+    if file_name.endswith('.csv'):
+        dialect = dialect or sniff_csv(data)
+        usecols = projected_columns(dialect['header'])
+        result = _read_csv_pyarrow(data, dialect, usecols) if HAS_PYARROW else None
+        if result is not None:
+            engine = 'pyarrow'
+            df, bad_lines = result
+        else:
+            engine = 'c'
+            df, bad_lines = _read_csv_c(data, dialect, usecols)
+        info = {'encoding': dialect['encoding'], 'separator': dialect['separator'],
+                'engine': engine, 'bad_lines': bad_lines}
+        return categorize_columns(normalize_service_dates(df)), info
+    elif file_name.endswith('.xlsx'):
+        df, engine = read_xlsx(data, xlsx_cache_dir)
+        return df, {'encoding': 'utf-8', 'separator': None, 'engine': engine, 'bad_lines': []}
+    raise UnsupportedFileType(f'不支援的檔案格式：{file_name}')
+
+
+# 上傳資料在共用快取中的鍵：('upload', 內容指紋, 檔案類型)
+def upload_key(fingerprint, file_name):
+    file_name = file_name.lower()
+    if file_name.endswith('.csv'):
+        return ('upload', fingerprint, 'csv')
+    if file_name.endswith('.xlsx'):
+        return ('upload', fingerprint, 'xlsx')
+    raise UnsupportedFileType(f'不支援的檔案格式：{file_name}')
+
+
+# 由共用快取取得已解析的上傳資料 (DataFrame, 解析資訊)；已被淘汰或未曾解析時回傳 None
+def cached_upload(fingerprint, file_name, cache=SHARED_CACHE):
+    return cache.get(upload_key(fingerprint, file_name))
+
+
+# 經進程共用快取解析上傳檔案，回傳 (DataFrame, 解析資訊, 內容指紋)
+# 快取鍵只用內容雜湊（編碼及分隔符由內容決定），命中時不需嗅探；相同內容的上傳只解析及保存一份，各 session 取得同一個 DataFrame，不可修改
+def read_upload(data, file_name, cache=SHARED_CACHE):
+    key = upload_key(content_hash(data), file_name)
+    cached = cache.get(key)
+    if cached is None:
+        df, info = parse_upload(data, file_name)
+        cache.put(key, (df, info), frame_size(df))
+    else:
+        df, info = cached
+    return df, info, key[1]
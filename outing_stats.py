@@ -0,0 +1,895 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from staff_calendar import DayCalendar
+
+# 定義必要欄位
+REQUIRED_COLUMNS = ['RespStaff', '2ndRespStaffName', 'HomeName', 'ServiceDate']
+
+# 統計會用到的全部上傳欄位（必要欄位及選用欄位），讀檔時只讀取這些欄位
+INPUT_COLUMNS = REQUIRED_COLUMNS + [
+    'NumberOfSession', 'NumberOfParticipant(Without Volunteer Count)', '活動類型', 'ServiceStatus'
+]
+
+# 員工名稱欄（共用同一個類別字典），以及其他轉為 Categorical 的文字欄
+STAFF_NAME_COLUMNS = ['RespStaff', '2ndRespStaffName']
+CATEGORY_COLUMNS = ['HomeName', '活動類型', 'ServiceStatus']
+
+# 日期顯示格式，以及讀檔時預先格式化的 ServiceDate 字串欄
+DATE_FORMAT = '%Y-%m-%d'
+SERVICE_DATE_TEXT = 'ServiceDateText'
+SERVICE_DATE_DTYPE = 'datetime64[us]'
+
+# 名稱轉換字典
+NAME_CONVERSION = {
+    '溫?邦': 'Pong',
+    '溫晧邦': 'Pong',
+    '張玉明': 'Jordan',
+    '陳發成': 'Jack',
+    '林振聲': 'Mike',
+    '黃瑞霞': 'Peppy',
+    '曾嘉欣': 'Kama',
+    '徐家兒': 'Kayi'
+}
+
+# 名稱轉換字典的版本指紋（字典內容改變時統計結果包快取自動失效）
+NAME_CONVERSION_VERSION = hashlib.sha1(repr(sorted(NAME_CONVERSION.items())).encode('utf-8')).hexdigest()
+
+# 指定的員工顯示順序
+DESIRED_STAFF_ORDER = ['Mike', 'Pong', 'Peppy', 'Jordan', 'Kayi', 'Jack', 'Kama']
+
+# homelist.csv 必要欄位
+HOMELIST_COLUMNS = ['Home', 'staff1', 'staff2', 'staff3', 'staff4']
+
+# 結構化的驗證問題：code 為問題種類，source 為 'upload' 或 'homelist'
+# 逐行檢查的問題另有 rows（有問題的資料行位置，配合 iloc 使用）及 values（例如未知的院舍或員工名稱）
+@dataclass(frozen=True, slots=True)
+class ValidationIssue:
+    code: str
+    source: str
+    message: str
+    columns: tuple = ()
+    rows: np.ndarray = field(default=None, compare=False)
+    values: tuple = ()
+
+    @property
+    def count(self):
+        return 0 if self.rows is None else len(self.rows)
+
+# 輸入資料驗證失敗時拋出，issues 為全部 ValidationIssue
+class StatsValidationError(ValueError):
+    def __init__(self, issues):
+        self.issues = tuple(issues)
+        super().__init__('；'.join(issue.message for issue in self.issues))
+
+def missing_columns_issue(columns, source='upload'):
+    label = 'homelist.csv ' if source == 'homelist' else ''
+    return ValidationIssue('missing_columns', source, f"{label}缺少必要欄位: {list(columns)}", tuple(columns))
+
+# 檢查上傳資料及 homelist.csv 的必要欄位，回傳 ValidationIssue 清單（沒有問題時為空）
+def validate_inputs(uploaded_df, github_df=None):
+    issues = []
+    missing_uploaded = [col for col in REQUIRED_COLUMNS if col not in uploaded_df.columns]
+    if missing_uploaded:
+        issues.append(missing_columns_issue(missing_uploaded))
+    if github_df is not None:
+        missing_github = [col for col in HOMELIST_COLUMNS if col not in github_df.columns]
+        if missing_github:
+            issues.append(missing_columns_issue(missing_github, source='homelist'))
+    return issues
+
+# 每位員工的統計（員工外出統計表的一行）
+@dataclass(slots=True)
+class StaffStats:
+    local_solo: int = 0
+    local_collab: int = 0
+    remote_solo: int = 0
+    remote_collab: int = 0
+    local_total: int = 0
+    total: int = 0
+    days: int = 0
+    session_0: int = 0
+    session_1: int = 0
+    session_total: int = 0
+
+# 某分區某 NumberOfSession 的一種活動類型：節數及上傳資料的整數行位置
+@dataclass(slots=True)
+class ActivityTypeStats:
+    count: int
+    rows: np.ndarray
+
+# 每個分區的統計；records 為上傳資料的整數行位置（配合 iloc 使用）
+@dataclass(slots=True)
+class RegionStats:
+    count: int = 0
+    count_0: int = 0
+    count_1: int = 0
+    participants: int = 0
+    participants_0: int = 0
+    participants_1: int = 0
+    homes: frozenset = frozenset()
+    records: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    activity_types_0: dict = field(default_factory=dict)
+    activity_types_1: dict = field(default_factory=dict)
+
+    def activity_types(self, session_val):
+        return self.activity_types_0 if session_val == 0 else self.activity_types_1
+
+# 員工詳細記錄索引的一項：單獨記錄行位置、協作記錄行位置及對應協作者
+@dataclass(slots=True)
+class StaffRecords:
+    solo_rows: np.ndarray
+    collab_rows: np.ndarray
+    collaborators: np.ndarray
+
+# 員工詳細記錄（get_staff_details 的結果）
+@dataclass(slots=True)
+class StaffDetails:
+    solo_records: pd.DataFrame
+    collab_records: pd.DataFrame
+    solo_days: pd.DatetimeIndex
+    collab_days: pd.DatetimeIndex
+    all_days: pd.DatetimeIndex
+
+# 統計結果包：compute_stats_bundle 的結果，Streamlit 頁面、批次工具及歷史記錄共用
+@dataclass(slots=True)
+class StatsBundle:
+    df: pd.DataFrame
+    staff_stats: dict
+    staff_days: DayCalendar
+    staff_index: dict
+    region_stats: dict
+    total_sessions: int
+    total_participants: int
+    home_index: 'HomeIndex' = None
+    duplicates: pd.DataFrame = None
+    home_counts: dict = None
+    home_activity: 'HomeActivity' = None
+    issues: tuple = ()
+    # 增量重算用的可合併統計狀態及行鍵（incremental.update_bundle 產生的結果包才有，其他為 None）
+    state: object = None
+    row_keys: pd.MultiIndex = None
+
+# 向量化格式化日期（Series、DatetimeIndex 或 Timestamp 清單），無效日期為空字串
+def format_dates(dates):
+    return pd.Series(pd.to_datetime(dates)).dt.strftime(DATE_FORMAT).fillna('')
+
+# 讀檔時只做一次：ServiceDate 轉為 datetime64，並加入格式化字串欄（已處理過的資料不會重複轉換）
+def normalize_service_dates(df):
+    if 'ServiceDate' not in df.columns:
+        return df
+    if not pd.api.types.is_datetime64_any_dtype(df['ServiceDate']):
+        df['ServiceDate'] = pd.to_datetime(df['ServiceDate'], errors='coerce', format='mixed')
+    # pyarrow 讀入的 datetime.date 會轉成秒精度，Excel 則多為納秒：統一精度，不同讀法的結果才會相同
+    if df['ServiceDate'].dtype != SERVICE_DATE_DTYPE:
+        df['ServiceDate'] = df['ServiceDate'].astype(SERVICE_DATE_DTYPE)
+    if SERVICE_DATE_TEXT not in df.columns:
+        df[SERVICE_DATE_TEXT] = format_dates(df['ServiceDate'])
+    return df
+
+# 員工名稱共用的類別字典：NAME_CONVERSION 的原名及轉換後名稱、homelist.csv 的員工，以及資料中出現的其他名稱
+def staff_dtype(name_columns, home_index=None):
+    names = set(NAME_CONVERSION) | set(NAME_CONVERSION.values())
+    if home_index is not None:
+        names.update(*home_index.local_staff.values())
+    for column in name_columns:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            names.update(column.cat.categories)
+        else:
+            names.update(column.dropna().unique())
+    return pd.CategoricalDtype(sorted(names, key=str))
+
+# 員工、院舍、活動類型及狀態欄轉為 Categorical（比較、查表及 groupby 都在整數編碼上進行）
+# 兩個員工欄共用同一個類別字典；提供 home_index 時字典同時涵蓋 homelist.csv 的員工
+def categorize_columns(df, home_index=None):
+    staff_columns = [col for col in STAFF_NAME_COLUMNS if col in df.columns]
+    if staff_columns:
+        dtype = staff_dtype([df[col] for col in staff_columns], home_index)
+        for col in staff_columns:
+            df[col] = df[col].astype(dtype)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+# 提取 HomeName 的前 1-3 個數字
+def extract_home_number(home_name):
+    if pd.isna(home_name):
+        return None
+    match = re.match(r'^\d{1,3}', str(home_name))
+    return match.group(0) if match else None
+
+# 向量化提取整欄 HomeName 的前 1-3 個數字（無法提取者為 NaN）；Categorical 欄只需處理每個類別一次
+def extract_home_numbers(home_names):
+    if isinstance(home_names.dtype, pd.CategoricalDtype):
+        numbers = extract_home_numbers(pd.Series(home_names.cat.categories))
+        codes = home_names.cat.codes.to_numpy()
+        values = numbers.to_numpy(dtype=object)[codes] if len(numbers) else np.full(len(codes), np.nan, dtype=object)
+        return pd.Series(values, index=home_names.index, dtype=numbers.dtype).where(codes >= 0)
+    return home_names.astype(str).str.extract(r'^(\d{1,3})', expand=False)
+
+# 正規化 homelist.csv 的院舍編號（避免 Home 欄因空值被讀成浮點數而變成 "1.0"）
+def normalize_home(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+# 分區名稱去重後先按指定次序排列，其餘保持出現次序
+def order_regions(names, preferred_order=()):
+    names = list(dict.fromkeys(name for name in names if pd.notna(name)))
+    return [r for r in preferred_order if r in names] + [r for r in names if r not in preferred_order]
+
+# 院舍索引：由 homelist.csv 建立一次，院舍編號 → 本區員工（staff1-staff4）及分區負責人（staff1）
+class HomeIndex:
+    STAFF_COLUMNS = ['staff1', 'staff2', 'staff3', 'staff4']
+
+    def __init__(self, local_staff, owners):
+        self.local_staff = local_staff
+        self.owners = owners
+        self._pairs = pd.MultiIndex.from_tuples(
+            [(home, staff) for home, staffs in local_staff.items() for staff in staffs],
+            names=['Home', 'Staff']
+        )
+
+    @classmethod
+    def from_homelist(cls, github_df):
+        local_staff = {}
+        owners = {}
+        for home_value, *staff_values in zip(github_df['Home'], *(github_df[col] for col in cls.STAFF_COLUMNS)):
+            home = normalize_home(home_value)
+            if home is None:
+                continue
+            local_staff.setdefault(home, set()).update(s for s in staff_values if pd.notna(s))
+            # 與舊邏輯一致：同一院舍出現多次時，以第一行的 staff1 為分區負責人
+            owners.setdefault(home, staff_values[0])
+        return cls({home: frozenset(staffs) for home, staffs in local_staff.items()}, owners)
+
+    # 分區清單（所有 staff1），先按指定次序排列，其餘按 homelist.csv 出現次序
+    def regions(self, preferred_order=()):
+        return order_regions(self.owners.values(), preferred_order)
+
+    # 回傳布林陣列：每行的員工是否為該院舍的本區員工
+    def is_local(self, home_numbers, staff):
+        return pd.MultiIndex.from_arrays([home_numbers, staff]).isin(self._pairs)
+
+# 判斷整份上傳資料每行負責員工及第二負責員工的區域狀態（本區/外區），一次向量化查表
+def classify_regions(df, home_index):
+    home_numbers = extract_home_numbers(df['HomeName'])
+    second_staff = df['2ndRespStaffName']
+    has_second = has_value(second_staff)
+    resp_local = home_index.is_local(home_numbers, df['RespStaff'])
+    second_local = home_index.is_local(home_numbers, second_staff)
+    resp_region = pd.Series('外區', index=df.index, dtype=object).mask(resp_local, '本區')
+    second_region = pd.Series(None, index=df.index, dtype=object)
+    second_region[has_second] = '外區'
+    second_region[has_second & second_local] = '本區'
+    return pd.DataFrame({'resp_region': resp_region, 'second_region': second_region})
+
+# 每行是否有填寫（非空值及非空字串）；Categorical 欄只需檢查類別字典，不必逐行轉為字串
+def has_value(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        filled = np.append(np.asarray(values.cat.categories.astype(str) != ''), False)
+        return pd.Series(filled[codes], index=values.index)
+    return values.notna() & (values.astype(str) != '')
+
+# 轉換員工名稱
+def convert_name(name):
+    return NAME_CONVERSION.get(name, name) if pd.notna(name) else name
+
+# 向量化轉換整欄員工名稱；Categorical 欄只轉換類別字典並重新對應編碼，結果仍使用同一個字典
+def convert_names(names):
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        categories = names.cat.categories
+        converted = pd.Index([NAME_CONVERSION.get(name, name) for name in categories], dtype=object)
+        categories = categories.append(converted.difference(categories))
+        new_codes = categories.get_indexer(converted)
+        codes = names.cat.codes.to_numpy()
+        dtype = pd.CategoricalDtype(categories)
+        values = pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), dtype=dtype)
+        return pd.Series(values, index=names.index, name=names.name)
+    converted = names.map(NAME_CONVERSION)
+    return converted.where(converted.notna(), names)
+
+# int() 接受的整數文字（前後可有空白）
+INT_TEXT_PATTERN = r'\s*[+-]?\d+\s*'
+
+# 按 int() 的轉換規則向量化取得整欄整數值，例如 NumberOfSession 或參與人數（無法轉換者為 NaN）
+# 數值截去小數；文字只接受整數文字，"1.5"、"abc" 等與 int() 一樣視為無法轉換
+def parse_int_values(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return np.trunc(values.astype(float))
+    values = values.astype(object)
+    is_int_text = values.str.fullmatch(INT_TEXT_PATTERN)
+    numbers = np.trunc(pd.to_numeric(values, errors='coerce').astype(float))
+    return numbers.where(is_int_text.isna() | is_int_text.fillna(False).astype(bool))
+
+# 上傳資料的逐行檢查（df 的員工名稱須已經過 convert_names），每種問題以一個向量化遮罩找出全部行
+# 回傳 ValidationIssue 清單；這些問題不阻止統計，相關記錄按原有規則略過或歸入外區
+def validate_rows(df, home_index):
+    issues = []
+
+    def add(code, mask, message, columns, values=()):
+        rows = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if len(rows):
+            issues.append(ValidationIssue(code, 'upload', f"{len(rows)} 筆記錄{message}", tuple(columns), rows,
+                                          tuple(values)))
+
+    def unique_values(column, mask):
+        return pd.unique(column[np.asarray(mask, dtype=bool)].astype(object)).tolist()
+
+    resp_staff = df['RespStaff']
+    second_staff = df['2ndRespStaffName']
+    has_second = has_value(second_staff)
+    add('duplicate_staff', has_second & (resp_staff == second_staff), '的負責員工與第二負責員工為同一人',
+        STAFF_NAME_COLUMNS)
+    add('invalid_date', df['ServiceDate'].isna(), '的 ServiceDate 空白或無法解析', ['ServiceDate'])
+
+    if 'NumberOfSession' in df.columns:
+        raw = df['NumberOfSession']
+        add('invalid_session', raw.notna() & ~parse_int_values(raw).isin([0, 1]),
+            '的 NumberOfSession 不是 0 或 1', ['NumberOfSession'])
+    participant_column = 'NumberOfParticipant(Without Volunteer Count)'
+    if participant_column in df.columns:
+        raw = df[participant_column]
+        add('invalid_participants', raw.notna() & parse_int_values(raw).isna(), '的參與人數不是整數',
+            [participant_column])
+
+    home_names = df['HomeName']
+    unknown_home = home_names.notna() & ~extract_home_numbers(home_names).isin(list(home_index.local_staff))
+    add('unknown_home', unknown_home, '的院舍不在 homelist.csv', ['HomeName'],
+        unique_values(home_names, unknown_home))
+
+    known_staff = set().union(*home_index.local_staff.values())
+    unknown_resp = resp_staff.notna() & ~resp_staff.isin(known_staff)
+    unknown_second = has_second & ~second_staff.isin(known_staff)
+    unknown_names = dict.fromkeys(unique_values(resp_staff, unknown_resp) + unique_values(second_staff, unknown_second))
+    add('unknown_staff', unknown_resp | unknown_second, '的員工不在 homelist.csv', STAFF_NAME_COLUMNS,
+        list(unknown_names))
+    return issues
+
+# 取出某種問題的資料行位置（沒有該問題時為空陣列）
+def issue_rows(issues, code):
+    for issue in issues:
+        if issue.code == code:
+            return issue.rows
+    return np.empty(0, dtype=np.int64)
+
+# 負責員工與第二負責員工為同一人的記錄（頁面顯示用的欄位）
+def duplicate_records(df, issues):
+    columns = ['RespStaff', '2ndRespStaffName', 'ServiceDate', 'HomeName', SERVICE_DATE_TEXT]
+    return df.iloc[issue_rows(issues, 'duplicate_staff')][columns]
+
+# 資料驗證結果表（每種問題一行，資料行為 1 起算的行位置，只列出前 max_rows 行）
+def validation_table(issues, max_rows=20):
+    def preview(items):
+        text = ', '.join(str(item) for item in items[:max_rows])
+        return text + (' …' if len(items) > max_rows else '')
+
+    table = pd.DataFrame([
+        {
+            '問題': issue.message,
+            '筆數': issue.count,
+            '欄位': ', '.join(issue.columns),
+            '資料行': preview(issue.rows + 1),
+            '相關值': preview(issue.values),
+        }
+        for issue in issues
+    ])
+    table.index = table.index + 1
+    return table
+
+STAFF_COUNT_COLUMNS = ['本區單獨', '本區協作', '外區單獨', '外區協作', 'session_0', 'session_1', 'session_total']
+
+# StaffStats 欄位對應的統計欄（按 StaffStats 欄位次序）
+STAFF_STATS_COLUMNS = {
+    '本區單獨': 'local_solo', '本區協作': 'local_collab', '外區單獨': 'remote_solo', '外區協作': 'remote_collab',
+    '本區總共': 'local_total', '全部總共': 'total', '外出日數': 'days',
+    'session_0': 'session_0', 'session_1': 'session_1', 'session_total': 'session_total',
+}
+
+# 員工詳細記錄索引：員工 → 單獨記錄行位置、協作記錄行位置及對應協作者（行位置按原始次序）
+# 規則與逐行判斷相同：負責員工優先；第二負責員工與負責員工相同時只記一次
+def build_staff_index(resp_staff, second_staff):
+    has_second = has_value(second_staff).to_numpy()
+    resp = resp_staff.to_numpy()
+    second = second_staff.to_numpy()
+    positions = np.arange(len(resp))
+    entries = pd.DataFrame({
+        'staff': np.concatenate([resp, second]),
+        'position': np.concatenate([positions, positions]),
+        'collab': np.concatenate([has_second, np.ones(len(resp), dtype=bool)]),
+        'partner': np.concatenate([np.where(has_second, second, None), resp]),
+    })
+    keep = np.concatenate([resp_staff.notna().to_numpy(), has_second & (second != resp)])
+    entries = entries[keep].sort_values('position', kind='stable')
+
+    staff_index = {}
+    for staff, indices in entries.groupby('staff', sort=False).indices.items():
+        group = entries.iloc[indices]
+        collab = group['collab'].to_numpy()
+        staff_index[staff] = StaffRecords(
+            solo_rows=group['position'].to_numpy()[~collab],
+            collab_rows=group['position'].to_numpy()[collab],
+            collaborators=group['partner'].to_numpy()[collab],
+        )
+    return staff_index
+
+# 計算員工統計（含本區總共和全部總共，並新增 NumberOfSession 統計，現在同時統計 RespStaff 和 2ndRespStaffName）
+# 將 RespStaff 與 2ndRespStaffName 展開成 (員工, 區域, 單獨/協作, session, 日期) 長表後以 groupby 一次計算
+# home_index 為 None 時使用資料中已判斷好的 RespRegion/SecondRegion 欄（例如歷史記錄）
+def calculate_staff_stats(df, home_index):
+    resp_staff = convert_names(df['RespStaff'])
+    second_staff = convert_names(df['2ndRespStaffName'])
+    long_df = staff_long_table(df, home_index, resp_staff, second_staff)
+    # 員工詳細記錄索引與統計共用同一次名稱轉換
+    staff_index = build_staff_index(resp_staff, second_staff)
+    if long_df.empty:
+        return {}, DayCalendar.from_pairs([], []), staff_index
+    # 按原始行次序（同一行先負責員工後第二負責員工）保留員工出現次序
+    long_df = long_df.sort_values(['position', 'role'], kind='stable')
+    staff_order = pd.unique(long_df['staff'])
+
+    counts = pd.crosstab(long_df['staff'], long_df['category'])
+    session_rows = long_df[long_df['session'].isin([0, 1])]
+    session_counts = pd.crosstab(session_rows['staff'], 'session_' + session_rows['session'].astype(int).astype(str))
+    counts = counts.join(session_counts, how='left')
+    counts = counts.reindex(index=staff_order, columns=STAFF_COUNT_COLUMNS[:-1]).fillna(0).astype(int)
+    # 外出日數由每位員工的日曆位元圖計算（按日，同一日多筆記錄只計一次）
+    staff_days = DayCalendar.from_pairs(long_df['staff'], long_df['date'], staff=staff_order)
+    counts['外出日數'] = staff_days.count()
+    return staff_stats_from_counts(counts), staff_days, staff_index
+
+# 由每位員工的 本區單獨…session_1 及 外出日數 計數表（index 為員工，按顯示次序）建立 StaffStats
+def staff_stats_from_counts(counts):
+    counts = counts.copy()
+    counts['session_total'] = counts['session_0'] + counts['session_1']
+    counts['本區總共'] = counts['本區單獨'] + counts['本區協作']
+    counts['全部總共'] = counts['本區總共'] + counts['外區單獨'] + counts['外區協作']
+    return {
+        staff: StaffStats(*(int(value) for value in values))
+        for staff, values in zip(counts.index, counts[list(STAFF_STATS_COLUMNS)].itertuples(index=False))
+    }
+
+# 員工長表：負責員工及第二負責員工各一行 (staff, role, region, mode, category, session, date, position)
+# 只包括有負責員工及有效日期的記錄；resp_staff/second_staff 為已轉換的名稱
+def staff_long_table(df, home_index, resp_staff, second_staff):
+    if home_index is not None:
+        regions = classify_regions(df, home_index)
+    else:
+        regions = pd.DataFrame({'resp_region': df['RespRegion'], 'second_region': df['SecondRegion']})
+    has_second = has_value(second_staff)
+    if 'NumberOfSession' in df.columns:
+        sessions = parse_int_values(df['NumberOfSession'])
+    else:
+        sessions = pd.Series(np.nan, index=df.index)
+    valid = resp_staff.notna() & df['ServiceDate'].notna()
+    position = np.arange(len(df))
+
+    resp_part = pd.DataFrame({
+        'staff': resp_staff.array,
+        'role': 0,
+        'region': regions['resp_region'].to_numpy(),
+        'mode': np.where(has_second, '協作', '單獨'),
+        'session': sessions.to_numpy(),
+        'date': df['ServiceDate'].to_numpy(),
+        'position': position,
+    })[valid.to_numpy()]
+    second_mask = (valid & has_second).to_numpy()
+    second_part = pd.DataFrame({
+        'staff': second_staff.array,
+        'role': 1,
+        'region': regions['second_region'].to_numpy(),
+        'mode': '協作',
+        'session': sessions.to_numpy(),
+        'date': df['ServiceDate'].to_numpy(),
+        'position': position,
+    })[second_mask]
+    long_df = pd.concat([resp_part, second_part], ignore_index=True)
+    # 以 object 相加：兩部分都沒有記錄時 region 及 mode 的 dtype 可能不同
+    long_df['category'] = long_df['region'].astype(object) + long_df['mode'].astype(object)
+    return long_df
+
+# 計算分區統計節數並返回詳細記錄
+# 分區由 homelist.csv 的 staff1 動態產生；records 及活動類型的 rows 為上傳資料的整數行位置（配合 iloc 使用）
+# home_index 為 None 時使用資料中已保存的 Home 及 Region 欄（例如歷史記錄）
+def calculate_region_stats(df, home_index):
+    has_participants_column = 'NumberOfParticipant(Without Volunteer Count)' in df.columns
+    region_stats = empty_region_stats(df, home_index)
+    rows = region_rows(df, home_index)
+
+    grouped = rows.groupby('region', sort=False)
+    summary = grouped.agg(
+        count=('position', 'size'),
+        count_0=('is_0', 'sum'),
+        count_1=('is_1', 'sum'),
+        participants=('participants', 'sum'),
+        participants_0=('participants_0', 'sum'),
+        participants_1=('participants_1', 'sum'),
+    )
+    homes = grouped['home'].unique()
+    for region in grouped.indices:
+        stats = region_stats[region]
+        for key, value in summary.loc[region].items():
+            setattr(stats, key, int(value))
+        stats.homes = frozenset(homes[region])
+    attach_region_positions(region_stats, rows)
+
+    total_sessions = sum(region.count for region in region_stats.values())
+    total_participants = sum(region.participants for region in region_stats.values()) if has_participants_column else None
+    return region_stats, total_sessions, total_participants
+
+# 全部分區的空白統計（按顯示次序）
+def empty_region_stats(df, home_index):
+    return {
+        region: RegionStats()
+        for region in (home_index.regions(DESIRED_STAFF_ORDER) if home_index is not None
+                       else order_regions(df['Region'].unique(), DESIRED_STAFF_ORDER))
+    }
+
+# 有分區的記錄：(region, home, position, session, participants, is_0, is_1, participants_0, participants_1[, activity])
+def region_rows(df, home_index):
+    if home_index is not None:
+        home_numbers = extract_home_numbers(df['HomeName'])
+        owners = home_numbers.map(home_index.owners)
+    else:
+        home_numbers = df['Home']
+        owners = df['Region']
+    matched = owners.notna().to_numpy()
+    rows = pd.DataFrame({
+        'region': owners.to_numpy()[matched],
+        'home': home_numbers.to_numpy()[matched],
+        'position': np.flatnonzero(matched),
+    })
+    if 'NumberOfSession' in df.columns:
+        rows['session'] = parse_int_values(df['NumberOfSession']).to_numpy()[matched]
+    else:
+        rows['session'] = np.nan
+    if 'NumberOfParticipant(Without Volunteer Count)' in df.columns:
+        rows['participants'] = parse_int_values(df['NumberOfParticipant(Without Volunteer Count)']).to_numpy()[matched]
+    else:
+        rows['participants'] = np.nan
+    rows['is_0'] = rows['session'] == 0
+    rows['is_1'] = rows['session'] == 1
+    rows['participants_0'] = rows['participants'].where(rows['is_0'])
+    rows['participants_1'] = rows['participants'].where(rows['is_1'])
+    if '活動類型' in df.columns:
+        rows['activity'] = df['活動類型'].to_numpy()[matched]
+    return rows
+
+# 填入各分區的記錄行位置及活動類型（節數及行位置）；活動類型按首次出現次序建立，與逐行累加時的次序一致
+def attach_region_positions(region_stats, rows):
+    positions = rows['position'].to_numpy()
+    for region, indices in rows.groupby('region', sort=False).indices.items():
+        region_stats[region].records = positions[indices]
+    if 'activity' in rows.columns:
+        typed = rows[rows['activity'].notna() & (rows['is_0'] | rows['is_1'])]
+        activity_groups = typed.groupby(['region', 'session', 'activity'], sort=False).indices
+        for (region, session_val, activity), indices in sorted(activity_groups.items(), key=lambda item: item[1][0]):
+            target_dict = region_stats[region].activity_types(session_val)
+            target_dict[activity] = ActivityTypeStats(len(indices), typed['position'].to_numpy()[indices])
+
+# 獲取員工的詳細記錄：由員工詳細記錄索引直接取出行位置，不需逐行掃描
+# staff_index 為 None 時即時建立（df 的名稱可以尚未轉換）
+def get_staff_details(df, staff_name, staff_index=None):
+    if staff_index is None:
+        staff_index = build_staff_index(convert_names(df['RespStaff']), convert_names(df['2ndRespStaffName']))
+    entry = staff_index.get(staff_name)
+    if entry is None:
+        entry = StaffRecords(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=object))
+
+    solo = df.iloc[entry.solo_rows]
+    collab = df.iloc[entry.collab_rows]
+    solo_records = pd.DataFrame({'ServiceDate': solo['ServiceDate'].to_numpy(), 'HomeName': solo['HomeName'].to_numpy()})
+    collab_records = pd.DataFrame({
+        'ServiceDate': collab['ServiceDate'].to_numpy(),
+        'HomeName': collab['HomeName'].to_numpy(),
+        'Collaborator': entry.collaborators,
+    })
+    # 單獨及協作日期放在同一範圍的日曆（兩行），不重複日期及其聯集為位元運算
+    days = DayCalendar.from_pairs(
+        np.repeat(np.array(['solo', 'collab'], dtype=object), [len(solo), len(collab)]),
+        np.concatenate([solo['ServiceDate'].to_numpy(), collab['ServiceDate'].to_numpy()]),
+        staff=('solo', 'collab'),
+    )
+    return StaffDetails(
+        solo_records=solo_records,
+        collab_records=collab_records,
+        solo_days=days.staff_dates('solo'),
+        collab_days=days.staff_dates('collab'),
+        all_days=days.dates(days.bitmap('solo') | days.bitmap('collab')),
+    )
+
+# 院舍活動鍵：高 32 位元為院舍位置，低 32 位元為日數（自 1970-01-01 起加上 HOME_DAY_OFFSET）；無效日期為 HOME_NO_DATE，排在該院舍最後
+HOME_DAY_BITS = 32
+HOME_DAY_OFFSET = 1 << 31
+HOME_NO_DATE = (1 << HOME_DAY_BITS) - 1
+
+
+def _home_day_numbers(dates):
+    days = pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(days), HOME_NO_DATE, days.astype(np.int64) + HOME_DAY_OFFSET)
+
+
+def _home_day_number(date):
+    return int(np.datetime64(pd.Timestamp(date), 'D').astype(np.int64)) + HOME_DAY_OFFSET
+
+
+def _home_dates(day_numbers):
+    values = np.where(day_numbers == HOME_NO_DATE, np.iinfo(np.int64).min, day_numbers - HOME_DAY_OFFSET)
+    return values.astype('datetime64[D]').astype('datetime64[ns]')
+
+
+# 院舍活動日期：每間院舍一段已排序的日期，全部存在一個已排序的 int64 鍵陣列（offsets 為各院舍的起點）
+# 活動次數及「日期 A 至 B 之間剛好/至少 N 次」「最近 K 週沒有活動」等查詢都以 searchsorted 對全部院舍一次完成
+# homes 按 HomeName 的類別次序，home_ids 為 extract_home_numbers 的院舍編號（無法提取者為 NaN）
+@dataclass(frozen=True, slots=True)
+class HomeActivity:
+    homes: np.ndarray
+    home_ids: np.ndarray
+    keys: np.ndarray
+    offsets: np.ndarray
+
+    # 由每行的院舍名稱（Categorical 時使用其類別次序，否則按名稱排序）及日期建立；院舍為空值的行略過
+    # known_homes 為 homelist.csv 的院舍編號：沒有任何記錄的院舍以編號為名稱、活動次數為 0 加在最後（按編號排序）
+    @classmethod
+    def from_records(cls, homes, dates, known_homes=()):
+        categorical = pd.Categorical(homes)
+        codes = categorical.codes.astype(np.int64)
+        valid = codes >= 0
+        present = np.unique(codes[valid])
+        position = np.full(len(categorical.categories), -1, dtype=np.int64)
+        position[present] = np.arange(len(present))
+        keys = np.sort((position[codes[valid]] << HOME_DAY_BITS) | _home_day_numbers(dates)[valid])
+        offsets = np.searchsorted(keys, np.arange(len(present) + 1, dtype=np.int64) << HOME_DAY_BITS)
+        names = np.asarray(categorical.categories[present], dtype=object)
+        home_ids = pd.to_numeric(extract_home_numbers(pd.Series(names, dtype=object)), errors='coerce').to_numpy(dtype=float)
+        known = pd.Series(list(known_homes), dtype=object)
+        known_ids = pd.to_numeric(known, errors='coerce').to_numpy(dtype=float)
+        missing = np.flatnonzero(~np.isnan(known_ids) & ~np.isin(known_ids, home_ids))
+        missing = missing[np.argsort(known_ids[missing], kind='stable')]
+        if len(missing):
+            names = np.concatenate([names, known.to_numpy()[missing]])
+            home_ids = np.concatenate([home_ids, known_ids[missing]])
+            offsets = np.concatenate([offsets, np.full(len(missing), len(keys), dtype=offsets.dtype)])
+        return cls(names, home_ids, keys, offsets)
+
+    def __len__(self):
+        return len(self.homes)
+
+    def _bounds(self, day_number, side):
+        return np.searchsorted(self.keys, (np.arange(len(self), dtype=np.int64) << HOME_DAY_BITS) | day_number, side=side)
+
+    # 各院舍的活動次數；沒有指定日期範圍時包括無效日期的記錄（與院舍活動次數統計相同），否則只計 start 至 end（含）的記錄
+    def counts(self, start=None, end=None):
+        if start is None and end is None:
+            return np.diff(self.offsets)
+        low = self._bounds(0 if start is None else _home_day_number(start), 'left')
+        high = self._bounds(HOME_NO_DATE - 1 if end is None else _home_day_number(end), 'right')
+        return high - low
+
+    # 活動次數剛好（at_least 為 True 時至少）為 n 的院舍位置
+    def homes_with_visits(self, n, start=None, end=None, at_least=False):
+        counts = self.counts(start, end)
+        return np.flatnonzero(counts >= n if at_least else counts == n)
+
+    # 各院舍最近一次的有效活動日期（沒有有效日期時為 NaT）
+    def last_visits(self):
+        last = self._bounds(HOME_NO_DATE, 'left') - 1
+        has_date = last >= self.offsets[:-1]
+        return _home_dates(np.where(has_date, self.keys[np.where(has_date, last, 0)] & HOME_NO_DATE, HOME_NO_DATE))
+
+    # 全部有效活動日期的範圍 (最早, 最後)；沒有有效日期時為 (None, None)
+    def date_range(self):
+        firsts = self.keys[self.offsets[:-1][np.diff(self.offsets) > 0]] & HOME_NO_DATE
+        firsts = firsts[firsts != HOME_NO_DATE]
+        if not len(firsts):
+            return None, None
+        lasts = self.last_visits()
+        return pd.Timestamp(_home_dates(firsts).min()), pd.Timestamp(lasts[~np.isnat(lasts)].max())
+
+    # 截至 as_of（預設為資料中最後的有效日期）最近 weeks 週沒有活動的院舍位置
+    def stale_homes(self, weeks, as_of=None):
+        if as_of is None:
+            as_of = self.date_range()[1]
+            if as_of is None:
+                return np.arange(len(self))
+        as_of = pd.Timestamp(as_of)
+        return np.flatnonzero(self.counts(as_of - pd.Timedelta(weeks=weeks) + pd.Timedelta(days=1), as_of) == 0)
+
+    # 院舍（位置）的活動日期：已排序的 datetime64，無效日期為 NaT 排在最後；可只取 start 至 end（含）的日期
+    def dates(self, position, start=None, end=None):
+        days = self.keys[self.offsets[position]:self.offsets[position + 1]] & HOME_NO_DATE
+        if start is not None or end is not None:
+            low = 0 if start is None else _home_day_number(start)
+            high = HOME_NO_DATE - 1 if end is None else _home_day_number(end)
+            days = days[(days >= low) & (days <= high)]
+        return _home_dates(days)
+
+    # 院舍（位置）的活動日期字串（無效日期為空字串）
+    def date_texts(self, position, start=None, end=None):
+        return format_dates(self.dates(position, start, end)).tolist()
+
+
+# 計算院舍活動次數統計：{活動次數: 院舍數目} 及各院舍的活動日期（HomeActivity）
+# 有 home_index 時 HomeActivity 亦包括 homelist.csv 中沒有任何記錄的院舍（活動次數為 0，不影響活動次數統計）
+def calculate_home_activity_stats(df, home_index=None):
+    known_homes = home_index.local_staff if home_index is not None else ()
+    home_activity = HomeActivity.from_records(df['HomeName'], df['ServiceDate'], known_homes)
+    return home_count_distribution(pd.Series(home_activity.counts())), home_activity
+
+# 由每間院舍的活動次數得出 {活動次數: 院舍數目}（1 至最大次數，沒有院舍的次數為 0）
+def home_count_distribution(home_activity_counts):
+    home_counts = home_activity_counts.value_counts().to_dict()
+    max_count = max(home_counts.keys(), default=0)
+    return {i: home_counts.get(i, 0) for i in range(1, max_count + 1)}
+
+# homelist.csv 內容指紋
+def homelist_fingerprint(github_df):
+    return hashlib.sha1(pd.util.hash_pandas_object(github_df, index=False).to_numpy().tobytes()).hexdigest()
+
+# 統計引擎的唯一入口：欄位驗證 → 名稱轉換 → 區域判斷 → 員工/分區/院舍統計 → 逐行檢查，回傳 StatsBundle
+# 缺少必要欄位時拋出 StatsValidationError（issues 含全部問題）；逐行檢查的問題放在 bundle.issues
+def compute_stats_bundle(uploaded_df, github_df):
+    issues = validate_inputs(uploaded_df, github_df)
+    if issues:
+        raise StatsValidationError(issues)
+    home_index = HomeIndex.from_homelist(github_df)
+    return stats_bundle_from_frame(prepare_frame(uploaded_df, home_index), home_index)
+
+# 由 prepare_frame 準備好的資料計算全部統計
+def stats_bundle_from_frame(df, home_index):
+    rows = len(df)
+    with stage('calculate_staff_stats', rows):
+        staff_stats, staff_days, staff_index = calculate_staff_stats(df, home_index)
+    with stage('calculate_region_stats', rows):
+        region_stats, total_sessions, total_participants = calculate_region_stats(df, home_index)
+    with stage('calculate_home_activity_stats', rows):
+        home_counts, home_activity = calculate_home_activity_stats(df, home_index)
+    with stage('validate_rows', rows):
+        issues = validate_rows(df, home_index)
+        duplicates = duplicate_records(df, issues)
+    return StatsBundle(
+        df=df,
+        staff_stats=staff_stats,
+        staff_days=staff_days,
+        staff_index=staff_index,
+        region_stats=region_stats,
+        total_sessions=total_sessions,
+        total_participants=total_participants,
+        home_index=home_index,
+        duplicates=duplicates,
+        home_counts=home_counts,
+        home_activity=home_activity,
+        issues=tuple(issues),
+    )
+
+# 統計前的資料準備（不修改輸入）：日期正規化、Categorical、名稱轉換，並加入 RespRegion/SecondRegion 欄
+def prepare_frame(uploaded_df, home_index):
+    rows = len(uploaded_df)
+    with stage('normalize', rows):
+        df = categorize_columns(normalize_service_dates(uploaded_df.copy()), home_index)
+        df['RespStaff'] = convert_names(df['RespStaff'])
+        df['2ndRespStaffName'] = convert_names(df['2ndRespStaffName'])
+    with stage('classify_regions', rows):
+        regions = classify_regions(df, home_index)
+        df['RespRegion'] = regions['resp_region']
+        df['SecondRegion'] = regions['second_region']
+    return df
+
+# 員工外出統計表欄位
+STAFF_TABLE_COLUMNS = ['本區單獨', '本區協作', '外區單獨', '外區協作', '本區總共', '全部總共', '外出日數']
+
+# 員工外出統計表（按指定員工次序）
+def staff_table(staff_stats):
+    stats_df = pd.DataFrame(
+        [[getattr(stats, STAFF_STATS_COLUMNS[col]) for col in STAFF_TABLE_COLUMNS] for stats in staff_stats.values()],
+        index=list(staff_stats), columns=STAFF_TABLE_COLUMNS
+    )
+    stats_df.index.name = '員工'
+    existing_staff = [s for s in DESIRED_STAFF_ORDER if s in stats_df.index]
+    return stats_df.reindex(existing_staff)
+
+# 分區統計節數表（含總計行）
+def region_table(region_stats, has_participants):
+    region_data = {
+        '分區': list(region_stats.keys()),
+        '總節數': [stats.count for stats in region_stats.values()],
+        '0 次': [stats.count_0 for stats in region_stats.values()],
+        '1 次': [stats.count_1 for stats in region_stats.values()],
+    }
+    if has_participants:
+        region_data['總人次'] = [stats.participants for stats in region_stats.values()]
+    region_df = pd.DataFrame(region_data)
+    total_row = ['總計',
+                 sum(region_data.get('總節數', [0])),
+                 sum(region_data.get('0 次', [0])),
+                 sum(region_data.get('1 次', [0]))]
+    if '總人次' in region_data:
+        total_row.append(sum(region_data['總人次']))
+    region_df.loc[len(region_df)] = total_row
+    region_df.index = region_df.index + 1
+    return region_df
+
+# 服務人次統計表（按 NumberOfSession 分開，含總計行）
+def participants_table(region_stats):
+    participants_data = {
+        '分區': list(region_stats.keys()),
+        '總人次': [stats.participants for stats in region_stats.values()],
+        '0 次人次': [stats.participants_0 for stats in region_stats.values()],
+        '1 次人次': [stats.participants_1 for stats in region_stats.values()],
+    }
+    participants_df = pd.DataFrame(participants_data)
+    participants_df.loc[len(participants_df)] = ['總計',
+                                                sum(participants_data['總人次']),
+                                                sum(participants_data['0 次人次']),
+                                                sum(participants_data['1 次人次'])]
+    participants_df.index = participants_df.index + 1
+    return participants_df
+
+# NumberOfSession 統計表（按員工，含總計行）
+def session_table(staff_stats):
+    session_data = []
+    for staff in DESIRED_STAFF_ORDER:
+        if staff in staff_stats:
+            session_data.append({
+                '員工': staff,
+                '0 次': staff_stats[staff].session_0,
+                '1 次': staff_stats[staff].session_1,
+                '總計': staff_stats[staff].session_total
+            })
+    total_0 = sum(stats.session_0 for stats in staff_stats.values())
+    total_1 = sum(stats.session_1 for stats in staff_stats.values())
+    session_data.append({
+        '員工': '總計',
+        '0 次': total_0,
+        '1 次': total_1,
+        '總計': total_0 + total_1
+    })
+    session_df = pd.DataFrame(session_data)
+    session_df.index = session_df.index + 1
+    return session_df
+
+# 院舍活動次數統計表（含總計行）
+def home_activity_table(home_counts):
+    home_activity_data = [
+        {'活動次數': count, '院舍數目': num_homes, '總節數': count * num_homes}
+        for count, num_homes in home_counts.items()
+    ]
+    home_activity_df = pd.DataFrame(home_activity_data)
+
+    # 修正 Arrow 錯誤：總計行單獨處理，避免型別衝突
+    if not home_activity_df.empty:
+        total_homes = home_activity_df['院舍數目'].sum()
+        total_sessions = home_activity_df['總節數'].sum()
+        total_row = pd.DataFrame({
+            '活動次數': ['總計'],
+            '院舍數目': [total_homes],
+            '總節數': [total_sessions]
+        })
+        home_activity_df = pd.concat([home_activity_df, total_row], ignore_index=True)
+
+    home_activity_df.index = home_activity_df.index + 1
+    return home_activity_df
+
+# 活動類型次數表（指定 NumberOfSession，合計所有分區，含總計行）；無記錄時回傳 None
+def activity_type_table(region_stats, session_val):
+    type_counts = {}
+    for region in region_stats.values():
+        for act, info in region.activity_types(session_val).items():
+            type_counts[act] = type_counts.get(act, 0) + info.count
+    if not type_counts:
+        return None
+    type_df = pd.DataFrame.from_dict(type_counts, orient='index', columns=['次數']).reset_index()
+    type_df.columns = ['活動類型', '次數']
+    type_df = type_df.sort_values('次數', ascending=False)
+    type_df.loc[len(type_df)] = ['總計', type_df['次數'].sum()]
+    type_df.index = type_df.index + 1
+    return type_df
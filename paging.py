@@ -0,0 +1,149 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from outing_stats import format_dates
+
+# 每頁行數的選項及預設值
+PAGE_SIZES = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = 50
+
+
+# 分頁表格：keys 每個顯示欄一欄，保存未格式化的值（Categorical、datetime64、整數，或行位置陣列等非純量值）
+# 排序及篩選都在 keys 上進行，只有目前一頁（或按下匯出時的全部選取行）才格式化
+# formatters 為 欄名 → 把一頁的值轉為顯示值的函數；有 formatter 的欄視為非純量，不參與排序及篩選
+@dataclass(slots=True)
+class PagedTable:
+    keys: pd.DataFrame
+    formatters: dict = field(default_factory=dict)
+
+    @property
+    def scalar_columns(self):
+        return [col for col in self.keys.columns if col not in self.formatters]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+# 以行位置從上傳資料取出指定欄（columns 為 {顯示欄名: 資料欄名}），只做 take 不做格式化
+def records_table(df, positions, columns):
+    return PagedTable(pd.DataFrame({
+        label: df[col].take(positions).reset_index(drop=True) for label, col in columns.items()
+    }))
+
+
+# 分區詳細統計的記錄清單
+def region_records_table(bundle, region):
+    return records_table(bundle.df, bundle.region_stats[region].records,
+                         {'負責員工': 'RespStaff', '活動日期': 'ServiceDate', '院舍名稱': 'HomeName'})
+
+
+# 員工的單獨及協作記錄（get_staff_details 的結果只含行位置取出的原始值）
+def staff_records_tables(details):
+    solo = details.solo_records.rename(columns={'ServiceDate': '活動日期', 'HomeName': '院舍名稱'})
+    collab = details.collab_records.rename(columns={'ServiceDate': '活動日期', 'HomeName': '院舍名稱', 'Collaborator': '協作者'})
+    return PagedTable(solo), PagedTable(collab)
+
+
+# HomeActivity 查詢結果（positions 為院舍位置）：活動次數及日期可只計 start 至 end（含），日期只在顯示或匯出時才取出並格式化
+def home_visits_table(activity, positions, start=None, end=None):
+    keys = pd.DataFrame({
+        '院舍名稱': pd.Series(activity.homes[positions], dtype=object),
+        '活動次數': pd.Series(activity.counts(start, end)[positions], dtype=np.int64),
+        '最近活動日期': pd.Series(activity.last_visits()[positions]),
+        '活動日期': pd.Series(positions, dtype=np.int64),
+    })
+
+    def dates(rows):
+        return [', '.join(activity.date_texts(position, start, end)) for position in rows]
+
+    return PagedTable(keys, {'活動日期': dates})
+
+
+# 分區指定 NumberOfSession 的活動類型、節數及活動日期（日期由行位置在顯示或匯出時才取出並格式化）
+def activity_dates_table(bundle, region, session_val):
+    service_dates = bundle.df['ServiceDate']
+    activity_types = bundle.region_stats[region].activity_types(session_val)
+    keys = pd.DataFrame({
+        '活動類型': pd.Series(list(activity_types), dtype=object),
+        '節數': pd.Series([details.count for details in activity_types.values()], dtype=np.int64),
+        '活動日期': pd.Series([details.rows for details in activity_types.values()], dtype=object),
+    })
+
+    def dates(rows):
+        return [', '.join(format_dates(service_dates.iloc[positions].sort_values())) for positions in rows]
+
+    return PagedTable(keys, {'活動日期': dates})
+
+
+# 排序鍵：Categorical 按類別名稱排序（只排序類別字典），其他欄直接使用原值
+def _sort_key(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.astype(str)
+        ranks = np.empty(len(categories), dtype=np.float64)
+        ranks[np.argsort(categories, kind='stable')] = np.arange(len(categories))
+        codes = values.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, ranks[codes], np.nan), index=values.index)
+    return values
+
+
+# 含有 text 的行：只格式化欄內不重複的值（Categorical 只看類別字典），再以 isin 對應回各行
+def _text_mask(values, text):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        matched = np.flatnonzero(_display(pd.Series(categories)).astype(str).str.contains(text, regex=False))
+        return np.isin(values.cat.codes.to_numpy(), matched)
+    uniques = pd.Series(pd.unique(values.dropna()))
+    if uniques.empty:
+        return np.zeros(len(values), dtype=bool)
+    matched = uniques[_display(uniques).astype(str).str.contains(text, regex=False).to_numpy()]
+    return values.isin(matched).to_numpy()
+
+
+# 篩選及排序後的行次序（keys 的行位置）；query 為空時不篩選，sort_by 為 None 時保持原有次序
+def select(table, sort_by=None, descending=False, query=''):
+    keys = table.keys
+    order = np.arange(len(keys))
+    query = query.strip()
+    if query:
+        mask = np.zeros(len(keys), dtype=bool)
+        for col in table.scalar_columns:
+            mask |= _text_mask(keys[col], query)
+        order = order[mask]
+    if sort_by is not None:
+        values = _sort_key(keys[sort_by]).iloc[order].set_axis(order)
+        order = values.sort_values(ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+    return order
+
+
+def _display(values):
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return format_dates(values).set_axis(values.index)
+    return values
+
+
+# 格式化指定的行（order 為 keys 的行位置），行號由 start + 1 開始
+def format_rows(table, order, start=0):
+    rows = table.keys.iloc[order]
+    formatted = pd.DataFrame({
+        col: table.formatters[col](rows[col].tolist()) if col in table.formatters else _display(rows[col]).to_numpy()
+        for col in rows.columns
+    })
+    formatted.index = np.arange(start + 1, start + len(formatted) + 1)
+    return formatted
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+# 第 page_number 頁（由 1 開始）的顯示表
+def page(table, order, page_number, page_size=DEFAULT_PAGE_SIZE):
+    start = (page_number - 1) * page_size
+    return format_rows(table, order[start:start + page_size], start)
+
+
+# 匯出全部選取行（已篩選及排序）為 CSV，utf-8-sig 以便 Excel 直接開啟
+def export_csv(table, order):
+    return format_rows(table, order).to_csv(index=False).encode('utf-8-sig')
@@ -0,0 +1,186 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import tracemalloc
+
+# cProfile 輸出目錄，可用環境變數 MONTHLYSTAT_PROFILE_DIR 覆寫
+PROFILE_DIR = os.environ.get(
+    'MONTHLYSTAT_PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+)
+# 最多保留的 .prof 檔數目，超過時刪除最舊的
+PROFILE_MAX_FILES = 20
+
+# 每個階段一行 JSON 的結構化日誌
+logger = logging.getLogger('monthlystat.timing')
+
+# 時間日誌檔（JSON lines），可用環境變數 MONTHLYSTAT_TIMING_LOG 覆寫；設為空字串時輸出到 stderr
+TIMING_LOG = os.environ.get('MONTHLYSTAT_TIMING_LOG', os.path.join(PROFILE_DIR, 'timing.jsonl'))
+# 時間日誌超過 TIMING_LOG_MAX_BYTES 時輪替，保留 TIMING_LOG_BACKUPS 個舊檔（timing.jsonl.1 …）
+TIMING_LOG_MAX_BYTES = 5 * 1024 * 1024
+TIMING_LOG_BACKUPS = 3
+
+_logging_lock = threading.Lock()
+
+_current = contextvars.ContextVar('monthlystat_recorder', default=None)
+
+
+# 為時間日誌加上 INFO 等級的 handler（整個進程只加一次，重複呼叫不會重複輸出）
+# 寫入 path（預設 TIMING_LOG，按大小輪替）；path 為空字串或目錄無法建立時輸出到 stderr
+def configure_logging(path=None):
+    with _logging_lock:
+        if logger.handlers:
+            return logger
+        path = TIMING_LOG if path is None else path
+        handler = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    path, maxBytes=TIMING_LOG_MAX_BYTES, backupCount=TIMING_LOG_BACKUPS, encoding='utf-8')
+            except OSError:
+                handler = None
+        if handler is None:
+            handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        return logger
+
+
+# 記錄一次執行中各階段的時間；trace_memory 為 True 時同時以 tracemalloc 量度每階段的記憶體高峰（會拖慢執行）
+class Recorder:
+    def __init__(self, run_id=None, trace_memory=False):
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._open = []
+
+    @contextlib.contextmanager
+    def activate(self):
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            if started_tracing:
+                tracemalloc.stop()
+
+    # 開始量度一個階段；重設 tracemalloc 高峰前先把目前高峰計入仍在量度中的外層階段，巢狀階段的高峰因此互不影響
+    def _mark(self):
+        mark = {'started': time.perf_counter(), 'base': None, 'peak': 0}
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            for open_mark in self._open:
+                open_mark['peak'] = max(open_mark['peak'], peak)
+            tracemalloc.reset_peak()
+            mark['base'] = current
+        self._open.append(mark)
+        return mark
+
+    def _record(self, name, mark, rows):
+        seconds = time.perf_counter() - mark['started']
+        if mark in self._open:
+            self._open.remove(mark)
+        peak_mb = None
+        if mark['base'] is not None and tracemalloc.is_tracing():
+            peak = max(mark['peak'], tracemalloc.get_traced_memory()[1])
+            peak_mb = round((peak - mark['base']) / 1024 / 1024, 3)
+        record = {
+            'run': self.run_id,
+            'stage': name,
+            'seconds': round(seconds, 6),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds) if rows and seconds > 0 else None,
+            'peak_mb': peak_mb,
+        }
+        self.stages.append(record)
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+    # 以 with 區塊計時；區塊內可設定 info['rows'] 補上處理行數
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        info = {'rows': rows}
+        mark = self._mark()
+        try:
+            yield info
+        finally:
+            self._record(name, mark, info['rows'])
+
+    def total_seconds(self):
+        return sum(record['seconds'] for record in self.stages)
+
+
+# 在目前啟用的 Recorder 中計時一個階段；沒有啟用的 Recorder 時不做任何事（批次工具等呼叫端不受影響）
+@contextlib.contextmanager
+def stage(name, rows=None):
+    recorder = _current.get()
+    if recorder is None:
+        yield {'rows': rows}
+        return
+    with recorder.stage(name, rows) as info:
+        yield info
+
+
+# 依次量度頁面中連續的區段：每次 lap() 記錄自上一次 lap()（或 restart()）以來的時間，適合不便以 with 包住的長區段
+class Laps:
+    def __init__(self):
+        self.recorder = _current.get()
+        self._mark = None
+        self.restart()
+
+    def restart(self):
+        if self.recorder is not None:
+            if self._mark is not None:
+                self.recorder._open.remove(self._mark)
+            self._mark = self.recorder._mark()
+
+    def lap(self, name, rows=None):
+        if self.recorder is None:
+            return
+        self.recorder._record(name, self._mark, rows)
+        self._mark = None
+        self.restart()
+
+
+# 以 cProfile 量度區塊並將 pstats 檔寫入 PROFILE_DIR；enabled 為 False 時不做任何事
+# 產生的檔案路徑放在回傳的 dict 的 'path'，可用 python -m pstats 或 snakeviz 離線分析
+# 目錄中的 .prof 檔超過 PROFILE_MAX_FILES 時刪除最舊的
+@contextlib.contextmanager
+def capture_profile(enabled=True, name='rerun', profile_dir=None):
+    result = {'path': None}
+    if not enabled:
+        yield result
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        profile_dir = profile_dir or PROFILE_DIR
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}-{time.strftime('%Y%m%dT%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        result['path'] = path
+        logger.info(json.dumps({'profile': path}, ensure_ascii=False))
+        _prune_profiles(profile_dir)
+
+
+def _prune_profiles(profile_dir):
+    try:
+        dumps = sorted((entry for entry in os.scandir(profile_dir) if entry.name.endswith('.prof')),
+                       key=lambda entry: entry.stat().st_mtime)
+        for entry in dumps[:-PROFILE_MAX_FILES]:
+            os.remove(entry.path)
+    except OSError:
+        pass
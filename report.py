@@ -0,0 +1,172 @@
+import datetime
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from outing_stats import (
+    SERVICE_DATE_TEXT, format_dates, get_staff_details,
+    staff_table, region_table, participants_table, session_table, home_activity_table, activity_type_table
+)
+
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Excel 單一儲存格的字元上限（全年的日期清單可能超過）
+EXCEL_CELL_LIMIT = 32767
+
+
+# 將統計結果包整理成摘要表（與「外出統計程式」頁面顯示的表相同），批次工具及完整報表共用
+def build_report_tables(bundle):
+    df = bundle.df
+    tables = {
+        'staff': staff_table(bundle.staff_stats).reset_index(),
+        'region': region_table(bundle.region_stats, 'NumberOfParticipant(Without Volunteer Count)' in df.columns),
+        'home_activity': home_activity_table(bundle.home_counts),
+    }
+    if 'NumberOfParticipant(Without Volunteer Count)' in df.columns:
+        tables['participants'] = participants_table(bundle.region_stats)
+    if 'NumberOfSession' in df.columns:
+        tables['session'] = session_table(bundle.staff_stats)
+    for session_val in (0, 1):
+        type_df = activity_type_table(bundle.region_stats, session_val)
+        if type_df is not None:
+            tables[f'activity_type_{session_val}'] = type_df
+    return tables
+
+
+# 摘要表的工作表名稱（按頁面次序）
+SUMMARY_SHEETS = {
+    'staff': '員工外出統計表',
+    'region': '分區統計節數',
+    'participants': '服務人次統計',
+    'session': 'NumberOfSession統計',
+    'home_activity': '院舍活動次數統計',
+    'activity_type_0': '活動類型（0次）',
+    'activity_type_1': '活動類型（1次）',
+}
+
+
+# openpyxl 不接受 NaN/NaT 及部分 numpy 型別，逐格轉為 Excel 可用的值
+def _cell(value):
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, str):
+        return value if len(value) <= EXCEL_CELL_LIMIT else value[:EXCEL_CELL_LIMIT - 1] + '…'
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, (str, int, float, bool, datetime.datetime, datetime.date)):
+        return value
+    return str(value)
+
+
+def _table_rows(table):
+    for row in table.itertuples(index=False, name=None):
+        yield [_cell(value) for value in row]
+
+
+def _region_record_rows(bundle):
+    for region, stats in bundle.region_stats.items():
+        records = bundle.df.iloc[stats.records]
+        for staff, date, home in zip(records['RespStaff'], records[SERVICE_DATE_TEXT], records['HomeName']):
+            yield [region, _cell(staff), date, _cell(home)]
+
+
+def _region_activity_rows(bundle):
+    service_dates = bundle.df['ServiceDate']
+    for region, stats in bundle.region_stats.items():
+        for session_val in (0, 1):
+            for activity, details in stats.activity_types(session_val).items():
+                dates = ', '.join(format_dates(service_dates.iloc[details.rows].sort_values()))
+                yield [region, session_val, _cell(activity), details.count, _cell(dates)]
+
+
+# 每位員工的詳細記錄逐位計算並立即寫出，不會同時保留全部員工的記錄（三個工作表各自重新查索引）
+def _staff_detail_sheets(bundle):
+    def staff_details():
+        for staff in bundle.staff_stats:
+            yield staff, get_staff_details(bundle.df, staff, bundle.staff_index)
+
+    def solo():
+        for staff, details in staff_details():
+            for date, home in zip(format_dates(details.solo_records['ServiceDate']), details.solo_records['HomeName']):
+                yield [staff, date, _cell(home)]
+
+    def collab():
+        for staff, details in staff_details():
+            records = details.collab_records
+            for date, home, partner in zip(format_dates(records['ServiceDate']), records['HomeName'],
+                                           records['Collaborator']):
+                yield [staff, date, _cell(home), _cell(partner)]
+
+    def days():
+        for staff, details in staff_details():
+            yield [staff, len(details.solo_days), len(details.collab_days), len(details.all_days),
+                   _cell(', '.join(format_dates(details.solo_days))),
+                   _cell(', '.join(format_dates(details.collab_days))),
+                   _cell(', '.join(format_dates(details.all_days)))]
+
+    return [
+        ('員工單獨記錄', ['員工', '活動日期', '院舍名稱'], solo()),
+        ('員工協作記錄', ['員工', '活動日期', '院舍名稱', '協作者'], collab()),
+        ('員工外出日期', ['員工', '單獨日數', '協作日數', '總日數', '單獨日期', '協作日期', '全部日期'], days()),
+    ]
+
+
+def _home_detail_rows(bundle):
+    activity = bundle.home_activity
+    for position, (home, count) in enumerate(zip(activity.homes, activity.counts())):
+        # homelist.csv 中沒有記錄的院舍只用於查詢，不列入報表
+        if not count:
+            continue
+        yield [_cell(home), int(count), _cell(', '.join(activity.date_texts(position)))]
+
+
+# 完整報表的全部工作表：(名稱, 標題列, 資料列迭代器)；資料列在寫出時才逐行產生
+def report_sheets(bundle):
+    for key, table in build_report_tables(bundle).items():
+        yield SUMMARY_SHEETS[key], [str(col) for col in table.columns], _table_rows(table)
+    yield '分區記錄', ['分區', '負責員工', '活動日期', '院舍名稱'], _region_record_rows(bundle)
+    if '活動類型' in bundle.df.columns:
+        yield '分區活動類型', ['分區', 'NumberOfSession', '活動類型', '節數', '活動日期'], _region_activity_rows(bundle)
+    yield from _staff_detail_sheets(bundle)
+    yield '院舍活動詳細', ['院舍名稱', '活動次數', '活動日期'], _home_detail_rows(bundle)
+
+
+# 以 openpyxl 的 write-only 模式寫出多個工作表（target 為路徑或可寫入的檔案物件）
+# 資料列逐行寫入暫存檔，記憶體用量不隨報表大小增加；有安裝 lxml 時 openpyxl 會自動使用以加快寫出
+def write_workbook(sheets, target):
+    workbook = Workbook(write_only=True)
+    for name, header, rows in sheets:
+        sheet = workbook.create_sheet(title=name)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    if isinstance(target, (str, os.PathLike)):
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    workbook.save(target)
+
+
+# 將 {工作表名稱: DataFrame} 寫成 XLSX
+def write_tables_xlsx(tables, target):
+    write_workbook(((name, [str(col) for col in table.columns], _table_rows(table)) for name, table in tables.items()),
+                   target)
+
+
+# 將統計結果包寫成一個多工作表的完整報表 XLSX
+def write_report(bundle, target):
+    write_workbook(report_sheets(bundle), target)
+
+
+# 完整報表的 XLSX 內容（供下載按鈕使用）
+def report_bytes(bundle):
+    buffer = BytesIO()
+    write_report(bundle, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 整個進程共用的記憶體預算（MB）及未被使用的項目保留秒數，可用環境變數覆寫（舊的 MONTHLYSTAT_PARSE_CACHE_MB 仍然有效）
+DEFAULT_BUDGET_MB = int(os.environ.get('MONTHLYSTAT_SHARED_CACHE_MB',
+                                       os.environ.get('MONTHLYSTAT_PARSE_CACHE_MB', '256')))
+DEFAULT_TTL = int(os.environ.get('MONTHLYSTAT_SHARED_CACHE_TTL', '3600'))
+
+# 磁碟快取目錄（homelist.csv 副本、XLSX 的 Parquet 副本），可用環境變數 MONTHLYSTAT_CACHE_DIR 覆寫
+CACHE_DIR = os.environ.get(
+    'MONTHLYSTAT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+
+# 先由 write(暫存檔路徑) 寫入暫存檔再替換 path，讀取端不會讀到寫了一半的檔案
+# 暫存檔名包含進程及執行緒編號，多個 session 或進程同時寫入同一檔案時互不干擾；寫入失敗時刪除暫存檔並拋出原有例外
+def atomic_write(path, write):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _kind(key):
+    return key[0] if isinstance(key, tuple) and key else 'default'
+
+
+def _hit_rate(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+# 以內容雜湊為鍵、整個進程共用的快取：多個 session 上傳相同內容時只保存一份，各 session 只持有同一物件的參照
+# 按記憶體用量做 LRU 淘汰，並淘汰超過 ttl 秒未被使用的項目；鍵的第一個元素為類別（'upload'、'homelist' 等），統計按類別分開
+# 取得的物件為共用物件，呼叫端不可修改
+class SharedCache:
+    def __init__(self, max_bytes, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # 鍵 → [值, 大小, 最後使用時間]，按最後使用時間排序
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _count(self, key, name):
+        counters = self._counters.setdefault(_kind(key), {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0})
+        counters[name] += 1
+
+    def _remove(self, key, reason):
+        self._size -= self._entries.pop(key)[1]
+        self._count(key, reason)
+
+    # 淘汰最久未使用而超過 ttl 的項目（_entries 按最後使用時間排序，遇到未過期的即可停止）
+    def _expire(self, now):
+        while self._entries:
+            key, (_, _, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl:
+                break
+            self._remove(key, 'expirations')
+
+    def get(self, key):
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count(key, 'misses')
+                return None
+            entry[2] = now
+            self._entries.move_to_end(key)
+            self._count(key, 'hits')
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            # 單一項目超過預算時不快取，避免把其他項目全部擠走
+            if size > self.max_bytes:
+                return
+            self._entries[key] = [value, size, now]
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)), 'evictions')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    # 快取狀態：常駐大小、項目數、命中率及淘汰次數（總計及按類別）
+    def stats(self):
+        with self._lock:
+            self._expire(self._clock())
+            kinds = {}
+            for key, (_, size, _) in self._entries.items():
+                kind = kinds.setdefault(_kind(key), {'entries': 0, 'size_bytes': 0})
+                kind['entries'] += 1
+                kind['size_bytes'] += size
+            for name, counters in self._counters.items():
+                kind = kinds.setdefault(name, {'entries': 0, 'size_bytes': 0})
+                kind.update(counters, hit_rate=_hit_rate(counters['hits'], counters['misses']))
+            totals = {
+                name: sum(counters[name] for counters in self._counters.values())
+                for name in ('hits', 'misses', 'evictions', 'expirations')
+            }
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                **totals,
+                'hit_rate': _hit_rate(totals['hits'], totals['misses']),
+                'kinds': kinds,
+            }
+
+
+SHARED_CACHE = SharedCache(DEFAULT_BUDGET_MB * 1024 * 1024)
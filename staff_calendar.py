@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# numpy 2.0 起有逐位元組的 popcount；舊版以 unpackbits 計算
+HAS_BITWISE_COUNT = hasattr(np, 'bitwise_count')
+
+
+def _popcount(bits, axis=-1):
+    if HAS_BITWISE_COUNT:
+        return np.bitwise_count(bits).sum(axis=axis, dtype=np.int64)
+    return np.unpackbits(bits, axis=axis).sum(axis=axis, dtype=np.int64)
+
+
+# 日期轉為自 1970-01-01 起的日數（時間部分忽略），無效日期為 NaT
+def _days(dates):
+    return pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]')
+
+
+# 員工名稱對應到 staff 的行位置（不在 staff 中或為空值時為 -1）；Categorical 只查類別字典
+def _staff_rows(staff_values, staff):
+    index = pd.Index(staff, dtype=object)
+    if isinstance(getattr(staff_values, 'dtype', None), pd.CategoricalDtype):
+        values = pd.Categorical(staff_values)
+        lookup = np.append(index.get_indexer(values.categories), -1)
+        return lookup[values.codes]
+    return index.get_indexer(np.asarray(staff_values, dtype=object))
+
+
+# 日期範圍上的日曆位元圖：由 start 起每日一位元（np.packbits 壓縮，每位員工一行 ceil(日數 / 8) 個位元組）
+# 外出日數、單獨/協作日期的聯集及交集、員工之間同日外出都是位元運算；不同日曆須有相同的 start 及 days 才可直接運算
+@dataclass(frozen=True, slots=True)
+class DayCalendar:
+    start: np.datetime64  # 第一日（datetime64[D]）
+    days: int             # 範圍內的日數
+    staff: tuple          # 員工（行次序）
+    bits: np.ndarray      # uint8，形狀 (員工數, ceil(days / 8))
+
+    # 由 (員工, 日期) 配對建立；日期只取日（時間部分忽略），無效日期略過
+    # start/days 為 None 時以資料中最早及最晚的日期為範圍；staff 為 None 時按首次出現次序
+    @classmethod
+    def from_pairs(cls, staff_values, dates, staff=None, start=None, days=None):
+        day_values = _days(dates)
+        if staff is None:
+            staff_values = np.asarray(staff_values, dtype=object)
+            staff = pd.unique(staff_values[pd.notna(staff_values) & ~np.isnat(day_values)])
+        staff = tuple(staff)
+        rows = _staff_rows(staff_values, staff)
+        valid = (rows >= 0) & ~np.isnat(day_values)
+        day_numbers = day_values[valid].astype(np.int64)
+        rows = rows[valid]
+        if start is None:
+            first = int(day_numbers.min()) if len(day_numbers) else 0
+            days = int(day_numbers.max()) - first + 1 if len(day_numbers) else 0
+        else:
+            first = int(np.datetime64(start, 'D').astype(np.int64))
+        offsets = day_numbers - first
+        keep = (offsets >= 0) & (offsets < days)
+        grid = np.zeros((len(staff), days), dtype=bool)
+        grid[rows[keep], offsets[keep]] = True
+        return cls(np.datetime64(first, 'D'), days, staff, np.packbits(grid, axis=1))
+
+    def __contains__(self, staff):
+        return staff in self.staff
+
+    # 員工的外出日位元圖（未出現的員工為全零）
+    def bitmap(self, staff):
+        try:
+            return self.bits[self.staff.index(staff)]
+        except ValueError:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+
+    def count(self, staff=None):
+        return int(_popcount(self.bitmap(staff))) if staff is not None else _popcount(self.bits)
+
+    # 位元圖對應的日期（已排序的 DatetimeIndex）
+    def dates(self, bitmap):
+        offsets = np.flatnonzero(np.unpackbits(bitmap, count=self.days))
+        return pd.DatetimeIndex(self.start + offsets.astype('timedelta64[D]')).as_unit('ns')
+
+    def staff_dates(self, staff):
+        return self.dates(self.bitmap(staff))
+
+    # 各員工都外出的日子（例如「X 和 Y 都外出的日子」）
+    def shared(self, *staff):
+        return np.bitwise_and.reduce([self.bitmap(name) for name in staff])
+
+    # 員工兩兩同日外出的日數：DataFrame（行、列皆為員工，對角為各自的外出日數）
+    def overlap_counts(self):
+        counts = _popcount(self.bits[:, None, :] & self.bits[None, :, :])
+        return pd.DataFrame(counts, index=list(self.staff), columns=list(self.staff))
+
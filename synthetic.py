@@ -0,0 +1,120 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import homelist
+from outing_stats import NAME_CONVERSION, HomeIndex
+
+# 系統匯出檔使用的編碼
+EXPORT_ENCODING = 'big5hkscs'
+
+ACTIVITY_TYPES = ['音樂', '手工', '運動', '講座', '懷舊', '園藝', '節日慶祝', '健康講座']
+SERVICE_STATUSES = ['完成', '取消']
+
+# 各欄位的比例（參照實際匯出檔的大概分佈）
+CHINESE_NAME_RATE = 0.6      # 員工以中文名稱記錄（需經 NAME_CONVERSION 轉換）
+MISSING_SECOND_RATE = 0.45   # 沒有第二負責員工
+LOCAL_RATE = 0.7             # 負責員工為該院舍的本區員工
+MISSING_PARTICIPANT_RATE = 0.03
+MISSING_ACTIVITY_RATE = 0.05
+
+
+# 每位員工可用的名稱：英文名稱，以及 NAME_CONVERSION 中對應的中文名稱
+def _staff_aliases():
+    aliases = {}
+    for chinese, english in NAME_CONVERSION.items():
+        aliases.setdefault(english, []).append(chinese)
+    return aliases
+
+
+def _pick_names(rng, staff, aliases):
+    names = staff.copy()
+    use_chinese = rng.random(len(staff)) < CHINESE_NAME_RATE
+    for english, chinese in aliases.items():
+        rows = np.flatnonzero(use_chinese & (staff == english))
+        names[rows] = rng.choice(np.array(chinese, dtype=object), len(rows))
+    return names
+
+
+# 產生一個月份的模擬匯出資料（欄位與系統匯出的 CSV 相同）
+# 院舍及員工取自 homelist.csv；員工名稱混合英文及 NAME_CONVERSION 的中文名稱
+def generate_export(rows, month='2025-01', seed=0, github_df=None):
+    rng = np.random.default_rng(seed)
+    if github_df is None:
+        github_df = pd.read_csv(homelist.BUNDLED_PATH)
+    home_index = HomeIndex.from_homelist(github_df)
+    homes = np.array(sorted(home_index.local_staff), dtype=object)
+    all_staff = np.array(sorted(set().union(*home_index.local_staff.values())), dtype=object)
+    local_staff = {home: np.array(sorted(staff), dtype=object) for home, staff in home_index.local_staff.items()}
+
+    home = rng.choice(homes, rows)
+    # 大部分活動由本區員工負責，其餘由其他區員工支援
+    resp = rng.choice(all_staff, rows)
+    second = rng.choice(all_staff, rows)
+    is_local = rng.random(rows) < LOCAL_RATE
+    for h, staff in local_staff.items():
+        at_home = np.flatnonzero(is_local & (home == h))
+        resp[at_home] = rng.choice(staff, len(at_home))
+    second[second == resp] = rng.choice(all_staff, int((second == resp).sum()))
+    second[rng.random(rows) < MISSING_SECOND_RATE] = None
+
+    aliases = _staff_aliases()
+    resp = _pick_names(rng, resp, aliases)
+    has_second = pd.notna(second)
+    second[has_second] = _pick_names(rng, second[has_second], aliases)
+
+    start = pd.Timestamp(f'{month}-01')
+    days = rng.integers(0, start.days_in_month, rows)
+    service_date = (start + pd.to_timedelta(days, 'D')).strftime('%Y-%m-%d')
+
+    home_name = pd.Series(home, dtype=object).map(lambda h: f'{h}號 院舍{h}')
+    participants = rng.integers(1, 25, rows).astype(float)
+    participants[rng.random(rows) < MISSING_PARTICIPANT_RATE] = np.nan
+    activity = rng.choice(np.array(ACTIVITY_TYPES, dtype=object), rows)
+    activity[rng.random(rows) < MISSING_ACTIVITY_RATE] = None
+
+    return pd.DataFrame({
+        'ServiceDate': service_date,
+        'HomeName': home_name,
+        'RespStaff': resp,
+        '2ndRespStaffName': second,
+        'NumberOfSession': rng.choice([0, 1], rows, p=[0.4, 0.6]),
+        'NumberOfParticipant(Without Volunteer Count)': participants,
+        '活動類型': activity,
+        'ServiceStatus': rng.choice(np.array(SERVICE_STATUSES, dtype=object), rows, p=[0.95, 0.05]),
+    })
+
+
+# 以系統匯出檔的格式寫出（CSV 為 big5hkscs 編碼）
+def write_export(df, path):
+    if path.lower().endswith('.xlsx'):
+        df.to_excel(path, index=False, engine='openpyxl')
+    else:
+        df.to_csv(path, index=False, encoding=EXPORT_ENCODING)
+
+
+def export_bytes(df):
+    return df.to_csv(index=False).encode(EXPORT_ENCODING)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='產生模擬的每月外出記錄匯出檔')
+    parser.add_argument('rows', type=int, help='行數，例如 10000、100000、1000000')
+    parser.add_argument('-o', '--output', default='synthetic.csv', help='輸出檔案（.csv 或 .xlsx，預設：synthetic.csv）')
+    parser.add_argument('-m', '--month', default='2025-01', help='月份（YYYY-MM，預設：2025-01）')
+    parser.add_argument('--seed', type=int, default=0, help='隨機種子（預設：0）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = generate_export(args.rows, args.month, args.seed)
+    write_export(df, args.output)
+    print(f'已寫出 {len(df)} 行至 {args.output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import json
+import os
+
+import pandas as pd
+
+import batch
+import homelist
+import ingest
+import synthetic
+from outing_stats import compute_stats_bundle
+from report import build_report_tables
+
+
+# 同名不同副檔名的檔案，以及名為 summary 的檔案，各自寫入自己的資料夾，不會覆蓋彼此或合併摘要
+def test_output_folders_use_full_file_names(tmp_path):
+    input_dir, output_dir = tmp_path / 'in', tmp_path / 'out'
+    input_dir.mkdir()
+    github_df = pd.read_csv(homelist.BUNDLED_PATH)
+    january = synthetic.generate_export(200, '2025-01', seed=1, github_df=github_df)
+    february = synthetic.generate_export(120, '2025-02', seed=2, github_df=github_df)
+    january.to_csv(input_dir / '2025-01.csv', index=False)
+    february.to_excel(input_dir / '2025-01.xlsx', index=False)
+    february.iloc[:50].to_csv(input_dir / 'summary.csv', index=False)
+
+    assert batch.main([str(input_dir), '-o', str(output_dir), '-j', '1',
+                       '--homelist', homelist.BUNDLED_PATH]) == 0
+    assert sorted(os.listdir(output_dir)) == ['2025-01.csv', '2025-01.xlsx', 'manifest.json', 'summary', 'summary.csv']
+    # 每個資料夾的員工表與該檔案單獨計算的結果相同
+    for name in ('2025-01.csv', '2025-01.xlsx', 'summary.csv'):
+        df, _ = ingest.parse_upload((input_dir / name).read_bytes(), name, xlsx_cache_dir=None)
+        expected = build_report_tables(compute_stats_bundle(df, github_df))['staff']
+        expected.to_csv(tmp_path / 'expected.csv', index=False, encoding='utf-8-sig')
+        assert (output_dir / name / 'staff.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+
+    summary = pd.read_csv(output_dir / 'summary' / 'staff.csv')
+    assert sorted(summary['file'].unique()) == ['2025-01.csv', '2025-01.xlsx', 'summary.csv']
+    manifest = json.loads((output_dir / 'manifest.json').read_text(encoding='utf-8'))
+    assert {entry['file']: entry['rows'] for entry in manifest['files']} == \
+        {'2025-01.csv': 200, '2025-01.xlsx': 120, 'summary.csv': 50}
@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+
+import history
+import homelist
+import synthetic
+from outing_stats import compute_stats_bundle
+
+
+@pytest.fixture(scope='module')
+def github_df():
+    return pd.read_csv(homelist.BUNDLED_PATH)
+
+
+@pytest.fixture(scope='module')
+def export(github_df):
+    return synthetic.generate_export(500, '2025-01', seed=5, github_df=github_df)
+
+
+@pytest.fixture
+def ingest(tmp_path, github_df):
+    def ingest(uploaded_df):
+        return history.ingest_bundle(compute_stats_bundle(uploaded_df.reset_index(drop=True), github_df),
+                                     store_dir=str(tmp_path))
+    return ingest
+
+
+def _stored(store_dir, month='2025-01'):
+    return history.read_manifest(str(store_dir))[month]['rows']
+
+
+def test_identical_upload_is_skipped(ingest, export):
+    assert ingest(export)['written'] == ['2025-01']
+    result = ingest(export)
+    assert result['skipped'] == ['2025-01']
+    assert result['written'] == [] and result['nothing_new'] == []
+
+
+# 更正後重新匯出（刪除記錄）的日期範圍仍涵蓋整個月份，應整個取代而不是合併
+def test_corrected_export_with_deleted_rows_replaces_month(ingest, export, tmp_path):
+    ingest(export)
+    corrected = export.drop(export.index[[10, 50, 100, 200, 300]])
+    result = ingest(corrected)
+    assert result['written'] == ['2025-01'] and result['merged'] == []
+    assert _stored(tmp_path) == 495
+    stats = history.history_stats(['2025-01'], store_dir=str(tmp_path))
+    assert len(stats.df) == 495
+
+
+def test_edited_and_removed_rows_do_not_keep_old_copies(ingest, export, github_df, tmp_path):
+    ingest(export)
+    corrected = export.drop(export.index[20]).copy()
+    corrected.loc[corrected.index[0], 'RespStaff'] = corrected['2ndRespStaffName'].dropna().iloc[0]
+    ingest(corrected)
+    assert _stored(tmp_path) == 499
+    stats = history.history_stats(['2025-01'], store_dir=str(tmp_path))
+    assert stats.total_sessions == compute_stats_bundle(corrected.reset_index(drop=True), github_df).total_sessions
+
+
+# 只含月尾補登記錄的上傳日期範圍較窄：保留已儲存的記錄，只加入新記錄
+def test_late_backfill_is_merged(ingest, export, github_df, tmp_path):
+    ingest(export)
+    late = export[export['ServiceDate'] >= '2025-01-25']
+    extra = synthetic.generate_export(30, '2025-01', seed=6, github_df=github_df).assign(ServiceDate='2025-01-30')
+    result = ingest(pd.concat([late, extra]))
+    assert result['merged'] == ['2025-01'] and result['written'] == ['2025-01']
+    assert _stored(tmp_path) == 530
+    cube = history.load_cube(store_dir=str(tmp_path))
+    assert cube['records'].sum() == 530
+
+
+def test_backfill_without_new_rows_is_reported_separately(ingest, export, tmp_path):
+    ingest(export)
+    result = ingest(export[export['ServiceDate'] >= '2025-01-25'])
+    assert result['nothing_new'] == ['2025-01']
+    assert result['skipped'] == [] and result['written'] == []
+    assert _stored(tmp_path) == 500
+
+
+# 跨兩個月的匯出檔：前一個月只有後半部分，按記錄合併；新的月份直接寫入
+def test_export_spanning_two_months(ingest, export, github_df, tmp_path):
+    ingest(export)
+    february = synthetic.generate_export(200, '2025-02', seed=7, github_df=github_df)
+    result = ingest(pd.concat([export[export['ServiceDate'] >= '2025-01-15'], february]))
+    assert result['written'] == ['2025-02'] and result['nothing_new'] == ['2025-01']
+    assert _stored(tmp_path, '2025-02') == 200
+
+
+# 彙總立方體的按記錄量度與上傳資料的總數相同（協作記錄只計一次），按員工量度與員工統計相同
+def test_cube_record_measures(ingest, export, github_df, tmp_path):
+    ingest(export)
+    bundle = compute_stats_bundle(export, github_df)
+    cube = history.load_cube(store_dir=str(tmp_path))
+    assert cube['records'].sum() == len(export)
+    assert cube['record_participants'].sum() == export['NumberOfParticipant(Without Volunteer Count)'].sum()
+    assert cube['sessions'].sum() == sum(stats.total for stats in bundle.staff_stats.values())
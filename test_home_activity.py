@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import homelist
+import synthetic
+from outing_stats import HOME_DAY_BITS, HOME_DAY_OFFSET, HOME_NO_DATE, HomeActivity, HomeIndex
+
+
+@pytest.fixture(scope='module')
+def home_index():
+    return HomeIndex.from_homelist(pd.read_csv(homelist.BUNDLED_PATH))
+
+
+# 模擬資料（只用部分院舍，其餘院舍沒有記錄），另加無效日期、空院舍、時間部分及 1970 年之前的日期
+@pytest.fixture(scope='module')
+def records(home_index):
+    df = synthetic.generate_export(3000, '2025-01', seed=8)
+    df = pd.concat([df, synthetic.generate_export(1000, '2025-03', seed=9)], ignore_index=True)
+    df = df[df['HomeName'].str.extract(r'^(\d+)', expand=False).astype(int) % 3 != 0].reset_index(drop=True)
+    dates = pd.to_datetime(df['ServiceDate'])
+    dates[::97] = pd.NaT
+    dates[5::50] = dates[5::50] + pd.Timedelta(hours=15)
+    extra = pd.DataFrame({'HomeName': [None, df['HomeName'][0], df['HomeName'][1]],
+                          'ServiceDate': [pd.Timestamp('2025-01-02'), pd.Timestamp('1969-12-31'), pd.NaT]})
+    return pd.concat([pd.DataFrame({'HomeName': df['HomeName'], 'ServiceDate': dates}), extra], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def activity(records, home_index):
+    return HomeActivity.from_records(records['HomeName'], records['ServiceDate'], home_index.local_staff)
+
+
+def _present(records):
+    return records[records['HomeName'].notna()]
+
+
+# 以 pandas 逐院舍計算 start 至 end（含，按日）的活動次數；院舍次序與 activity.homes 相同
+def _brute_counts(records, activity, start=None, end=None):
+    rows = _present(records)
+    if start is not None or end is not None:
+        days = rows['ServiceDate'].dt.normalize()
+        rows = rows[(days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))]
+    return rows.groupby('HomeName').size().reindex(activity.homes, fill_value=0).to_numpy()
+
+
+def test_key_layout(records, activity):
+    positions = activity.keys >> HOME_DAY_BITS
+    assert np.array_equal(positions, np.repeat(np.arange(len(activity)), np.diff(activity.offsets)))
+    days = activity.keys & HOME_NO_DATE
+    dates = _present(records)['ServiceDate']
+    assert (days == HOME_NO_DATE).sum() == dates.isna().sum()
+    valid = days[days != HOME_NO_DATE] - HOME_DAY_OFFSET
+    expected = np.sort(dates.dropna().to_numpy().astype('datetime64[D]').astype(np.int64))
+    assert np.array_equal(np.sort(valid), expected)
+    # 每間院舍的日期已排序，無效日期排在最後
+    assert np.all(np.diff(activity.keys) >= 0)
+
+
+def test_homelist_homes_without_records(records, activity, home_index):
+    present = _present(records)['HomeName'].nunique()
+    # 模擬資料的院舍都來自 homelist.csv：有記錄的院舍不會重複加入
+    assert len(activity) == len(home_index.local_staff) > present
+    assert set(activity.home_ids) == {float(home) for home in home_index.local_staff}
+    seeded = np.arange(present, len(activity))
+    assert np.all(activity.counts()[seeded] == 0)
+    assert list(activity.homes[seeded]) == sorted(activity.homes[seeded], key=int)
+    assert np.all(np.isnat(activity.last_visits()[seeded]))
+    assert set(seeded) <= set(activity.homes_with_visits(0))
+
+
+def test_counts_match_brute_force(records, activity):
+    assert np.array_equal(activity.counts(), _brute_counts(records, activity))
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2024-12-15', '2025-04-15')
+    for _ in range(25):
+        start, end = sorted(rng.choice(days, 2))
+        expected = _brute_counts(records, activity, start, end)
+        assert np.array_equal(activity.counts(start, end), expected)
+        n = int(rng.integers(0, 6))
+        assert np.array_equal(activity.homes_with_visits(n, start, end), np.flatnonzero(expected == n))
+        assert np.array_equal(activity.homes_with_visits(n, start, end, at_least=True), np.flatnonzero(expected >= n))
+
+
+def test_dates_before_1970(records, activity):
+    home = records['HomeName'][0]
+    position = list(activity.homes).index(home)
+    assert activity.dates(position)[0] == np.datetime64('1969-12-31')
+    assert activity.counts('1969-12-31', '1969-12-31')[position] == 1
+
+
+def test_dates_and_last_visits(records, activity):
+    rows = _present(records)
+    for position in range(0, len(activity), 7):
+        home_dates = rows.loc[rows['HomeName'] == activity.homes[position], 'ServiceDate'].dt.normalize()
+        expected = np.concatenate([np.sort(home_dates.dropna().to_numpy()), home_dates[home_dates.isna()].to_numpy()])
+        assert np.array_equal(activity.dates(position), expected.astype('datetime64[ns]'), equal_nan=True)
+        window = home_dates[(home_dates >= '2025-01-10') & (home_dates <= '2025-01-20')]
+        assert np.array_equal(activity.dates(position, '2025-01-10', '2025-01-20'), np.sort(window.to_numpy()))
+    last = rows.groupby('HomeName')['ServiceDate'].max().dt.normalize().reindex(activity.homes)
+    assert np.array_equal(activity.last_visits(), last.to_numpy(), equal_nan=True)
+
+
+def test_date_range_and_stale_homes(records, activity):
+    dates = _present(records)['ServiceDate'].dropna().dt.normalize()
+    assert activity.date_range() == (dates.min(), dates.max())
+    last = pd.Series(activity.last_visits(), index=np.arange(len(activity)))
+    for weeks, as_of in [(2, None), (4, None), (6, '2025-02-10'), (1, '2025-01-15')]:
+        as_of_day = dates.max() if as_of is None else pd.Timestamp(as_of)
+        window = _brute_counts(records, activity, as_of_day - pd.Timedelta(weeks=weeks) + pd.Timedelta(days=1), as_of_day)
+        stale = activity.stale_homes(weeks, as_of)
+        assert np.array_equal(stale, np.flatnonzero(window == 0))
+        if as_of is None:
+            assert set(stale) == set(last.index[~(last > as_of_day - pd.Timedelta(weeks=weeks))])
+
+
+def test_empty_activity(home_index):
+    activity = HomeActivity.from_records(pd.Series([], dtype=object), pd.Series([], dtype='datetime64[ns]'))
+    assert len(activity) == 0
+    assert activity.date_range() == (None, None)
+    seeded = HomeActivity.from_records(pd.Series([], dtype=object), pd.Series([], dtype='datetime64[ns]'),
+                                       home_index.local_staff)
+    assert len(seeded) == len(home_index.local_staff)
+    assert np.array_equal(seeded.stale_homes(4), np.arange(len(seeded)))
@@ -0,0 +1,125 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import homelist
+
+HOMELIST_TEXT = 'Home,Staff1,Staff2\n1,Mike,Pong\n2,Jack,Kayi\n'
+ETAG = '"v1"'
+
+
+# 代替 GitHub Raw 的本地 HTTP 伺服器：status 為回覆的狀態碼，If-None-Match 相符時回覆 304
+class HomelistServer:
+    def __init__(self):
+        self.status = 200
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                if server.status != 200:
+                    self.send_response(server.status)
+                    self.end_headers()
+                    return
+                if self.headers.get('If-None-Match') == ETAG:
+                    self.send_response(304)
+                    self.send_header('ETag', ETAG)
+                    self.end_headers()
+                    return
+                body = HOMELIST_TEXT.encode('utf-8')
+                self.send_response(200)
+                self.send_header('ETag', ETAG)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/homelist.csv'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(homelist, 'CACHE_DIR', str(tmp_path))
+    homelist.clear_cache()
+    yield
+    homelist.clear_cache()
+
+
+@pytest.fixture
+def server():
+    server = HomelistServer()
+    yield server
+    server.close()
+
+
+def _unreachable_url():
+    server = HomelistServer()
+    server.close()
+    return server.url
+
+
+def test_download_then_cache(server):
+    df, source = homelist.load_homelist(server.url)
+    assert source == homelist.SOURCE_NETWORK
+    assert list(df['Home']) == [1, 2]
+    df, source = homelist.load_homelist(server.url)
+    assert source == homelist.SOURCE_CACHE
+    assert len(server.requests) == 1
+
+
+def test_expired_entry_is_revalidated(server):
+    homelist.load_homelist(server.url)
+    df, source = homelist.load_homelist(server.url, ttl=0)
+    assert source == homelist.SOURCE_REVALIDATED
+    assert server.requests[-1].get('If-None-Match') == ETAG
+    assert list(df['Home']) == [1, 2]
+
+
+def test_server_error_falls_back_to_local(server):
+    homelist.load_homelist(server.url)
+    server.status = 503
+    df, source = homelist.load_homelist(server.url, ttl=0)
+    assert source == homelist.SOURCE_LOCAL
+    assert list(df['Home']) == [1, 2]
+    # 後備時保留原有的 ETag，遠端恢復後可重新驗證
+    server.status = 200
+    _, source = homelist.load_homelist(server.url, ttl=0)
+    assert source == homelist.SOURCE_REVALIDATED
+    assert server.requests[-1].get('If-None-Match') == ETAG
+
+
+def test_disk_copy_used_after_restart(server):
+    homelist.load_homelist(server.url)
+    homelist.clear_cache()
+    server.status = 500
+    df, source = homelist.load_homelist(server.url)
+    assert source == homelist.SOURCE_LOCAL
+    assert list(df['Home']) == [1, 2]
+    # 後備結果不算作新鮮的快取：再次讀取仍會嘗試遠端
+    _, source = homelist.load_homelist(server.url)
+    assert source == homelist.SOURCE_LOCAL
+    server.status = 200
+    _, source = homelist.load_homelist(server.url)
+    assert source == homelist.SOURCE_REVALIDATED
+    assert len(server.requests) == 4
+
+
+def test_unreachable_falls_back_to_bundled():
+    url = _unreachable_url()
+    df, source = homelist.load_homelist(url, timeout=1)
+    assert source == homelist.SOURCE_LOCAL
+    assert not df.empty
+    _, source = homelist.load_homelist(url, timeout=1)
+    assert source == homelist.SOURCE_LOCAL
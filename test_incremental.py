@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import homelist
+import incremental
+import synthetic
+from outing_stats import compute_stats_bundle
+
+
+@pytest.fixture(scope='module')
+def github_df():
+    return pd.read_csv(homelist.BUNDLED_PATH)
+
+
+@pytest.fixture(scope='module')
+def export(github_df):
+    return synthetic.generate_export(4000, '2025-01', seed=1, github_df=github_df)
+
+
+# 確保結果由增量路徑產生（不會退回完整重算）
+@pytest.fixture
+def delta_only(monkeypatch):
+    def full_recompute(*args, **kwargs):
+        raise AssertionError('update_bundle 退回了完整重算')
+    monkeypatch.setattr(incremental, 'stats_bundle_from_frame', full_recompute)
+
+
+def _array_equal(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    if a.dtype.kind in 'fc' or b.dtype.kind in 'fc':
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=True)
+    return a.dtype == b.dtype and np.array_equal(a, b)
+
+
+def assert_region_stats_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for region, want in expected.items():
+        got = actual[region]
+        for name in ('count', 'count_0', 'count_1', 'participants', 'participants_0', 'participants_1', 'homes'):
+            assert getattr(got, name) == getattr(want, name), (region, name)
+        assert _array_equal(got.records, want.records), (region, 'records')
+        for session_val in (0, 1):
+            got_types, want_types = got.activity_types(session_val), want.activity_types(session_val)
+            assert list(got_types) == list(want_types), (region, session_val)
+            for activity, details in want_types.items():
+                assert got_types[activity].count == details.count, (region, session_val, activity)
+                assert _array_equal(got_types[activity].rows, details.rows), (region, session_val, activity)
+
+
+def assert_bundles_equal(actual, expected):
+    assert actual.staff_stats == expected.staff_stats
+    assert_region_stats_equal(actual.region_stats, expected.region_stats)
+    assert actual.total_sessions == expected.total_sessions
+    assert actual.total_participants == expected.total_participants
+    assert actual.home_counts == expected.home_counts
+    for name in ('homes', 'home_ids', 'keys', 'offsets'):
+        assert _array_equal(getattr(actual.home_activity, name), getattr(expected.home_activity, name)), name
+    assert actual.staff_days.staff == expected.staff_days.staff
+    assert actual.staff_days.start == expected.staff_days.start
+    assert actual.staff_days.days == expected.staff_days.days
+    assert _array_equal(actual.staff_days.bits, expected.staff_days.bits)
+    assert actual.duplicates.equals(expected.duplicates)
+
+
+def _check(previous, uploaded_df, github_df):
+    bundle = incremental.update_bundle(previous, uploaded_df, github_df)
+    assert_bundles_equal(bundle, compute_stats_bundle(uploaded_df, github_df))
+    return bundle
+
+
+@pytest.fixture(scope='module')
+def previous(export, github_df):
+    return incremental.update_bundle(None, export, github_df)
+
+
+def test_full_build_matches_compute(export, github_df):
+    _check(None, export, github_df)
+
+
+def test_appended_rows(previous, export, github_df, delta_only):
+    extra = synthetic.generate_export(300, '2025-02', seed=2, github_df=github_df)
+    _check(previous, pd.concat([export, extra], ignore_index=True), github_df)
+
+
+def test_removed_rows(previous, export, github_df, delta_only):
+    rng = np.random.default_rng(3)
+    removed = rng.choice(len(export), 200, replace=False)
+    _check(previous, export.drop(export.index[removed]).reset_index(drop=True), github_df)
+
+
+def test_duplicate_rows(previous, export, github_df, delta_only):
+    bundle = _check(previous, pd.concat([export, export.iloc[:25], export.iloc[:5]], ignore_index=True), github_df)
+    assert not bundle.duplicates.empty
+
+
+def test_shuffled_rows(previous, export, github_df, delta_only):
+    _check(previous, export.sample(frac=1, random_state=4).reset_index(drop=True), github_df)
+
+
+def test_new_categories(previous, export, github_df, delta_only):
+    extra = export.iloc[:40].copy()
+    extra['HomeName'] = '999號 新院舍'
+    extra['RespStaff'] = 'NewStaff'
+    extra['活動類型'] = '新活動'
+    _check(previous, pd.concat([export, extra], ignore_index=True), github_df)
+
+
+def test_missing_dates(previous, export, github_df, delta_only):
+    extra = export.iloc[100:160].copy()
+    extra['ServiceDate'] = np.nan
+    _check(previous, pd.concat([export, extra], ignore_index=True), github_df)
+
+
+@pytest.fixture(scope='module')
+def first_upload(export, github_df):
+    first = export.iloc[:3500].reset_index(drop=True)
+    return first, incremental.update_bundle(None, first, github_df)
+
+
+def test_chained_deltas(first_upload, export, github_df, delta_only):
+    first, bundle = first_upload
+    second = pd.concat([first.iloc[150:], export.iloc[3500:3800]], ignore_index=True)
+    third = pd.concat([second.iloc[:-50], export.iloc[3800:], second.iloc[:10]], ignore_index=True)
+    for uploaded_df in (second, third):
+        bundle = _check(bundle, uploaded_df, github_df)
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import ingest
+
+pytest.importorskip('pyarrow')
+
+HEADER = ['ServiceDate', 'HomeName', 'RespStaff', '2ndRespStaffName', 'NumberOfSession', '活動類型', 'Extra']
+
+# 第 3、7 行欄位過多，第 4 行有引號內的分隔符
+LONG_ROWS = [
+    ['2025-01-01', '1號 院舍', 'Mike', '', '1', '音樂', 'x'],
+    ['2025-01-02', '2號 院舍', 'Pong', 'Jack', '0', '手工', 'y', 'EXTRA'],
+    ['2025-01-04', '"4號, 院舍"', 'Kama', '', '1', '', 'z'],
+    ['2025-01-05', '5號 院舍', 'Mike', '', '1', '音樂', 'q'],
+    ['2025-01-06', '6號 院舍', 'Jack', 'Mike', '0', '運動', 'w'],
+    ['2025-01-07', '7號 院舍', 'Kayi', '', '1', '音樂', 'v', '1', '2'],
+    ['2025-01-08', '8號 院舍', 'Pong', '', '1', '手工', 'u'],
+]
+
+
+def _csv(rows, sep=',', encoding='utf-8'):
+    lines = [sep.join(HEADER)] + [sep.join(row) for row in rows]
+    return ('\n'.join(lines) + '\n').encode(encoding)
+
+
+def _parse(monkeypatch, data, has_pyarrow):
+    monkeypatch.setattr(ingest, 'HAS_PYARROW', has_pyarrow)
+    return ingest.parse_upload(data, 'export.csv')
+
+
+def _located(bad_lines):
+    return [(bad_line['line'], bad_line['expected'], bad_line['actual']) for bad_line in bad_lines]
+
+
+# 以 pyarrow 及 C 引擎解析同一個檔案，結果應完全相同；C 引擎的警告沒有壞行的文字
+def _assert_engines_agree(monkeypatch, data, pyarrow_engine):
+    with_pyarrow, info = _parse(monkeypatch, data, True)
+    without, c_info = _parse(monkeypatch, data, False)
+    assert (info['engine'], c_info['engine']) == (pyarrow_engine, 'c')
+    pd.testing.assert_frame_equal(with_pyarrow, without)
+    assert _located(info['bad_lines']) == _located(c_info['bad_lines'])
+    return with_pyarrow, info
+
+
+@pytest.mark.parametrize('sep, encoding', [(',', 'utf-8'), ('\t', 'big5hkscs'), (',', 'utf-8-sig')])
+def test_long_rows_are_skipped_by_both_engines(monkeypatch, sep, encoding):
+    rows = [[field.strip('"') if sep != ',' else field for field in row] for row in LONG_ROWS]
+    data = _csv(rows, sep, encoding)
+    df, info = _assert_engines_agree(monkeypatch, data, 'pyarrow')
+    assert list(df['ServiceDateText']) == ['2025-01-01', '2025-01-04', '2025-01-05', '2025-01-06', '2025-01-08']
+    assert _located(info['bad_lines']) == [(3, 7, 8), (7, 7, 9)]
+    source = data.decode(encoding).lstrip('﻿').split('\n')
+    assert [bad_line['text'] for bad_line in info['bad_lines']] == [source[2], source[6]]
+    assert df['HomeName'].iloc[1] == '4號, 院舍'
+
+
+# 欄位較少的行：pyarrow 只能略過，因此改用 C 引擎（以空值補足保留該行），兩者結果相同
+def test_short_row_falls_back_to_c_engine(monkeypatch):
+    rows = LONG_ROWS[:4] + [['2025-01-09', '9號 院舍', 'Mike']] + LONG_ROWS[4:]
+    df, info = _assert_engines_agree(monkeypatch, _csv(rows), 'c')
+    assert len(df) == 6
+    short = df[df['ServiceDateText'] == '2025-01-09'].iloc[0]
+    assert short['RespStaff'] == 'Mike' and pd.isna(short['NumberOfSession'])
+    assert _located(info['bad_lines']) == [(3, 7, 8), (8, 7, 9)]
+
+
+# 大檔案中的壞行（包括緊接在五萬行之後的連續壞行）：C 引擎不分塊讀取，仍會略過並記錄每一行
+def test_bad_lines_deep_in_large_file(monkeypatch):
+    rows = [LONG_ROWS[0]] * 60_000
+    for position in (50_000, 50_001, 55_000):
+        rows[position] = LONG_ROWS[5]
+    df, info = _assert_engines_agree(monkeypatch, _csv(rows), 'pyarrow')
+    assert len(df) == 59_997
+    assert _located(info['bad_lines']) == [(50_002, 7, 9), (50_003, 7, 9), (55_002, 7, 9)]
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def timing_logger(monkeypatch):
+    monkeypatch.setattr(profiling.logger, 'handlers', [])
+    yield profiling.logger
+    for handler in profiling.logger.handlers:
+        handler.close()
+
+
+# 時間日誌按大小輪替，只保留 TIMING_LOG_BACKUPS 個舊檔
+def test_timing_log_rotates(tmp_path, monkeypatch, timing_logger):
+    monkeypatch.setattr(profiling, 'TIMING_LOG_MAX_BYTES', 2000)
+    monkeypatch.setattr(profiling, 'TIMING_LOG_BACKUPS', 2)
+    path = tmp_path / 'logs' / 'timing.jsonl'
+    profiling.configure_logging(str(path))
+    profiling.configure_logging(str(path))
+    assert len(timing_logger.handlers) == 1
+    recorder = profiling.Recorder(run_id='r')
+    for _ in range(200):
+        with recorder.stage('parse', rows=10):
+            pass
+    assert sorted(os.listdir(path.parent)) == ['timing.jsonl', 'timing.jsonl.1', 'timing.jsonl.2']
+    for name in os.listdir(path.parent):
+        assert os.path.getsize(path.parent / name) <= 2000
+    assert json.loads(path.read_text(encoding='utf-8').splitlines()[-1])['stage'] == 'parse'
+
+
+def test_empty_path_logs_to_stderr(timing_logger):
+    profiling.configure_logging('')
+    assert type(timing_logger.handlers[0]) is logging.StreamHandler
+
+
+# .prof 檔超過 PROFILE_MAX_FILES 時刪除最舊的
+def test_capture_profile_prunes_old_dumps(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_MAX_FILES', 3)
+    (tmp_path / 'notes.txt').write_text('keep')
+    paths = []
+    for i in range(5):
+        with profiling.capture_profile(name=f'run{i}', profile_dir=str(tmp_path)) as result:
+            sum(range(1000))
+        os.utime(result['path'], (1000 + i, 1000 + i))
+        paths.append(result['path'])
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path) for path in paths[-3:]] + ['notes.txt'])
+    with profiling.capture_profile(enabled=False, profile_dir=str(tmp_path)) as result:
+        pass
+    assert result['path'] is None
@@ -0,0 +1,130 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from shared_cache import SharedCache, atomic_write, frame_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return SharedCache(100, ttl=10, clock=clock)
+
+
+def test_hit_and_miss(cache):
+    assert cache.get(('upload', 'a')) is None
+    value = object()
+    cache.put(('upload', 'a'), value, 10)
+    assert cache.get(('upload', 'a')) is value
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+    assert (stats['entries'], stats['size_bytes'], stats['max_bytes']) == (1, 10, 100)
+
+
+# 超過預算時淘汰最久未使用的項目；get 會更新使用次序
+def test_lru_eviction_by_size(cache):
+    for name in 'abc':
+        cache.put(('upload', name), name, 30)
+    cache.get(('upload', 'a'))
+    cache.put(('upload', 'd'), 'd', 30)
+    assert cache.get(('upload', 'b')) is None
+    assert [cache.get(('upload', name)) for name in 'acd'] == ['a', 'c', 'd']
+    cache.put(('bundle', 'e'), 'e', 60)
+    stats = cache.stats()
+    assert stats['size_bytes'] == 90 and stats['entries'] == 2
+    assert stats['evictions'] == 3
+
+
+def test_replacing_a_key_updates_its_size(cache):
+    cache.put(('upload', 'a'), 'old', 60)
+    cache.put(('upload', 'a'), 'new', 20)
+    cache.put(('upload', 'b'), 'b', 70)
+    assert cache.get(('upload', 'a')) == 'new'
+    assert cache.stats()['size_bytes'] == 90
+    assert cache.stats()['evictions'] == 0
+
+
+# 單一項目超過整個預算時不快取，亦不擠走其他項目
+def test_oversize_put_is_skipped(cache):
+    cache.put(('upload', 'a'), 'a', 50)
+    cache.put(('upload', 'huge'), 'huge', 101)
+    assert cache.get(('upload', 'huge')) is None
+    assert cache.get(('upload', 'a')) == 'a'
+    assert cache.stats()['size_bytes'] == 50 and cache.stats()['evictions'] == 0
+
+
+def test_ttl_expiry_counts_from_last_use(cache, clock):
+    cache.put(('upload', 'a'), 'a', 10)
+    cache.put(('homelist', 'b'), 'b', 10)
+    clock.advance(8)
+    assert cache.get(('upload', 'a')) == 'a'
+    clock.advance(5)
+    # b 已 13 秒未被使用，a 只有 5 秒
+    assert cache.get(('homelist', 'b')) is None
+    assert cache.get(('upload', 'a')) == 'a'
+    clock.advance(10.5)
+    stats = cache.stats()
+    assert stats['entries'] == 0 and stats['size_bytes'] == 0
+    assert stats['expirations'] == 2
+
+
+def test_per_kind_counters(cache, clock):
+    cache.put(('upload', 'a'), 'a', 40)
+    cache.put(('bundle', 'a'), 'bundle', 50)
+    cache.get(('upload', 'a'))
+    cache.get(('upload', 'missing'))
+    cache.get(('bundle', 'a'))
+    cache.put(('homelist', 'h'), 'h', 30)
+    kinds = cache.stats()['kinds']
+    assert kinds['upload'] == {'entries': 0, 'size_bytes': 0, 'hits': 1, 'misses': 1,
+                               'evictions': 1, 'expirations': 0, 'hit_rate': 0.5}
+    assert kinds['bundle']['entries'] == 1 and kinds['bundle']['size_bytes'] == 50
+    assert kinds['bundle']['hits'] == 1 and kinds['bundle']['hit_rate'] == 1.0
+    assert kinds['homelist'] == {'entries': 1, 'size_bytes': 30}
+    cache.put('plain-key', 'x', 5)
+    assert cache.stats()['kinds']['default']['entries'] == 1
+
+
+def test_clear(cache):
+    cache.put(('upload', 'a'), 'a', 10)
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.stats()['size_bytes'] == 0
+    assert cache.get(('upload', 'a')) is None
+
+
+def test_frame_size_counts_object_contents():
+    small = pd.DataFrame({'text': ['a'] * 100})
+    large = pd.DataFrame({'text': ['a' * 1000] * 100})
+    assert frame_size(large) > frame_size(small) + 90_000
+
+
+# 寫入失敗時保留原有檔案，亦不留下暫存檔
+def test_atomic_write(tmp_path):
+    path = str(tmp_path / 'sub' / 'data.txt')
+    atomic_write(path, lambda tmp: Path(tmp).write_text('first'))
+    assert Path(path).read_text() == 'first'
+
+    def fail(tmp):
+        Path(tmp).write_text('partial')
+        raise OSError('disk full')
+    with pytest.raises(OSError):
+        atomic_write(path, fail)
+    assert Path(path).read_text() == 'first'
+    assert os.listdir(tmp_path / 'sub') == ['data.txt']
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from staff_calendar import DayCalendar
+
+STAFF = ['Mike', 'Pong', 'Jack', 'Kayi', 'Kama']
+
+
+# 隨機的 (員工, 日期) 配對，包括空員工、無效日期、時間部分及不在 staff 中的員工
+@pytest.fixture(scope='module')
+def pairs():
+    rng = np.random.default_rng(2)
+    n = 2000
+    staff = rng.choice(np.array(STAFF + ['Other', None], dtype=object), n, p=[0.18] * 5 + [0.05, 0.05])
+    dates = pd.Series(pd.Timestamp('2024-12-20') + pd.to_timedelta(rng.integers(0, 70, n), 'D'))
+    dates[rng.random(n) < 0.03] = pd.NaT
+    dates[::11] = dates[::11] + pd.Timedelta(hours=9)
+    return pd.DataFrame({'staff': staff, 'date': dates})
+
+
+# 以集合計算每位員工的外出日（日期只取日，略過空值）
+def _day_sets(pairs):
+    valid = pairs[pairs['staff'].notna() & pairs['date'].notna()]
+    return {staff: set(group.dt.normalize()) for staff, group in valid.groupby('staff')['date']}
+
+
+def test_from_pairs_with_given_staff(pairs):
+    calendar = DayCalendar.from_pairs(pairs['staff'], pairs['date'], staff=STAFF)
+    sets = _day_sets(pairs)
+    assert calendar.staff == tuple(STAFF)
+    assert 'Other' not in calendar
+    assert calendar.start == np.datetime64(min(min(days) for days in sets.values()).date())
+    for staff in STAFF:
+        assert set(calendar.staff_dates(staff)) == sets[staff]
+        assert calendar.count(staff) == len(sets[staff])
+    assert list(calendar.count()) == [len(sets[staff]) for staff in STAFF]
+    # 不在日曆中的員工為全零
+    assert calendar.count('Other') == 0
+    assert calendar.staff_dates('Nobody').empty
+
+
+def test_from_pairs_default_staff_order(pairs):
+    calendar = DayCalendar.from_pairs(pairs['staff'], pairs['date'])
+    valid = pairs[pairs['staff'].notna() & pairs['date'].notna()]
+    assert calendar.staff == tuple(pd.unique(valid['staff']))
+    assert calendar.count('Other') == len(_day_sets(pairs)['Other'])
+
+
+def test_categorical_staff_matches_objects(pairs):
+    plain = DayCalendar.from_pairs(pairs['staff'], pairs['date'], staff=STAFF)
+    categorical = DayCalendar.from_pairs(pairs['staff'].astype('category'), pairs['date'], staff=STAFF)
+    assert np.array_equal(plain.bits, categorical.bits)
+
+
+def test_fixed_range_drops_outside_days(pairs):
+    calendar = DayCalendar.from_pairs(pairs['staff'], pairs['date'], staff=STAFF, start='2025-01-01', days=31)
+    sets = _day_sets(pairs)
+    january = pd.date_range('2025-01-01', '2025-01-31')
+    for staff in STAFF:
+        assert set(calendar.staff_dates(staff)) == sets[staff] & set(january)
+    assert calendar.bits.shape == (len(STAFF), 4)
+
+
+def test_shared_and_overlap_counts(pairs):
+    calendar = DayCalendar.from_pairs(pairs['staff'], pairs['date'], staff=STAFF)
+    sets = _day_sets(pairs)
+    assert set(calendar.dates(calendar.shared('Mike', 'Pong'))) == sets['Mike'] & sets['Pong']
+    assert set(calendar.dates(calendar.shared('Mike', 'Pong', 'Jack'))) == sets['Mike'] & sets['Pong'] & sets['Jack']
+    assert not calendar.shared('Mike', 'Nobody').any()
+    overlap = calendar.overlap_counts()
+    assert list(overlap.index) == STAFF and list(overlap.columns) == STAFF
+    for a in STAFF:
+        for b in STAFF:
+            assert overlap.loc[a, b] == len(sets[a] & sets[b])
+
+
+def test_empty_and_all_missing():
+    empty = DayCalendar.from_pairs([], pd.Series([], dtype='datetime64[ns]'))
+    assert empty.staff == () and empty.days == 0
+    missing = DayCalendar.from_pairs(['Mike', 'Pong'], pd.Series([pd.NaT, pd.NaT]), staff=['Mike', 'Pong'])
+    assert list(missing.count()) == [0, 0]
+    assert missing.overlap_counts().to_numpy().sum() == 0